@@ -13,6 +13,7 @@
 #    under the License.
 import abc
 import logging
+import threading
 from typing import Dict, List
 
 from autor.flow_configuration.activity_configuration import (
@@ -21,6 +22,7 @@ from autor.flow_configuration.activity_configuration import (
 from autor.framework.activity_block_callback import ActivityBlockCallback
 from autor.framework.activity_context import ActivityContext
 from autor.framework.activity_data import ActivityData
+from autor.framework.activity_watchdog import ActivityInterrupt
 from autor.framework.autor_framework_exception import (
     AutorFrameworkValueException,
 )
@@ -67,6 +69,10 @@ class Activity(abc.ABC):
         self.__activity_block_callbacks: List[ActivityBlockCallback] = []
         # The outcome of the activity
         self.__status: Status = Status.UNKNOWN
+        # Child processes that are terminated if the activity times out.
+        self.__child_processes: list = []
+        # The thread of the run that has timed out, None: not timed out. See expire().
+        self.__expired_thread: int = None
 
     def set_arguments(self, data: ActivityData):
         Check.is_non_empty_string(data.activity_id)
@@ -150,6 +156,7 @@ class Activity(abc.ABC):
 
     @status.setter
     def status(self, n):
+        self.__check_expired()
         Check.is_status(
             n,
             f"An attempt to set an invalid status {str(n)}. See consants.Status for valid values.",
@@ -206,6 +213,37 @@ class Activity(abc.ABC):
     def activity_block_callbacks(self) -> List[ActivityBlockCallback]:
         return self.__activity_block_callbacks
 
+    @property
+    def child_processes(self) -> list:
+        return self.__child_processes
+
+    def register_child_process(self, process) -> None:
+        """
+        Register a child process (subprocess.Popen or multiprocessing.Process) of the activity.
+        If the activity times out, the process is terminated (see ActivityWatchdog).
+        """
+        if self.__expired_thread == threading.get_ident():
+            process.terminate()  # Started after the timeout.
+        self.__check_expired()
+        self.__child_processes.append(process)
+
+    @property
+    def expired(self) -> bool:
+        """True if run() has timed out in its thread (see ActivityWatchdog). A run() that
+        catches the interrupt keeps running, but can no longer change the outcome of the
+        activity: setting the status, save_properties_to_context() and
+        register_child_process() raise ActivityInterrupt in its thread, and the @output
+        properties are not saved to the context."""
+        return self.__expired_thread is not None
+
+    def expire(self, thread_id: int) -> None:
+        """Called by the framework when the run in the thread 'thread_id' has timed out."""
+        self.__expired_thread = thread_id
+
+    def __check_expired(self):
+        if self.__expired_thread == threading.get_ident():
+            raise ActivityInterrupt(f"Activity '{self.id}' has timed out")
+
     @abc.abstractmethod
     def run(self):
         """
@@ -213,6 +251,8 @@ class Activity(abc.ABC):
             This method is called
         after all the input properties have been loaded from the context.
 
+        run() can be a coroutine ('async def run()'): it is then run on the event loop of the
+        activity block (see ActivityEventLoop), shared by the asynchronous activities.
         """
         raise AutorFrameworkValueException(
             "run() in class Activity is abstract and shold not be called. \
@@ -227,6 +267,7 @@ class Activity(abc.ABC):
         In exceptional cases, when an activity needs to save the properties to the remote
         context BEFORE the run() has ended, it can use this method to do so.
         """
+        self.__check_expired()
         self.__context_properties_handler.save_output_properties()
 
     def __str__(self):
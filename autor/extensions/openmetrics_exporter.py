@@ -0,0 +1,241 @@
+#  Copyright 2022-Present Autor contributors
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import json
+import logging
+import os
+import tempfile
+import time
+
+from autor.framework.constants import Status
+from autor.framework.context_paths import ContextPaths
+from autor.framework.keys import FlowContextKeys as ctx
+from autor.framework.keys import StateKeys as ste
+from autor.framework.state import State
+from autor.framework.state_listener import StateListener
+
+# pylint: disable=no-member
+
+
+class OpenMetricsExporter(StateListener):
+    """
+    Writes the statistics of an activity block run as an OpenMetrics (Prometheus text format)
+    file at AFTER_ACTIVITY_BLOCK, e.g. for the textfile collector of the node exporter. If the
+    run did not get that far (e.g. it was aborted during set up), the file is written at
+    FRAMEWORK_END.
+
+    The file describes the latest run of the activity block: each run replaces the file. The
+    path is set in the Flow Configuration, "{activityBlockId}" is replaced with the id of the
+    activity block:
+
+        instrumentation:
+          openMetricsFile: /var/lib/node_exporter/autor-{activityBlockId}.prom
+          # Default: autor-{activityBlockId}.prom
+
+    Metrics (labels: flow, block):
+        autor_activity_block_last_run_timestamp_seconds  gauge      end of the run (Unix time)
+        autor_activity_block_duration_seconds            gauge
+        autor_activity_block_status                      gauge      1 for the status of the run
+        autor_activities                                 gauge      by group, type and status
+        autor_activity_duration_seconds                  histogram  by type
+        autor_activity_context_sync_seconds              histogram  by type
+        autor_context_size_bytes                         gauge      the flow context as JSON
+        autor_exceptions                                 gauge      by exception type
+
+    The durations come from the activity metrics (see ActivityMetrics). The exceptions are the
+    ones registered in the context during the run, up to the state that writes the file. If the
+    run was aborted before BEFORE_ACTIVITY_BLOCK, they include the exceptions fetched from the
+    remote context.
+    """
+
+    # Upper bounds of the histogram buckets, in seconds. Activities can run for hours.
+    BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 1800, 3600)
+
+    PREFIX = "autor_"
+
+    def __init__(self):
+        self._block_start = None  # None: the file of the run has been written.
+        self._activities = []  # (group, type, status, metrics)
+        self._exception_counts = {}  # Context path -> number of exceptions before the run.
+
+    def on_state(self, state: State):
+        data = state.dict
+        name = state.name
+
+        if name in (State.FRAMEWORK_START, State.BEFORE_ACTIVITY_BLOCK):
+            self._block_start = time.monotonic()
+            self._activities = []
+            self._exception_counts = {
+                path: len(exceptions) for path, exceptions in self._exceptions(data)
+            }
+
+        elif name == State.AFTER_ACTIVITY_POSTPROCESS:
+            activity = data.get(ste.ACTIVITY_INSTANCE)
+            activity_data = data.get(ste.INTERNAL_ACTIVITY_DATA)
+            self._activities.append(
+                (
+                    data.get(ste.ACTIVITY_GROUP_TYPE),
+                    data.get(ste.ACTIVITY_TYPE),
+                    activity.status if activity is not None else Status.UNKNOWN,
+                    getattr(activity_data, "metrics", None) or {},
+                )
+            )
+
+        elif (
+            name in (State.AFTER_ACTIVITY_BLOCK, State.FRAMEWORK_END)
+            and self._block_start is not None
+        ):
+            self._write(data)
+            self._block_start = None
+
+    def _exceptions(self, data):
+        # (context path, exceptions) of the exception lists in the flow context.
+        context = data.get(ste.FLOW_CONTEXT)
+        if context is None:
+            return
+        for path, value in ContextPaths.leaves(context.store.local_context):
+            if path[-1] == ctx.EXCEPTIONS and ContextPaths.LATEST not in path:
+                yield path, value
+
+    def _write(self, data):
+        labels = {"flow": data.get(ste.FLOW_ID), "block": data.get(ste.ACTIVITY_BLOCK_ID)}
+        lines = []
+
+        self._gauge(
+            lines,
+            "activity_block_last_run_timestamp_seconds",
+            "The time when the latest run of the activity block ended.",
+            [(labels, time.time())],
+        )
+        self._gauge(
+            lines,
+            "activity_block_duration_seconds",
+            "The duration of the activity block run.",
+            [(labels, time.monotonic() - self._block_start)],
+        )
+        self._gauge(
+            lines,
+            "activity_block_status",
+            "The status of the activity block run.",
+            [({**labels, "status": data.get(ste.ACTIVITY_BLOCK_STATUS)}, 1)],
+        )
+
+        counts = {}
+        for group, activity_type, status, _ in self._activities:
+            key = (group, activity_type, status)
+            counts[key] = counts.get(key, 0) + 1
+        self._gauge(
+            lines,
+            "activities",
+            "The number of activities by group, type and status.",
+            [
+                ({**labels, "group": group, "type": activity_type, "status": status}, count)
+                for (group, activity_type, status), count in sorted(counts.items(), key=str)
+            ],
+        )
+
+        self._histogram(
+            lines,
+            "activity_duration_seconds",
+            "The duration of the activities, preprocessing and postprocessing included.",
+            labels,
+            ctx.SECONDS,
+        )
+        self._histogram(
+            lines,
+            "activity_context_sync_seconds",
+            "The time spent syncing the context after the activities.",
+            labels,
+            ctx.CONTEXT_SYNC_SECONDS,
+        )
+
+        context = data.get(ste.FLOW_CONTEXT)
+        if context is not None:
+            size = len(json.dumps(context.store.local_context, default=str).encode("utf8"))
+            self._gauge(
+                lines,
+                "context_size_bytes",
+                "The size of the flow context, serialized as JSON.",
+                [(labels, size)],
+            )
+
+        exceptions = {}
+        for path, values in self._exceptions(data):
+            for exception in values[self._exception_counts.get(path, 0) :]:
+                exception_type = exception.get(ctx.TYPE, Status.UNKNOWN)
+                exceptions[exception_type] = exceptions.get(exception_type, 0) + 1
+        self._gauge(
+            lines,
+            "exceptions",
+            "The number of exceptions registered during the run, by exception type.",
+            [({**labels, "type": t}, count) for t, count in sorted(exceptions.items())],
+        )
+
+        lines.append("# EOF")
+        self._save(data, labels["block"], "\n".join(lines) + "\n")
+
+    def _histogram(self, lines, name, help_text, labels, metric):
+        by_type = {}
+        for _, activity_type, _, metrics in self._activities:
+            if metrics.get(metric) is not None:
+                by_type.setdefault(activity_type, []).append(metrics[metric])
+
+        name = OpenMetricsExporter.PREFIX + name
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for activity_type, values in sorted(by_type.items(), key=str):
+            type_labels = {**labels, "type": activity_type}
+            for bound in OpenMetricsExporter.BUCKETS:
+                count = sum(1 for value in values if value <= bound)
+                lines.append(self._sample(f"{name}_bucket", {**type_labels, "le": bound}, count))
+            lines.append(
+                self._sample(f"{name}_bucket", {**type_labels, "le": "+Inf"}, len(values))
+            )
+            lines.append(self._sample(f"{name}_count", type_labels, len(values)))
+            lines.append(self._sample(f"{name}_sum", type_labels, sum(values)))
+
+    def _gauge(self, lines, name, help_text, samples):
+        name = OpenMetricsExporter.PREFIX + name
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples:
+            lines.append(self._sample(name, labels, value))
+
+    @staticmethod
+    def _sample(name, labels, value):
+        label_text = ",".join(
+            f'{key}="{OpenMetricsExporter._escape(value)}"' for key, value in labels.items()
+        )
+        return f"{name}{{{label_text}}} {value}"
+
+    @staticmethod
+    def _escape(value):
+        text = str(value) if value is not None else ""
+        return text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    def _save(self, data, block_id, text):
+        flow_config = data.get(ste.FLOW_CONFIG)
+        instrumentation = flow_config.instrumentation if flow_config is not None else {}
+        path = instrumentation.get("openMetricsFile", "autor-{activityBlockId}.prom")
+        path = path.replace("{activityBlockId}", str(block_id))
+
+        # Write to a temporary file and rename, so that a scraper never sees a partial file.
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile(
+            "w", dir=directory, suffix=".tmp", delete=False, encoding="utf8"
+        ) as file:
+            file.write(text)
+        os.chmod(file.name, 0o644)  # Readable by the scraper. Temporary files are private.
+        os.replace(file.name, path)
+
+        logging.info("OpenMetrics written to: %s", path)
@@ -0,0 +1,266 @@
+#  Copyright 2022-Present Autor contributors
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from autor.framework.keys import FlowContextKeys as ctx
+from autor.framework.keys import StateKeys as ste
+from autor.framework.state import State
+from autor.framework.state_listener import StateListener
+
+# pylint: disable=no-member
+
+
+class TraceEventExporter(StateListener):
+    """
+    Writes the timeline of an activity block run as a Chrome trace-event file, that can be
+    opened in Perfetto (https://ui.perfetto.dev) or chrome://tracing.
+
+    The timeline has nested spans for the flow, the activity block, the activities and their
+    phases (preprocess, run, postprocess, see ActivityMetrics), an instant event for every
+    state change and a span for every call of a listener hook. Recording the listener calls
+    enables the state timings of the StateHandler.
+
+    The activities are drawn on the track of the activity block thread. The main activities
+    that run in parallel get one track ("lane") each: an activity that starts while others are
+    running is drawn on the first free lane. The activity groups are async spans, that end when
+    the last of their activities has ended.
+
+    The file is written at FRAMEWORK_END to the path in the Flow Configuration:
+
+        instrumentation:
+          traceFile: trace.json  # Default: autor-trace-<flow run id>.json
+    """
+
+    def __init__(self):
+        self._events = []
+        self._pid = os.getpid()
+        self._tid = None  # The thread that runs the activity block.
+        self._handler = None
+        # Open spans: [name, category, start, args]
+        self._flow = None
+        self._block = None
+        self._activities = {}  # Activity run id -> open span. Main activities can run in parallel.
+        self._lanes = {}  # Activity run id -> lane. 0: the thread of the activity block.
+        self._lane_names = set()  # The lanes that have a thread_name metadata event.
+        # Group spans: {"span": [name, category, start, args], "id": int, "activities": set of
+        # open activity run ids, "end": None until closed}. Emitted when closed and empty.
+        self._group = None
+        self._group_count = 0
+        self._activity_groups = {}  # Activity run id -> its group
+
+    def on_state(self, state: State):
+        now = time.monotonic()
+        data = state.dict
+        name = state.name
+
+        if name == State.FRAMEWORK_START:
+            self._tid = threading.get_ident()
+            self._handler = data.get(ste.STATE_HANDLER)
+            if self._handler is not None:
+                self._handler.enable_timings(spans=True)
+            self._flow = [f"flow: {data.get(ste.FLOW_ID)}", "flow", now, {}]
+
+        self._instant(name, now)
+
+        if name == State.BEFORE_ACTIVITY_BLOCK:
+            block_id = data.get(ste.ACTIVITY_BLOCK_ID)
+            self._block = [f"activity block: {block_id}", "block", now, {}]
+
+        elif name == State.BEFORE_ACTIVITY_PREPROCESS:
+            group = data.get(ste.ACTIVITY_GROUP_TYPE)
+            if self._group is not None and self._group["span"][3]["group"] != group:
+                self._close_group(now)
+            if self._group is None:
+                self._group_count = self._group_count + 1
+                self._group = {
+                    "span": [f"group: {group}", "group", now, {"group": group}],
+                    "id": self._group_count,
+                    "activities": set(),
+                    "end": None,
+                }
+            self._start_activity(data, now)
+
+        elif name == State.AFTER_ACTIVITY_POSTPROCESS:
+            self._end_activity(data.get(ste.ACTIVITY_RUN_ID), data, now)
+
+        elif name in (State.BEFORE_ACTIVITY_BLOCK_CALLBACKS, State.AFTER_ACTIVITY_BLOCK):
+            self._close_group(now)
+            if name == State.AFTER_ACTIVITY_BLOCK:
+                self._end("_block", now)
+
+        elif name == State.FRAMEWORK_END:
+            for run_id in list(self._activities):
+                self._end_activity(run_id, {}, now)
+            self._close_group(now)
+            for span in ("_block", "_flow"):
+                self._end(span, now)
+            self._add_listener_spans()
+            self._write(data)
+
+    def _start_activity(self, data, now):
+        run_id = data.get(ste.ACTIVITY_RUN_ID)
+        self._activities[run_id] = [
+            f"activity: {data.get(ste.ACTIVITY_ID)}",
+            "activity",
+            now,
+            {"type": data.get(ste.ACTIVITY_TYPE), "action": data.get(ste.ACTION)},
+        ]
+        lanes = set(self._lanes.values())
+        self._lanes[run_id] = next(lane for lane in range(len(lanes) + 1) if lane not in lanes)
+        self._group["activities"].add(run_id)
+        self._activity_groups[run_id] = self._group
+
+    def _lane_tid(self, lane):
+        # Lane 0 is the thread of the activity block, the others are numbered tracks.
+        if lane == 0:
+            return self._tid
+        if lane not in self._lane_names:
+            self._lane_names.add(lane)
+            self._events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": self._pid,
+                    "tid": lane,
+                    "args": {"name": f"parallel activities {lane}"},
+                }
+            )
+        return lane
+
+    def _close_group(self, now):
+        if self._group is None:
+            return
+        self._group["end"] = now
+        if not self._group["activities"]:
+            self._emit_group(self._group)
+        self._group = None
+
+    def _emit_group(self, group):
+        name, category, start, args = group["span"]
+        for phase, ts in (("b", start), ("e", group["end"])):
+            self._events.append(
+                {
+                    "name": name,
+                    "cat": category,
+                    "ph": phase,
+                    "id": group["id"],
+                    "ts": round(ts * 1_000_000),
+                    "pid": self._pid,
+                    "tid": self._tid,
+                    **({"args": args} if phase == "b" else {}),
+                }
+            )
+
+    def _end_activity(self, run_id, data, now):
+        activity = self._activities.pop(run_id, None)
+        if activity is None:
+            return
+        tid = self._lane_tid(self._lanes.pop(run_id))
+
+        # The phases are measured by the ActivityRunner, slightly outside the state changes.
+        activity_data = data.get(ste.INTERNAL_ACTIVITY_DATA)
+        metrics = getattr(activity_data, "metrics", None) or {}
+        phases = [
+            (phase, metrics[phase])
+            for phase in (ctx.PREPROCESS, ctx.RUN, ctx.POSTPROCESS)
+            if phase in metrics
+        ]
+        for phase, times in phases:
+            activity[2] = min(activity[2], times[ctx.START])
+            now = max(now, times[ctx.END])
+
+        if data.get(ste.ACTIVITY_INSTANCE) is not None:
+            activity[3]["status"] = data.get(ste.ACTIVITY_INSTANCE).status
+
+        # The group spans its activities, also the ones that end after the group has changed.
+        group = self._activity_groups.pop(run_id)
+        group["span"][2] = min(group["span"][2], activity[2])
+        group["activities"].discard(run_id)
+        if group["end"] is not None:
+            group["end"] = max(group["end"], now)
+            if not group["activities"]:
+                self._emit_group(group)
+
+        name, category, start, args = activity
+        self._complete(name, category, start, now, tid, args)
+        for phase, times in phases:
+            self._complete(phase, "phase", times[ctx.START], times[ctx.END], tid)
+
+    def _end(self, span, now):
+        value = getattr(self, span)
+        if value is None:
+            return
+        name, category, start, args = value
+        self._complete(name, category, start, now, self._tid, args)
+        setattr(self, span, None)
+
+    def _add_listener_spans(self):
+        if self._handler is None:
+            return
+        for name, hook, start, seconds, tid in self._handler.timing_spans():
+            category = "producer" if hook in ("on_before_state", "on_after_state") else "listener"
+            self._complete(f"{name}.{hook}", category, start, start + seconds, tid)
+
+    def _complete(self, name, category, start, end, tid, args=None):
+        # Whole microseconds: spans that end at the same time must end at the same timestamp.
+        start, end = round(start * 1_000_000), round(end * 1_000_000)
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": start,
+            "dur": max(end - start, 0),
+            "pid": self._pid,
+            "tid": tid,
+        }
+        if args:
+            event["args"] = args
+        self._events.append(event)
+
+    def _instant(self, name, now):
+        self._events.append(
+            {
+                "name": name,
+                "cat": "state",
+                "ph": "i",
+                "s": "t",
+                "ts": round(now * 1_000_000),
+                "pid": self._pid,
+                "tid": self._tid,
+            }
+        )
+
+    def _write(self, data):
+        flow_config = data.get(ste.FLOW_CONFIG)
+        instrumentation = flow_config.instrumentation if flow_config is not None else {}
+        path = instrumentation.get("traceFile", f"autor-trace-{data.get(ste.FLOW_RUN_ID)}.json")
+
+        # Sort: metadata first, parents before children with the same start time (longest first).
+        self._events.sort(key=lambda event: (event.get("ts", 0), -event.get("dur", 0)))
+        trace = {"traceEvents": self._events, "displayTimeUnit": "ms"}
+
+        # Write to a temporary file and rename, so that a reader never sees a partial file.
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile(
+            "w", dir=directory, suffix=".tmp", delete=False, encoding="utf8"
+        ) as file:
+            json.dump(trace, file)
+        os.replace(file.name, path)
+
+        logging.info("Trace events written to: %s", path)
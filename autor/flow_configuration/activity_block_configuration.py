@@ -80,6 +80,29 @@ class ActivityBlockConfiguration(Configurable):
             return Worker(self.__configuration_dict["worker"])
         raise RuntimeError(f"No 'worker' config in: {self.__configuration_dict!r}")
 
+    @property
+    def parallel(self) -> bool:
+        # Run the independent main activities in parallel, see ActivityDependencies.
+        return self.__configuration_dict.get("parallel", False)
+
+    @property
+    def max_workers(self) -> int:
+        # The max number of main activities running in parallel. None: the ThreadPoolExecutor
+        # default.
+        return self.__configuration_dict.get("maxWorkers", None)
+
+    @property
+    def depends_on(self) -> List[str]:
+        # The ids of the activity blocks that must have succeeded before this block is run by
+        # FlowRunner.
+        return self.__configuration_dict.get("dependsOn", [])
+
+    @property
+    def max_processes(self) -> int:
+        # The number of worker processes for the activities with 'executor: process'. None: the
+        # number of CPUs.
+        return self.__configuration_dict.get("maxProcesses", None)
+
     @property
     def activities(self) -> List[ActivityConfiguration]:
         if self.__activities == None:
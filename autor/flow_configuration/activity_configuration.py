@@ -44,6 +44,17 @@ class ActivityConfiguration(Configurable):
     def continue_on(self) -> List[str]:
         return self.__configuration_dict.get("continueOn", None)
 
+    @property
+    def timeout(self):
+        # The time limit of the run: seconds, or a string like "90s", "15m" or "2h". None: no
+        # limit. See ActivityWatchdog.
+        return self.__configuration_dict.get("timeout", None)
+
+    @property
+    def executor(self) -> str:
+        # See constants.ActivityExecutor. None: the default (thread).
+        return self.__configuration_dict.get("executor", None)
+
     def function(self, name: str) -> FunctionConfiguration:
         configuration_dict = {}
         if name in self.__configuration_dict["functions"]:
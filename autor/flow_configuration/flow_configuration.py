@@ -48,6 +48,30 @@ class FlowConfiguration:
             return self.__flow_configuration_dictionary["activityModules"]
         return []
 
+    @property
+    def context_sync(self) -> dict:
+        if "contextSync" in self.__flow_configuration_dictionary:
+            return self.__flow_configuration_dictionary["contextSync"]
+        return {}
+
+    @property
+    def instrumentation(self) -> dict:
+        if "instrumentation" in self.__flow_configuration_dictionary:
+            return self.__flow_configuration_dictionary["instrumentation"]
+        return {}
+
+    @property
+    def profile(self) -> dict:
+        if "profile" in self.__flow_configuration_dictionary:
+            return self.__flow_configuration_dictionary["profile"]
+        return {}
+
+    @property
+    def max_workers(self) -> int:
+        # The max number of activity blocks that FlowRunner runs at the same time. None: the
+        # ThreadPoolExecutor default.
+        return self.__flow_configuration_dictionary.get("maxWorkers", None)
+
     @property
     def helpers(self) -> dict:
         if "helpers" in self.__flow_configuration_dictionary:
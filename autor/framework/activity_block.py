@@ -15,8 +15,12 @@
 # The entry point to Autor
 # Call run() to run Autor.
 
+import concurrent.futures
+import contextvars
+import functools
 import importlib
 import logging
+import time
 import uuid
 from urllib.request import url2pathname
 
@@ -27,7 +31,14 @@ from autor.flow_configuration.flow_configuration_factory import (
 from autor.framework.activity_block_rules import ActivityBlockRules
 from autor.framework.activity_context import ActivityContext
 from autor.framework.activity_data import ActivityData
+from autor.framework.activity_dependencies import ActivityDependencies
+from autor.framework.activity_event_loop import ActivityEventLoop
+from autor.framework.activity_metrics import ActivityMetrics
+from autor.framework.activity_process_pool import ActivityProcessPool
+from autor.framework.activity_profiler import ActivityProfiler
+from autor.framework.activity_registry import ActivityRegistry
 from autor.framework.activity_runner import ActivityRunner
+from autor.framework.activity_watchdog import ActivityWatchdog
 from autor.framework.autor_framework_exception import (
     AutorFrameworkException,
     AutorFrameworkValueException,
@@ -36,13 +47,18 @@ from autor.framework.check import Check
 from autor.framework.constants import (
     AbortType,
     Action,
+    ActivityExecutor,
     ActivityGroupType,
     ExceptionType,
     Mode,
     Status,
+    SyncPolicy,
 )
 from autor.framework.context import Context
+from autor.framework.context_codec import ContextCodec
+from autor.framework.context_sync_policy import ContextSyncPolicy
 from autor.framework.debug_config import DebugConfig
+from autor.framework.flow_context_store import FlowContextStore
 from autor.framework.keys import FlowConfigurationKeys as cfg
 from autor.framework.keys import FlowContextKeys as ctx
 from autor.framework.keys import StateKeys as ste
@@ -50,6 +66,7 @@ from autor.framework.state import State
 from autor.framework.state_handler import StateHandler
 from autor.framework.state_listener import StateListener
 from autor.framework.state_producer import StateProducer
+from autor.framework.state_view import ABSENT
 from autor.framework.util import Util
 
 
@@ -63,6 +80,11 @@ class ActivityBlock(StateProducer):
         activity_block_id: str = None,
         flow_run_id: str = None,
         activity_name: str = None,
+        resume: bool = False,
+        profile: str = None,
+        profile_activities: list = None,
+        flow_store: FlowContextStore = None,
+        new_flow_run: bool = False,
     ):
         # fmt: off
         string = r"""
@@ -86,11 +108,37 @@ class ActivityBlock(StateProducer):
         # True, if the activity block has been aborted by the framework
         self._autor_aborted = False
         self._autor_aborted_reason = ""
+        # The exception that aborted the activity block. Kept here, not in the flow store: the
+        # store can be shared with the other activity blocks of the flow run.
+        self._autor_aborted_exception = None
 
         # The name of the activity to run.
         # Used only in Autor runs when only one activity is run.
         self._activity_name = activity_name
 
+        # If true, the activities that succeeded in a previous run of the same flow run
+        # are restored from their checkpoints instead of being run again.
+        self._resume = resume
+        if resume and flow_run_id is None:
+            raise AutorFrameworkValueException("Resuming an activity block requires flow_run_id")
+
+        # Profiling requested on the command line (see ActivityProfiler). Overrides the
+        # 'profile' section of the Flow Configuration.
+        self._profile = profile
+        self._profile_activities = profile_activities
+        self._activity_profiler = ActivityProfiler()
+
+        # Runs the activities that define 'async def run()'. Started by the first one.
+        self._event_loop = ActivityEventLoop(name=f"autor-{activity_block_id}-loop")
+
+        # Runs the activities with 'executor: process'. Started at set up if the block has any.
+        self._process_pool: ActivityProcessPool = None
+
+        # The time budget of the activity block in seconds (the expectedMaxDuration of its
+        # worker) and the time.monotonic() when it ends. None: no budget.
+        self._activity_block_budget: float = None
+        self._activity_block_deadline: float = None
+
 
         # Set Autor mode.
         #
@@ -124,16 +172,29 @@ class ActivityBlock(StateProducer):
 
         self._flow_run_id = flow_run_id
         self._flow_config = None # The configuration object representing the whole flow
-        self._flow_context = Context() # Empty context, focused on the root (flow) level
+        # The data of this flow run. Shared by all the contexts of the run. A store given by
+        # FlowRunner is shared with the other activity blocks of the run: the context is synced
+        # with the remote context only at the start and at the end of the block.
+        self._flow_store_shared = flow_store is not None
+        self._flow_store = flow_store if flow_store is not None else FlowContextStore()
+        # Empty context, focused on the root (flow) level
+        self._flow_context = Context(store=self._flow_store)
+        # The event bus of this run. The extensions of the run are registered here.
+        self._state_handler = StateHandler()
         self._flow_create_new_context = False
+        # Decides when the flow context is synced with the remote context.
+        self._context_sync_policy = ContextSyncPolicy()
 
         # If flow_run_id is provided, then we already have an existing flow
         # and context. Otherwise, it is the first job in a flow and a new flow_run_id
         # and flow context need to be created.
+        # FlowRunner gives the id of a new flow run to its first activity blocks (new_flow_run).
         if flow_run_id is None:
             #print("flow_run_id is NONE")
             self._flow_run_id = str(uuid.uuid4())
             self._flow_create_new_context = True
+        elif new_flow_run:
+            self._flow_create_new_context = True
 
         self._flow_context.id = self._flow_run_id
 
@@ -142,9 +203,13 @@ class ActivityBlock(StateProducer):
         self._activity_block_id = activity_block_id
         self._activity_block_run_id = str(uuid.uuid4())
         # Empty context focused on the activity block level
-        self._activity_block_context = Context(activity_block=activity_block_id)
+        self._activity_block_context = Context(
+            activity_block=activity_block_id, store=self._flow_store
+        )
         # A list of activities that is created as the activities are run.
         self._activity_block_activities = []
+        # [(activity type, metrics)] of the activities that have been run, see ActivityMetrics.
+        self._activity_block_metrics = []
         # [dict{str:str}] Exceptions in activity block callbacks.
         self._activity_block_callback_exceptions = []
         # Current status of the activity block. Updated as the activities are run.
@@ -174,12 +239,21 @@ class ActivityBlock(StateProducer):
         # Keep track of the configuration for the next main activity.
         self._next_main_index = 0
 
+        # Counters for the default names of the activities without a name.
+        self._bb_counter = 0
+        self._ba_counter = 0
+        self._ma_counter = 0
+        self._aa_counter = 0
+        self._ab_counter = 0
+
 
         # ---------------------------------  A C T I V I T Y   D A T A   --------------------------#
         self._activity_data:ActivityData = None # Contains activity data and the activity instance
         # fmt: on
 
     def run(self) -> dict:
+        # The store of the run for the code that is not given it (see Util.register_exception()).
+        current = self._flow_store.make_current()
         try:
             self._set_up()
             self._run()
@@ -190,7 +264,7 @@ class ActivityBlock(StateProducer):
 
         finally:
             if self._autor_aborted:
-                e = Util.get_abort_exception()
+                e = self._autor_aborted_exception
 
                 logging.error("\n%s", Util.format_banner("A U T O R   A B O R T E D"))
                 logging.error(f"Reason:     {self._autor_aborted_reason}")
@@ -198,8 +272,16 @@ class ActivityBlock(StateProducer):
                 logging.error("Stacktrace:", exc_info=e)
                 logging.error("\n%s", "*" * 100)
 
-            # Print all exeptions that occurred during the run
-            Util.print_all_exceptions()
+            # Print all exeptions that occurred during the run. FlowRunner prints the exceptions
+            # of a shared store when all the activity blocks have finished.
+            if not self._flow_store_shared:
+                self._flow_store.print_all_exceptions()
+            FlowContextStore.reset_current(current)
+
+    @property
+    def status(self) -> str:
+        """The status of the activity block run (see constants.Status)."""
+        return self._activity_block_status
 
     def _set_up(self):
         try:
@@ -210,6 +292,16 @@ class ActivityBlock(StateProducer):
 
             self._flow_config = self._get_flow_configuration()
             self._flow_id = self._flow_config.flow_id
+            self._context_sync_policy = ContextSyncPolicy.from_configuration(
+                self._flow_config.context_sync
+            )
+            if self._flow_store_shared:
+                self._context_sync_policy = ContextSyncPolicy(policy=SyncPolicy.END_OF_BLOCK)
+            if self._flow_config.instrumentation.get("stateTimings", False):
+                self._state_handler.enable_timings()
+            self._activity_profiler = ActivityProfiler.from_configuration(
+                self._flow_config.profile, self._profile, self._profile_activities
+            )
 
             # Read helpers configurations.
             # TODO: Re-work
@@ -218,13 +310,26 @@ class ActivityBlock(StateProducer):
             self._register_extensions(self._flow_config)
             # Load activity classes and make them discorverable.
             self._load_activity_modules(self._flow_config)
-            StateHandler.add_state_producer(self)
-            # ---------------------------------------------------------------#
-            StateHandler.change_state(State.FRAMEWORK_START)
-            # ---------------------------------------------------------------#
+            self._state_handler.add_state_producer(self)
+
+            # A shared store keeps the remote context set up by the extensions of the first
+            # activity block of the flow run: the later blocks do not replace it.
+            with self._flow_store.lock:
+                remote_context = self._flow_store.remote_context
+                # ---------------------------------------------------------------#
+                self._state_handler.change_state(State.FRAMEWORK_START)
+                # ---------------------------------------------------------------#
+                if self._flow_store_shared and remote_context is not None:
+                    self._flow_store.remote_context = remote_context
+                else:
+                    self._set_context_codec()
 
-            self._flow_context.sync_remote()
+            self._flow_context.sync_remote(force=True)  # Fetch the existing flow context.
+            if self._context_sync_policy.asynchronous and not self._flow_store_shared:
+                self._flow_context.start_sync_worker(self._context_sync_policy.queue_size)
             self._create_activities_configurations()
+            self._check_activities_configurations()
+            self._start_process_pool()
 
         except Exception as e:
             self._register_exception(
@@ -239,8 +344,10 @@ class ActivityBlock(StateProducer):
         # Run activities
         try:
             # ---------------------------------------------------------------#
-            StateHandler.change_state(State.BEFORE_ACTIVITY_BLOCK)
+            self._state_handler.change_state(State.BEFORE_ACTIVITY_BLOCK)
             # ---------------------------------------------------------------#
+            if self._activity_block_budget is not None:
+                self._activity_block_deadline = time.monotonic() + self._activity_block_budget
             if self._mode == Mode.ACTIVITY_IN_BLOCK:
                 self._run_activity_block()
             else:
@@ -256,7 +363,7 @@ class ActivityBlock(StateProducer):
         # Run callbacks
         try:
             # ---------------------------------------------------------------#
-            StateHandler.change_state(State.BEFORE_ACTIVITY_BLOCK_CALLBACKS)
+            self._state_handler.change_state(State.BEFORE_ACTIVITY_BLOCK_CALLBACKS)
             # ---------------------------------------------------------------#
             self._run_activity_block_callbacks()
         except Exception as e:
@@ -266,17 +373,28 @@ class ActivityBlock(StateProducer):
                 ExceptionType.ACTIVITY_BLOCK,
             )
 
+        # Wait for the asynchronous context syncs, so that the listeners see the final context.
+        try:
+            self._flow_context.drain_remote()
+        except Exception as e:
+            self._register_exception(
+                e, "Failed to sync the flow context", ExceptionType.ACTIVITY_BLOCK
+            )
+
         # Finalize activity block run
         try:
             # ---------------------------------------------------------------#
-            StateHandler.change_state(State.AFTER_ACTIVITY_BLOCK)
+            self._state_handler.change_state(State.AFTER_ACTIVITY_BLOCK)
             # ---------------------------------------------------------------#
             self._activity_block_context.set(ctx.ACTIVITY_BLOCK_STATUS, self._activity_block_status)
+            self._activity_block_context.set(
+                ctx.METRICS_SUMMARY, ActivityMetrics.summarize(self._activity_block_metrics)
+            )
             if len(self._activity_block_callback_exceptions) > 0:
                 self._activity_block_context.set(
                     ctx.CALLBACK_EXCEPTIONS, self._activity_block_callback_exceptions
                 )
-            self._flow_context.sync_remote()
+            self._context_sync_policy.flush(self._flow_context)
 
             if DebugConfig.print_context_on_finished:
                 Util.print_dict(self._flow_context.local_context, "END CONTEXT")
@@ -293,9 +411,9 @@ class ActivityBlock(StateProducer):
         # Remove all listeners
         try:
             # ---------------------------------------------------------------#
-            StateHandler.change_state(State.FRAMEWORK_END)
+            self._state_handler.change_state(State.FRAMEWORK_END)
             # ---------------------------------------------------------------#
-            StateHandler().remove_all_listeners()
+            self._state_handler.remove_all_listeners()
             # logging.debug(f"FLOW ID: {self._flow_id}")
 
         except Exception as e:
@@ -303,6 +421,32 @@ class ActivityBlock(StateProducer):
                 e, "Unhandled exception during Autor tear down", ExceptionType.TEAR_DOWN
             )
 
+        # All the activities have finished.
+        self._event_loop.stop()
+        if self._process_pool is not None:
+            self._process_pool.shutdown()
+
+        # Push the context changes that the sync policy has not pushed yet.
+        try:
+            self._context_sync_policy.flush(self._flow_context)
+        except Exception as e:
+            self._register_exception(
+                e, "Failed to sync the flow context during tear down", ExceptionType.TEAR_DOWN
+            )
+        finally:
+            self._flow_context.stop_sync_worker()
+
+        if self._flow_context.remote_context is not None:
+            logging.debug(
+                "Context codec stats: %s", self._flow_context.remote_context.codec.stats()
+            )
+
+    # Use the codec selected in the Flow Configuration for serializing the remote context.
+    def _set_context_codec(self):
+        codec = self._flow_config.context_sync.get("codec")
+        if codec is not None and self._flow_context.remote_context is not None:
+            self._flow_context.remote_context.codec = ContextCodec.create(codec)
+
     # pylint: disable-next=redefined-builtin
     def _register_exception(self, e, description, type=None, abort_autor=True):
 
@@ -320,9 +464,15 @@ class ActivityBlock(StateProducer):
             )
 
         if abort_autor and not self._autor_aborted:
-            self._abort_autor(str(description))
-
-        Util.register_exception(ex=e, description=description, type=type)
+            self._abort_autor(str(description), e)
+
+        Util.register_exception(
+            ex=e,
+            store=self._flow_store,
+            description=description,
+            type=type,
+            state=self._state_handler.get_current_state_name(),
+        )
 
     def _get_flow_configuration(self):
         # TODO: Refactor, don't assume file URL
@@ -389,6 +539,55 @@ class ActivityBlock(StateProducer):
                 f"Could not create activity configurations: {e.__class__.__name__}: {str(e)}"
             ) from e
 
+    def _all_activities_configurations(self):
+        return (
+            self._activity_block_configs_before_block
+            + self._activity_block_configs_before_activity
+            + self._activity_block_configs_main_activities
+            + self._activity_block_configs_after_activity
+            + self._activity_block_configs_after_block
+        )
+
+    def _check_activities_configurations(self):
+        # Fail at set up, not when the activity is run.
+        for config in self._all_activities_configurations():
+            if config.executor not in (None, ActivityExecutor.THREAD, ActivityExecutor.PROCESS):
+                raise AutorFrameworkValueException(
+                    f"Unknown executor of activity {config.name!r}: {config.executor!r}"
+                )
+            ActivityWatchdog.to_seconds(config.timeout)
+
+        # The time budget of the activity block, see ActivityWatchdog.
+        try:
+            worker = self._activity_block_config.worker
+        except RuntimeError:
+            return  # No worker configuration.
+        self._activity_block_budget = ActivityWatchdog.to_seconds(
+            worker.expected_max_duration, "expectedMaxDuration"
+        )
+
+    def _start_process_pool(self):
+        # Spawn the worker processes before the first activity, so that the activities do not
+        # wait for the workers to import the activity modules.
+        configs = self._all_activities_configurations()
+        modules = list(self._flow_config.activity_modules or [])
+        for config in configs:
+            if config.executor == ActivityExecutor.PROCESS:
+                # The module of the activity class, if it is not one of the activity modules.
+                # An unknown type is reported when the activity is created.
+                try:
+                    module = ActivityRegistry.get_class(config.activity_type).__module__
+                except AutorFrameworkValueException:
+                    continue
+                if module not in modules and module != "__main__":
+                    modules.append(module)
+
+        if any(config.executor == ActivityExecutor.PROCESS for config in configs):
+            self._process_pool = ActivityProcessPool(
+                modules, max_workers=self._activity_block_config.max_processes
+            )
+            self._process_pool.start()
+
     def _create_data(self, activity_id, activity_group_type, activity_config):  # -> ActivityData
 
         self._print_activity_preparation_msg(
@@ -428,10 +627,18 @@ class ActivityBlock(StateProducer):
         data.flow_run_id            = self._flow_run_id
         data.flow_id                = self._flow_id
         data.activity_block_status  = self._activity_block_status
+        data.context_sync_policy    = self._context_sync_policy
+        data.activity_profiler      = self._activity_profiler
+        data.event_loop             = self._event_loop
+        data.process_pool           = self._process_pool
+        data.deadline               = self._activity_block_deadline
         # fmt: on
-        data.context = Context(activity_block=data.activity_block_id, activity=data.activity_id)
+        data.store = self._flow_store
+        data.context = Context(
+            activity_block=data.activity_block_id, activity=data.activity_id, store=data.store
+        )
         data.activity_context = ActivityContext(
-            activity_block=data.activity_block_id, activity=data.activity_id
+            activity_block=data.activity_block_id, activity=data.activity_id, store=data.store
         )
 
         if activity_group_type == ActivityGroupType.BEFORE_ACTIVITY:
@@ -490,7 +697,9 @@ class ActivityBlock(StateProducer):
     #   as expected framework usage errors and are handled by the framework rules.
     # Once the activity block status is set to ABORTED due to Autor being aborted,
     #  the status should not be changed afterwards.
-    def _abort_autor(self, abort_reason):
+    def _abort_autor(self, abort_reason, exception=None):
+        if self._autor_aborted_exception is None:
+            self._autor_aborted_exception = exception
         self._autor_aborted = True
         self._autor_aborted_reason = abort_reason
         self._activity_block_status = Status.ABORTED
@@ -500,12 +709,24 @@ class ActivityBlock(StateProducer):
             self._activity_data.activity_block_status = Status.ABORTED
 
     def _run_activity(self, activity_name, activity_id, activity_group_type, activity_config):
+        runner = ActivityRunner(self._state_handler)
+        if self._start_activity(
+            runner, activity_name, activity_id, activity_group_type, activity_config
+        ):
+            runner.run()
+        self._finish_activity(runner, self._activity_data)
+
+    # Select the action of the activity and start running it (see ActivityRunner). Returns True
+    # if runner.run() should be called.
+    def _start_activity(
+        self, runner, activity_name, activity_id, activity_group_type, activity_config
+    ) -> bool:
 
         rules = ActivityBlockRules()
         self._activity_data = self._create_data(activity_id, activity_group_type, activity_config)
 
         # ---------------------------------------------------------------------#
-        StateHandler.change_state(State.SELECT_ACTIVITY)
+        self._state_handler.change_state(State.SELECT_ACTIVITY)
         # ---------------------------------------------------------------------#
 
         # Run the activities in the activity block according to Autor rules.
@@ -523,16 +744,34 @@ class ActivityBlock(StateProducer):
                 f"Autor mode: {self._mode} not supported in _run_activity()"
             )
 
+        if self._resume and self._activity_data.action == Action.RUN:
+            self._activity_data.checkpoint = self._get_checkpoint(self._activity_data)
+
         # -----------------   R U N   A C T I V I T Y   --------------------- #
-        error_occurred = ActivityRunner().run_activity(self._activity_data)
+        return runner.start_activity(self._activity_data)
+
+    def _finish_activity(self, runner, data):
+        # The activity in the state is the one that is finished (see _run_in_parallel()).
+        self._activity_data = data
+
+        error_occurred = runner.finish_activity()
+        if data.metrics is not None:
+            self._activity_block_metrics.append((data.activity_type, data.metrics))
 
         if error_occurred:
-            self._abort_autor("Error occurred during activity run")
+            self._abort_autor("Error occurred during activity run", runner.error)
 
-        self._update_activity_lists(
-            self._activity_data.activity, activity_config, activity_group_type
-        )
-        self._updata_activity_block_status(rules, error_occurred)
+        self._update_activity_lists(data.activity, data.activity_config, data.activity_group_type)
+        self._updata_activity_block_status(ActivityBlockRules(), error_occurred)
+
+    # Return the checkpoint of an activity that succeeded in a previous run, otherwise None.
+    def _get_checkpoint(self, data):
+        checkpoint = data.context.get_from_activity(ctx.CHECKPOINT, default=None)
+        if checkpoint is None or checkpoint.get(ctx.ACTIVITY_STATUS) != Status.SUCCESS:
+            return None
+
+        logging.info("===== Restoring activity '%s' from checkpoint =====", data.activity_name)
+        return checkpoint
 
     def _run_activity_block(self):
         # Create an ordered list of data tuples that are needed for creating activities.
@@ -556,49 +795,25 @@ class ActivityBlock(StateProducer):
             )
 
         # -----------------------   M A I N - B L O C K   B E G I N   ---------------------------#
-        for act_conf_main in self._activity_block_configs_main_activities:
-            self._before_activities = []
-            self._after_activities = []
-            main_name = self._get_activity_name(act_conf_main, ActivityGroupType.MAIN_ACTIVITY)
-
-            # ----------------------- BEFORE-ACTIVITY --------------------------#
-            for act_conf_before in self._activity_block_configs_before_activity:
-                activity_id = (
-                    self._activity_block_name
-                    + "-"
-                    + main_name
-                    + "-"
-                    + self._get_activity_name(act_conf_before, ActivityGroupType.BEFORE_ACTIVITY)
-                )
-                self._run_activity(
-                    act_conf_before.name,
-                    activity_id,
-                    ActivityGroupType.BEFORE_ACTIVITY,
-                    act_conf_before,
-                )
+        if self._activity_block_config.parallel and self._mode == Mode.ACTIVITY_BLOCK:
+            self._run_main_activities_in_parallel()
+        else:
+            for act_conf_main in self._activity_block_configs_main_activities:
+                self._after_activities = []
+                main_name = self._get_activity_name(act_conf_main, ActivityGroupType.MAIN_ACTIVITY)
 
-            # ------------------------ MAIN-ACTIVITY ---------------------------#
-            activity_id = self._activity_block_name + "-" + main_name
-            self._run_activity(
-                act_conf_main.name, activity_id, ActivityGroupType.MAIN_ACTIVITY, act_conf_main
-            )
-            self._next_main_index = self._next_main_index + 1
-
-            # ------------------------ AFTER-ACTIVITY ---------------------------#
-            for act_conf_after in self._activity_block_configs_after_activity:
-                activity_id = (
-                    self._activity_block_name
-                    + "-"
-                    + main_name
-                    + "-"
-                    + self._get_activity_name(act_conf_after, ActivityGroupType.AFTER_ACTIVITY)
-                )
+                # ----------------------- BEFORE-ACTIVITY --------------------------#
+                self._run_before_activities(main_name)
+
+                # ------------------------ MAIN-ACTIVITY ---------------------------#
+                activity_id = self._activity_block_name + "-" + main_name
                 self._run_activity(
-                    act_conf_after.name,
-                    activity_id,
-                    ActivityGroupType.AFTER_ACTIVITY,
-                    act_conf_after,
+                    act_conf_main.name, activity_id, ActivityGroupType.MAIN_ACTIVITY, act_conf_main
                 )
+                self._next_main_index = self._next_main_index + 1
+
+                # ------------------------ AFTER-ACTIVITY ---------------------------#
+                self._run_after_activities(main_name)
 
         # ----------------------------   M A I N - B L O C K   E N D   ----------------------------#
 
@@ -616,33 +831,142 @@ class ActivityBlock(StateProducer):
                 act_conf_after_block,
             )
 
-    _bb_counter = 0
-    _ba_counter = 0
-    _ma_counter = 0
-    _aa_counter = 0
-    _ab_counter = 0
+    def _run_before_activities(self, main_name):
+        self._before_activities = []
+        for act_conf_before in self._activity_block_configs_before_activity:
+            activity_id = (
+                self._activity_block_name
+                + "-"
+                + main_name
+                + "-"
+                + self._get_activity_name(act_conf_before, ActivityGroupType.BEFORE_ACTIVITY)
+            )
+            self._run_activity(
+                act_conf_before.name,
+                activity_id,
+                ActivityGroupType.BEFORE_ACTIVITY,
+                act_conf_before,
+            )
+
+    def _run_after_activities(self, main_name):
+        for act_conf_after in self._activity_block_configs_after_activity:
+            activity_id = (
+                self._activity_block_name
+                + "-"
+                + main_name
+                + "-"
+                + self._get_activity_name(act_conf_after, ActivityGroupType.AFTER_ACTIVITY)
+            )
+            self._run_activity(
+                act_conf_after.name,
+                activity_id,
+                ActivityGroupType.AFTER_ACTIVITY,
+                act_conf_after,
+            )
+
+    # Run the main activities that do not depend on each other (see ActivityDependencies) at the
+    # same time. Only Activity.run() is called in the worker threads, or on the event loop if it
+    # is a coroutine (see ActivityEventLoop). The states are changed, and the before-activities,
+    # the after-activities and the preprocessing and postprocessing of the main activities are
+    # run, in this thread, one activity at a time.
+    #
+    # A main activity is started when the main activities that it depends on have finished.
+    # If the activity block is interrupted, the main activities that have not been started are
+    # skipped (see ActivityBlockRules). A main activity that can interrupt the block is run
+    # alone (see ActivityDependencies), so no later activity is running when it does.
+    def _run_main_activities_in_parallel(self):
+        configs = self._activity_block_configs_main_activities
+        main_names = [self._get_activity_name(c, ActivityGroupType.MAIN_ACTIVITY) for c in configs]
+        dependencies = ActivityDependencies(
+            configs,
+            self._activity_block_configs_before_activity
+            + self._activity_block_configs_after_activity,
+        )
+
+        pending = list(range(len(configs)))
+        finished = set()
+        running = {}  # Future -> (index, runner, activity data, before-activities)
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self._activity_block_config.max_workers,
+            thread_name_prefix=f"autor-{self._activity_block_id}",
+        ) as executor:
+            while pending or running:
+                for index in list(pending):
+                    if not dependencies.dependencies(index) <= finished:
+                        continue
+                    pending.remove(index)
+                    runner, data, before, run = self._start_main_activity(
+                        index, main_names[index]
+                    )
+                    if run:
+                        # Asynchronous activities run on the event loop, not in the pool.
+                        future = (
+                            runner.run_async()
+                            if runner.asynchronous
+                            else executor.submit(contextvars.copy_context().run, runner.run)
+                        )
+                        running[future] = (index, runner, data, before)
+                    else:
+                        self._finish_main_activity(main_names[index], runner, data, before)
+                        finished.add(index)
+
+                if running:
+                    done, _ = concurrent.futures.wait(
+                        running, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    for future in [f for f in running if f in done]:
+                        index, runner, data, before = running.pop(future)
+                        future.result()  # ActivityRunner.run() catches the exceptions.
+                        self._finish_main_activity(main_names[index], runner, data, before)
+                        finished.add(index)
+
+        self._next_main_index = len(configs)
+
+    def _start_main_activity(self, index, main_name):
+        config = self._activity_block_configs_main_activities[index]
+        self._next_main_index = index  # The main activity of the before-activities.
+        self._after_activities = []
+        self._run_before_activities(main_name)
+
+        runner = ActivityRunner(self._state_handler)
+        run = self._start_activity(
+            runner,
+            config.name,
+            self._activity_block_name + "-" + main_name,
+            ActivityGroupType.MAIN_ACTIVITY,
+            config,
+        )
+        return runner, self._activity_data, self._before_activities, run
+
+    def _finish_main_activity(self, main_name, runner, data, before_activities):
+        self._finish_activity(runner, data)
+        # The after-activities see the before- and after-activities of their main activity.
+        self._before_activities = before_activities
+        self._after_activities = data.after_activities
+        self._run_after_activities(main_name)
 
     def _get_activity_name(self, conf, group):
         default_name = "lll"
         if group == ActivityGroupType.BEFORE_BLOCK:
-            ActivityBlock._bb_counter = ActivityBlock._bb_counter + 1
-            default_name = cfg.BEFORE_BLOCK + str(ActivityBlock._bb_counter)
+            self._bb_counter = self._bb_counter + 1
+            default_name = cfg.BEFORE_BLOCK + str(self._bb_counter)
 
         elif group == ActivityGroupType.BEFORE_ACTIVITY:
-            ActivityBlock._ba_counter = ActivityBlock._ba_counter + 1
-            default_name = cfg.BEFORE_ACTIVITY + str(ActivityBlock._ba_counter)
+            self._ba_counter = self._ba_counter + 1
+            default_name = cfg.BEFORE_ACTIVITY + str(self._ba_counter)
 
         elif group == ActivityGroupType.MAIN_ACTIVITY:
-            ActivityBlock._ma_counter = ActivityBlock._ma_counter + 1
-            default_name = cfg.ACTIVITY + str(ActivityBlock._ma_counter)
+            self._ma_counter = self._ma_counter + 1
+            default_name = cfg.ACTIVITY + str(self._ma_counter)
 
         elif group == ActivityGroupType.AFTER_ACTIVITY:
-            ActivityBlock._aa_counter = ActivityBlock._aa_counter + 1
-            default_name = cfg.AFTER_ACTIVITY + str(ActivityBlock._aa_counter)
+            self._aa_counter = self._aa_counter + 1
+            default_name = cfg.AFTER_ACTIVITY + str(self._aa_counter)
 
         elif group == ActivityGroupType.AFTER_BLOCK:
-            ActivityBlock._ab_counter = ActivityBlock._ab_counter + 1
-            default_name = cfg.AFTER_BLOCK + str(ActivityBlock._ab_counter)
+            self._ab_counter = self._ab_counter + 1
+            default_name = cfg.AFTER_BLOCK + str(self._ab_counter)
         else:
             raise AutorFrameworkException("Unhandled ActivityGroupType: " + str(group))
 
@@ -681,6 +1005,8 @@ class ActivityBlock(StateProducer):
                         )
                         Util.register_exception(
                             exception,
+                            store=self._flow_store,
+                            state=self._state_handler.get_current_state_name(),
                             description=(
                                 f"Callback exception during activity: {activity.id}."
                                 + " Exception: {exception}"
@@ -749,8 +1075,7 @@ class ActivityBlock(StateProducer):
         Args:
             extension (StateListener): Extension to add to Autor.
         """
-        state_handler = StateHandler()
-        state_handler.add_state_listener(extension)
+        self._state_handler.add_state_listener(extension)
         if DebugConfig.print_loaded_extensions:
             Util.print_header("A D D E D   E X T E N S I O N")
             logging.debug(f"{extension.__class__}")
@@ -760,13 +1085,12 @@ class ActivityBlock(StateProducer):
 
         extensions = config.extensions
         if extensions:
-            state_handler = StateHandler()
             for extension in extensions:
                 [module_name, class_name] = extension.rsplit(".", 1)
                 module = importlib.import_module(module_name)
                 class_ = getattr(module, class_name)
                 instance = class_()
-                state_handler.add_state_listener(instance)
+                self._state_handler.add_state_listener(instance)
                 loaded_extension_names.append(extension)
 
         # ----------------- Debug prints -------------------------#
@@ -782,7 +1106,7 @@ class ActivityBlock(StateProducer):
             logging.debug("")
 
     def _unregister_extensions(self):
-        StateHandler().remove_all_listeners()
+        self._state_handler.remove_all_listeners()
 
     def _load_activity_modules(self, config: FlowConfiguration):
         modules = config.activity_modules
@@ -806,90 +1130,99 @@ class ActivityBlock(StateProducer):
             logging.debug("")
 
     # ---------------------- StateProducer implementation -----------------------#
+    # The state data is a live view over the activity block (see StateView): the listeners read
+    # and write the attributes below directly, nothing is copied on a state change.
+
     # fmt: off
     # pylint: disable=line-too-long
-    def on_before_state(self, state_name, state_data:dict) -> None:
+    # State key -> ActivityBlock attribute
+    _STATE_ATTRIBUTES = {
         # Flow
-        state_data[ste.FLOW_ID]                     = self._flow_id
-        state_data[ste.FLOW_CONFIG_URL]             = self._flow_config_url
-        state_data[ste.FLOW_RUN_ID]                 = self._flow_run_id
-        state_data[ste.FLOW_CONFIG]                 = self._flow_config
-        state_data[ste.FLOW_CONTEXT]                = self._flow_context
-        state_data[ste.FLOW_CREATE_NEW_CONTEXT]     = self._flow_create_new_context
+        ste.FLOW_ID:                                "_flow_id",
+        ste.FLOW_CONFIG_URL:                        "_flow_config_url",
+        ste.FLOW_RUN_ID:                            "_flow_run_id",
+        ste.FLOW_CONFIG:                            "_flow_config",
+        ste.FLOW_CONTEXT:                           "_flow_context",
+        ste.FLOW_CREATE_NEW_CONTEXT:                "_flow_create_new_context",
 
         # Activity Block
-        state_data[ste.ACTIVITY_BLOCK_ID]                   = self._activity_block_id
-        state_data[ste.ACTIVITY_BLOCK_RUN_ID]               = self._activity_block_run_id
-        state_data[ste.ACTIVITY_BLOCK_CONFIG]               = self._activity_block_config
-        state_data[ste.ACTIVITY_BLOCK_CONTEXT]              = self._activity_block_context
-        state_data[ste.ACTIVITY_BLOCK_ACTIVITIES]           = self._activity_block_activities
-        state_data[ste.ACTIVITY_BLOCK_CALLBACK_EXCEPTIONS]  = self._activity_block_callback_exceptions
-        state_data[ste.ACTIVITY_BLOCK_STATUS]               = self._activity_block_status
-        state_data[ste.ACTIVITY_BLOCK_INTERRUPTED]          = self._activity_block_interrupted
-        state_data[ste.ACTIVITY_BLOCK_LATEST_ACTIVITY]      = self._activity_block_latest_activity
-
-        state_data[ste.ACTIVITY_BLOCK_CONFIGS_MAIN_ACTIVITIES]  = self._activity_block_configs_main_activities
-        state_data[ste.ACTIVITY_BLOCK_CONFIGS_BEFORE_BLOCK]     = self._activity_block_configs_before_block
-        state_data[ste.ACTIVITY_BLOCK_CONFIGS_AFTER_BLOCK]      = self._activity_block_configs_after_block
-        state_data[ste.ACTIVITY_BLOCK_CONFIGS_BEFORE_ACTIVITY]  = self._activity_block_configs_before_activity
-        state_data[ste.ACTIVITY_BLOCK_CONFIGS_AFTER_ACTIVITY]   = self._activity_block_configs_after_activity
-
-        # Activity
-        if self._activity_data is not None:
-            state_data[ste.INTERNAL_ACTIVITY_DATA]  = self._activity_data
-            state_data[ste.ACTIVITY_ID]         = self._activity_data.activity_id
-            state_data[ste.ACTIVITY_RUN_ID]     = self._activity_data.activity_run_id
-            state_data[ste.ACTIVITY_NAME]       = self._activity_data.activity_name
-            state_data[ste.ACTIVITY_GROUP_TYPE] = self._activity_data.activity_group_type
-            state_data[ste.ACTIVITY_CONFIG]     = self._activity_data.activity_config
-            state_data[ste.ACTIVITY_TYPE]       = self._activity_data.activity_type
-            state_data[ste.ACTION]              = self._activity_data.action
+        ste.ACTIVITY_BLOCK_ID:                      "_activity_block_id",
+        ste.ACTIVITY_BLOCK_RUN_ID:                  "_activity_block_run_id",
+        ste.ACTIVITY_BLOCK_CONFIG:                  "_activity_block_config",
+        ste.ACTIVITY_BLOCK_CONTEXT:                 "_activity_block_context",
+        ste.ACTIVITY_BLOCK_ACTIVITIES:              "_activity_block_activities",
+        ste.ACTIVITY_BLOCK_CALLBACK_EXCEPTIONS:     "_activity_block_callback_exceptions",
+        ste.ACTIVITY_BLOCK_STATUS:                  "_activity_block_status",
+        ste.ACTIVITY_BLOCK_INTERRUPTED:             "_activity_block_interrupted",
+        ste.ACTIVITY_BLOCK_LATEST_ACTIVITY:         "_activity_block_latest_activity",
+
+        ste.ACTIVITY_BLOCK_CONFIGS_MAIN_ACTIVITIES: "_activity_block_configs_main_activities",
+        ste.ACTIVITY_BLOCK_CONFIGS_BEFORE_BLOCK:    "_activity_block_configs_before_block",
+        ste.ACTIVITY_BLOCK_CONFIGS_AFTER_BLOCK:     "_activity_block_configs_after_block",
+        ste.ACTIVITY_BLOCK_CONFIGS_BEFORE_ACTIVITY: "_activity_block_configs_before_activity",
+        ste.ACTIVITY_BLOCK_CONFIGS_AFTER_ACTIVITY:  "_activity_block_configs_after_activity",
+    }
+
+    # State key -> ActivityData attribute. Present only while there is an activity.
+    _STATE_ACTIVITY_ATTRIBUTES = {
+        ste.ACTIVITY_ID:            "activity_id",
+        ste.ACTIVITY_RUN_ID:        "activity_run_id",
+        ste.ACTIVITY_NAME:          "activity_name",
+        ste.ACTIVITY_GROUP_TYPE:    "activity_group_type",
+        ste.ACTIVITY_CONFIG:        "activity_config",
+        ste.ACTIVITY_TYPE:          "activity_type",
+        ste.ACTION:                 "action",
+        ste.ACTIVITY_INSTANCE:      "activity",
+    }
+
+    # The keys that the listeners may not change.
+    _READ_ONLY_STATE_KEYS = (
+        ste.ACTIVITY_BLOCK_RUN_ID,
+        ste.ACTIVITY_RUN_ID,
+        ste.INTERNAL_ACTIVITY_DATA,
+    )
+    # fmt: on
+    # pylint: enable=line-too-long
 
-            if self._activity_data.activity is not None:
-                state_data[ste.ACTIVITY_INSTANCE] = self._activity_data.activity
+    def state_fields(self) -> dict:
+        fields = {}
 
+        for key, attribute in ActivityBlock._STATE_ATTRIBUTES.items():
+            fields[key] = (
+                functools.partial(getattr, self, attribute),
+                functools.partial(setattr, self, attribute),
+            )
 
+        for key, attribute in ActivityBlock._STATE_ACTIVITY_ATTRIBUTES.items():
+            fields[key] = (
+                functools.partial(self._get_activity_data_attribute, attribute),
+                functools.partial(self._set_activity_data_attribute, attribute),
+            )
 
+        fields[ste.INTERNAL_ACTIVITY_DATA] = (
+            lambda: self._activity_data if self._activity_data is not None else ABSENT,
+            None,
+        )
 
-    def on_after_state(self, state_name, state_data:dict) -> None:
+        for key in ActivityBlock._READ_ONLY_STATE_KEYS:
+            fields[key] = (fields[key][0], None)
 
-        # Flow
-        self._flow_id                   = state_data[ste.FLOW_ID]
-        self._flow_config_url           = state_data[ste.FLOW_CONFIG_URL]
-        self._flow_run_id               = state_data[ste.FLOW_RUN_ID]
-        self._flow_config               = state_data[ste.FLOW_CONFIG]
-        self._flow_context              = state_data[ste.FLOW_CONTEXT]
-        self._flow_create_new_context   = state_data[ste.FLOW_CREATE_NEW_CONTEXT]
+        return fields
 
-        # Activity Block
-        self._activity_block_id                     = state_data[ste.ACTIVITY_BLOCK_ID]
-        self._activity_block_run_id                 = state_data[ste.ACTIVITY_BLOCK_RUN_ID]
-        self._activity_block_context                = state_data[ste.ACTIVITY_BLOCK_CONTEXT]
-        self._activity_block_config                 = state_data[ste.ACTIVITY_BLOCK_CONFIG]
-        self._activity_block_activities             = state_data[ste.ACTIVITY_BLOCK_ACTIVITIES]
-        self._activity_block_callback_exceptions    = state_data[ste.ACTIVITY_BLOCK_CALLBACK_EXCEPTIONS]
-        self._activity_block_status                 = state_data[ste.ACTIVITY_BLOCK_STATUS]
-        self._activity_block_interrupted            = state_data[ste.ACTIVITY_BLOCK_INTERRUPTED]
-        self._activity_block_latest_activity        = state_data[ste.ACTIVITY_BLOCK_LATEST_ACTIVITY]
-
-        self._activity_block_configs_main_activities    = state_data[ste.ACTIVITY_BLOCK_CONFIGS_MAIN_ACTIVITIES]
-        self._activity_block_configs_before_block       = state_data[ste.ACTIVITY_BLOCK_CONFIGS_BEFORE_BLOCK]
-        self._activity_block_configs_after_block        = state_data[ste.ACTIVITY_BLOCK_CONFIGS_AFTER_BLOCK]
-        self._activity_block_configs_before_activity    = state_data[ste.ACTIVITY_BLOCK_CONFIGS_BEFORE_ACTIVITY]
-        self._activity_block_configs_after_activity     = state_data[ste.ACTIVITY_BLOCK_CONFIGS_AFTER_ACTIVITY]
-
-        # Activity
-        if self._activity_data is not None:
-            self._activity_data                     = state_data[ste.INTERNAL_ACTIVITY_DATA]
-            self._activity_data.activity_id         = state_data[ste.ACTIVITY_ID]
-            self._activity_data.activity_run_id     = state_data[ste.ACTIVITY_RUN_ID]
-            self._activity_data.activity_name       = state_data[ste.ACTIVITY_NAME]
-            self._activity_data.activity_group_type = state_data[ste.ACTIVITY_GROUP_TYPE]
-            self._activity_data.activity_config     = state_data[ste.ACTIVITY_CONFIG]
-            self._activity_data.activity_type       = state_data[ste.ACTIVITY_TYPE]
-            self._activity_data.action              = state_data[ste.ACTION]
-
-            if ste.ACTIVITY_INSTANCE in state_data:
-                self._activity_data.activity        = state_data[ste.ACTIVITY_INSTANCE]
-    # fmt: on
-    # pylint: enable=line-too-long
+    def _get_activity_data_attribute(self, attribute):
+        if self._activity_data is None:
+            return ABSENT
+        value = getattr(self._activity_data, attribute)
+        # The activity instance is in the state only after it has been created.
+        if value is None and attribute == "activity":
+            return ABSENT
+        return value
+
+    def _set_activity_data_attribute(self, attribute, value):
+        setattr(self._activity_data, attribute, value)
+
+    def on_before_state(self, state_name, state_data: dict) -> None:
+        pass
+
+    def on_after_state(self, state_name, state_data: dict) -> None:
+        pass
@@ -64,5 +64,16 @@ class ActivityBlockCallback:
         This method will be called after all the activities in the activity block have finished \
             running AND the run_on condition provided in the constructor is fulfilled. """
 
+    def attach(self, activity) -> None:
+        """Set the activity that the callback belongs to, e.g. after the callback has been
+        returned from a worker process (see ActivityProcessPool)."""
+        self.__activity = activity
+
+    def __getstate__(self):
+        # Pickled without the activity: the activity is not sent between processes.
+        state = self.__dict__.copy()
+        state["_ActivityBlockCallback__activity"] = None
+        return state
+
     def __str__(self):
         return f"{self.__class__.__name__}: {str(vars(self))}"
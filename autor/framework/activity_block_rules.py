@@ -662,6 +662,8 @@ class ActivityBlockRules:
 
         # See the diagram for the rules: https://jira-dowhile.atlassian.net/l/c/w3pkZPM1
         activity_status = activity.status
+        if activity_status == Status.TIMEOUT:
+            activity_status = Status.ERROR  # A timed-out activity affects the block as an error.
         new_block_status = current_block_status
 
         if autor_aborted:
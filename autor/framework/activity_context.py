@@ -12,15 +12,16 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 from autor.framework.context import Context
+from autor.framework.flow_context_store import FlowContextStore
 
 
 # A Context class wrapper for activities. It allows to read values from anywhere in the context, but
 # limits writing to the area that belongs to the given activity.
 class ActivityContext:
-    def __init__(self, activity_block: str, activity: str):
+    def __init__(self, activity_block: str, activity: str, store: FlowContextStore = None):
         self._activity = activity
         self._activity_block = activity_block
-        self._context = Context(activity_block=activity_block, activity=activity)
+        self._context = Context(activity_block=activity_block, activity=activity, store=store)
 
     def get_from_activity(
         self,
@@ -12,10 +12,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 from autor.framework.activity_context import ActivityContext
+from autor.framework.activity_event_loop import ActivityEventLoop
+from autor.framework.activity_process_pool import ActivityProcessPool
+from autor.framework.activity_profiler import ActivityProfiler
 from autor.framework.autor_framework_exception import AutorFrameworkException
 from autor.framework.constants import ActivityGroupType
 from autor.framework.context import Context
 from autor.framework.context_properties_handler import ContextPropertiesHandler
+from autor.framework.context_sync_policy import ContextSyncPolicy
+from autor.framework.flow_context_store import FlowContextStore
 
 
 class ActivityData:
@@ -42,7 +47,20 @@ class ActivityData:
 
         self.activity_context:ActivityContext = None
         self.context:Context = None
+        self.store:FlowContextStore = None # The data of the flow run, shared by its contexts.
         self.context_properties_handler:ContextPropertiesHandler = None
+        self.context_sync_policy:ContextSyncPolicy = None
+        self.activity_profiler:ActivityProfiler = None
+        # Runs the activities that define 'async def run()'. Shared by the activity block.
+        self.event_loop:ActivityEventLoop = None
+        # time.monotonic() when the budget of the activity block ends, None: no budget.
+        self.deadline:float = None
+        # Runs the activities with 'executor: process'. Shared by the activity block.
+        self.process_pool:ActivityProcessPool = None
+        # Resume: the checkpoint of the activity from a previous run (the activity is not run).
+        self.checkpoint:dict = None
+        # The timing and resource usage of the activity run, see ActivityMetrics.
+        self.metrics:dict = None
 
         self.activities = []
         self.activities_by_name = {}
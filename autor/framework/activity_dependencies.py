@@ -0,0 +1,129 @@
+#  Copyright 2022-Present Autor contributors
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+from typing import List, Set
+
+from autor import Activity
+from autor.flow_configuration.activity_configuration import ActivityConfiguration
+from autor.framework.activity_block_rules import ActivityBlockRules
+from autor.framework.activity_registry import ActivityRegistry
+from autor.framework.autor_framework_exception import AutorFrameworkValueException
+from autor.framework.constants import ActivityGroupType, Status
+from autor.framework.context_properties_registry import ContextPropertiesRegistry
+
+
+class ActivityDependencies:
+    """
+    The dependencies between the main activities of an activity block, derived from the @input
+    and @output properties of the activity classes (see ContextPropertiesRegistry). Used for
+    running the independent main activities of a block in parallel.
+
+    A main activity depends on an earlier main activity if it reads a property that the earlier
+    one writes, or writes a property that the earlier one reads or writes. The properties of the
+    before- and after-activities count as properties of every main activity. The properties of
+    the Activity class (status) are written by every activity and are not dependencies.
+
+    A main activity with a runOn configuration depends on all the earlier main activities: its
+    action depends on their statuses. A main activity whose class is not registered depends on
+    all the earlier ones, and all the later ones depend on it.
+
+    A main activity that can interrupt the activity block depends on all the earlier main
+    activities, and all the later ones depend on it, so that no later activity is running
+    when the block is interrupted. It can interrupt the block unless its continueOn, and that
+    of every before- and after-activity, is [ALL]. With the default continueOn, the main
+    activities are run one at a time. To run them in parallel:
+
+        activityBlocks:
+          build:
+            parallel: true
+            activities:
+              - type: COMPILE_DOCS
+                continueOn: [ALL]
+              - type: COMPILE_CODE
+                continueOn: [ALL]
+    """
+
+    def __init__(
+        self,
+        main_activities: List[ActivityConfiguration],
+        group_activities: List[ActivityConfiguration] = None,
+    ):
+        """
+        Arguments:
+            main_activities {[ActivityConfiguration]} -- The main activities, in run order.
+            group_activities {[ActivityConfiguration]} -- The before- and after-activities.
+        """
+        shared = [ActivityDependencies._properties(c) for c in group_activities or []]
+        shared_inputs = set().union(*(inputs for inputs, _ in shared if inputs is not None))
+        shared_outputs = set().union(*(outputs for _, outputs in shared if outputs is not None))
+        shared_unknown = any(inputs is None for inputs, _ in shared)
+        # The before- and after-activities have the same default continueOn.
+        shared_interrupt = any(
+            ActivityDependencies._can_interrupt(c, ActivityGroupType.BEFORE_ACTIVITY)
+            for c in group_activities or []
+        )
+
+        self._dependencies: List[Set[int]] = []
+        properties = []
+        for index, config in enumerate(main_activities):
+            inputs, outputs = ActivityDependencies._properties(config)
+            # Depends on all the earlier ones and all the later ones depend on it.
+            barrier = (
+                inputs is None
+                or shared_unknown
+                or shared_interrupt
+                or ActivityDependencies._can_interrupt(config, ActivityGroupType.MAIN_ACTIVITY)
+            )
+            if not barrier:
+                inputs, outputs = inputs | shared_inputs, outputs | shared_outputs
+
+            dependencies = set()
+            for earlier, (earlier_inputs, earlier_outputs) in enumerate(properties):
+                if (
+                    barrier
+                    or earlier_inputs is None
+                    or config.run_on is not None
+                    or inputs & earlier_outputs
+                    or outputs & (earlier_inputs | earlier_outputs)
+                ):
+                    dependencies.add(earlier)
+
+            self._dependencies.append(dependencies)
+            properties.append((None, None) if barrier else (inputs, outputs))
+
+    def dependencies(self, index: int) -> Set[int]:
+        """Return the indexes of the main activities that the main activity 'index' depends on."""
+        return self._dependencies[index]
+
+    @staticmethod
+    def _can_interrupt(config: ActivityConfiguration, activity_group_type: str) -> bool:
+        continue_on = config.continue_on
+        if continue_on is None:
+            continue_on = ActivityBlockRules.DEFAULT_CONTINUE_ON[activity_group_type]
+        return Status.ALL not in continue_on
+
+    @staticmethod
+    def _properties(config: ActivityConfiguration):
+        # (input property names, output property names) of the activity. (None, None): unknown.
+        try:
+            cls = ActivityRegistry.get_class(config.activity_type)
+        except AutorFrameworkValueException:
+            return None, None
+
+        inputs = ContextPropertiesRegistry.get_class_input_properties(cls)
+        outputs = ContextPropertiesRegistry.get_class_output_properties(cls)
+        return ActivityDependencies._names(inputs), ActivityDependencies._names(outputs)
+
+    @staticmethod
+    def _names(properties):
+        return {p.name for p in properties if p.class_name != Activity.__name__}
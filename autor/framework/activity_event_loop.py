@@ -0,0 +1,74 @@
+#  Copyright 2022-Present Autor contributors
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from typing import Coroutine
+
+
+class ActivityEventLoop:
+    """
+    The asyncio event loop of an activity block, for the activities that define
+    'async def run()'. The loop is run in a daemon thread that is started when the first
+    coroutine is submitted, so blocks without asynchronous activities do not start it.
+
+    All the asynchronous activities of a block share the loop: the main activities of a
+    parallel block (see ActivityBlock) overlap their waits on the loop instead of using a
+    thread each.
+    """
+
+    def __init__(self, name: str = "autor-event-loop"):
+        self._name = name
+        self._loop: asyncio.AbstractEventLoop = None
+        self._thread: threading.Thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, coroutine: Coroutine) -> concurrent.futures.Future:
+        """Schedule 'coroutine' on the loop. Can be called in any thread.
+
+        Returns:
+            concurrent.futures.Future -- The result of the coroutine.
+        """
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._work, name=self._name, daemon=True)
+                self._thread.start()
+            return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def stop(self) -> None:
+        """Stop the loop, cancel the coroutines that are still running and close the loop."""
+        with self._lock:
+            if self._loop is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+            self._thread = None
+
+    def _work(self):
+        loop = self._loop
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_forever()
+        finally:
+            tasks = asyncio.all_tasks(loop)
+            if tasks:
+                logging.warning("Cancelling %d unfinished asynchronous activities", len(tasks))
+                for task in tasks:
+                    task.cancel()
+                loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
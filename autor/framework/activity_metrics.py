@@ -0,0 +1,157 @@
+#  Copyright 2022-Present Autor contributors
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import contextlib
+import math
+import sys
+import threading
+import time
+from typing import List
+
+from autor.framework.keys import FlowContextKeys as ctx
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
+
+# pylint: disable=no-member
+
+
+class ActivityMetrics:
+    """
+    The timing and the resource usage of one activity run. Created and filled by ActivityRunner,
+    saved under the key 'metrics' in the activity context:
+
+        metrics:
+          preprocess: {start: 1022.51, end: 1022.52, seconds: 0.01}  # time.monotonic()
+          run: {start: 1022.52, end: 1025.80, seconds: 3.28}         # only if the activity ran
+          postprocess: {start: 1025.80, end: 1025.83, seconds: 0.03}
+          seconds: 3.32              # preprocess start -> postprocess end
+          cpuSeconds: 3.1            # CPU time of the threads that ran the activity
+          peakRssDeltaKb: 2048       # growth of the peak RSS of the process, None if unknown
+          contextSyncSeconds: 0.02   # time spent syncing the context after the activity
+
+    If a phase is run in another thread than the one that created the metrics (the run of a
+    parallel activity, see ActivityBlock), the CPU time of that thread during the phase is
+    included in cpuSeconds. The CPU time of a run in a worker process (see ActivityProcessPool)
+    is added with add_cpu_seconds().
+    """
+
+    # The numeric metrics that are summarized per activity type, see summarize().
+    SUMMARIZED = (ctx.SECONDS, ctx.CPU_SECONDS, ctx.CONTEXT_SYNC_SECONDS)
+
+    def __init__(self):
+        self._phases = {}  # phase key -> [start, end]
+        self._thread = threading.get_ident()
+        self._cpu_start = time.thread_time()
+        # phase key -> (thread id, thread_time() at the start of the phase)
+        self._other_threads_cpu = {}
+        self._other_threads_cpu_seconds = 0.0
+        self._peak_rss_start = ActivityMetrics._peak_rss_kb()
+        self._context_sync_seconds = 0.0
+
+    def start(self, phase: str, cpu: bool = True) -> None:
+        """Start a phase. If 'cpu' is False, the CPU time of a phase run in another thread is not
+        included in cpuSeconds."""
+        self._phases[phase] = [time.monotonic(), None]
+        if cpu and threading.get_ident() != self._thread:
+            self._other_threads_cpu[phase] = (threading.get_ident(), time.thread_time())
+
+    def end(self, phase: str) -> None:
+        # A phase ends once: the run of a timed-out activity is ended by ActivityRunner, not by
+        # the interrupted thread.
+        if phase in self._phases and self._phases[phase][1] is None:
+            self._phases[phase][1] = time.monotonic()
+        thread, cpu_start = self._other_threads_cpu.get(phase, (None, None))
+        if thread == threading.get_ident():
+            del self._other_threads_cpu[phase]
+            self._other_threads_cpu_seconds = (
+                self._other_threads_cpu_seconds + time.thread_time() - cpu_start
+            )
+
+    def add_cpu_seconds(self, seconds: float) -> None:
+        """Include CPU time that was not used by a thread of this process."""
+        self._other_threads_cpu_seconds = self._other_threads_cpu_seconds + seconds
+
+    @contextlib.contextmanager
+    def context_sync(self):
+        """Measure a context sync."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._context_sync_seconds = (
+                self._context_sync_seconds + time.perf_counter() - start
+            )
+
+    def to_dict(self) -> dict:
+        metrics = {}
+        first_start, last_end = None, None
+        for phase, (start, end) in self._phases.items():
+            end = end if end is not None else time.monotonic()
+            metrics[phase] = {ctx.START: start, ctx.END: end, ctx.SECONDS: end - start}
+            first_start = start if first_start is None else min(first_start, start)
+            last_end = end if last_end is None else max(last_end, end)
+
+        metrics[ctx.SECONDS] = last_end - first_start if first_start is not None else 0.0
+        metrics[ctx.CPU_SECONDS] = (
+            time.thread_time() - self._cpu_start + self._other_threads_cpu_seconds
+        )
+        peak_rss = ActivityMetrics._peak_rss_kb()
+        metrics[ctx.PEAK_RSS_DELTA_KB] = (
+            peak_rss - self._peak_rss_start if peak_rss is not None else None
+        )
+        metrics[ctx.CONTEXT_SYNC_SECONDS] = self._context_sync_seconds
+        return metrics
+
+    @staticmethod
+    def summarize(metrics: List[tuple]) -> dict:
+        """Summarize the metrics of the activities of an activity block per activity type.
+
+        Arguments:
+            metrics {[(str, dict)]} -- (activity type, metrics) of each activity.
+        Returns:
+            {activity type: {"count": int, metric: {"p50": float, "p95": float, "max": float}}}
+        """
+        by_type = {}
+        for activity_type, activity_metrics in metrics:
+            by_type.setdefault(activity_type, []).append(activity_metrics)
+
+        summary = {}
+        for activity_type, all_metrics in by_type.items():
+            type_summary = {ctx.COUNT: len(all_metrics)}
+            for key in ActivityMetrics.SUMMARIZED:
+                values = sorted(m[key] for m in all_metrics if m.get(key) is not None)
+                if values:
+                    type_summary[key] = {
+                        ctx.P50: ActivityMetrics._percentile(values, 50),
+                        ctx.P95: ActivityMetrics._percentile(values, 95),
+                        ctx.MAX: values[-1],
+                    }
+            summary[activity_type] = type_summary
+        return summary
+
+    @staticmethod
+    def _percentile(sorted_values: list, percent: int) -> float:
+        # Nearest-rank percentile.
+        rank = math.ceil(percent / 100 * len(sorted_values))
+        return sorted_values[max(rank, 1) - 1]
+
+    @staticmethod
+    def _peak_rss_kb():
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Bytes on macOS, kilobytes elsewhere.
+        return peak // 1024 if sys.platform == "darwin" else peak
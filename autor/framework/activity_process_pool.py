@@ -0,0 +1,228 @@
+#  Copyright 2022-Present Autor contributors
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import asyncio
+import concurrent.futures
+import importlib
+import inspect
+import logging
+import multiprocessing
+import os
+import pickle
+import signal
+import threading
+import time
+import traceback
+from typing import List
+
+from autor.framework.autor_framework_exception import AutorFrameworkException
+
+
+class ActivityProcessPool:
+    """
+    Worker processes for the activities that are configured with 'executor: process', for
+    CPU-bound activities that would otherwise hold the GIL of the activity block process:
+
+        activities:
+          - type: CRUNCH
+            executor: process   # See constants.ActivityExecutor
+
+    The workers are spawned when the pool is started and import the 'activityModules' of the
+    Flow Configuration, so that running an activity only sends the activity type, its
+    configuration and the values of its @input properties. The worker returns the status, the
+    values of the @output properties and the ActivityBlockCallbacks of the activity.
+
+    The activity runs without the flow context: it reads its inputs from the @input properties
+    and self.context is empty.
+    """
+
+    def __init__(self, activity_modules: List[str], max_workers: int = None):
+        self._activity_modules = list(activity_modules or [])
+        self._max_workers = max_workers or os.cpu_count() or 1
+        self._executor: concurrent.futures.ProcessPoolExecutor = None
+        self._pids = None  # The workers put their process id here when they have started.
+        self._lock = threading.Lock()  # Parallel activities start and terminate the pool.
+
+    def start(self) -> None:
+        """Spawn the worker processes. Returns without waiting for them to be ready."""
+        with self._lock:
+            self._start()
+
+    def _start(self):
+        if self._executor is not None:
+            return
+        context = multiprocessing.get_context("spawn")
+        self._pids = context.SimpleQueue()
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self._max_workers,
+            mp_context=context,
+            initializer=_initialize,
+            initargs=(self._activity_modules, self._pids),
+        )
+        for _ in range(self._max_workers):
+            self._executor.submit(_ready)
+
+    def run(self, data, inputs: dict, timeout: float = None) -> "ActivityProcessResult":
+        """Run the activity of 'data' in a worker process and wait for the result.
+
+        Arguments:
+            data {ActivityData} -- The activity to run.
+            inputs {dict} -- The values of the @input properties of the activity.
+            timeout {float} -- Seconds to wait for the result. None: no limit.
+        Raises:
+            concurrent.futures.TimeoutError -- The activity did not finish in time. The worker
+                processes have been terminated (see terminate()).
+        """
+        arguments = {
+            "activity_id": data.activity_id,
+            "activity_run_id": data.activity_run_id,
+            "flow_id": data.flow_id,
+            "flow_run_id": data.flow_run_id,
+            "activity_block_id": data.activity_block_id,
+            "activity_block_run_id": data.activity_block_run_id,
+        }
+        with self._lock:
+            self._start()
+            future = self._executor.submit(
+                _run_activity, data.activity_type, data.activity_config, arguments, inputs
+            )
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            self.terminate()
+            raise
+
+    def terminate(self) -> None:
+        """Terminate the worker processes, e.g. when an activity has timed out: the activities
+        that are running in the other workers fail. The next run() starts new workers."""
+        with self._lock:
+            if self._executor is None:
+                return
+            # A worker that is still starting exits when it finds the pool shut down.
+            while not self._pids.empty():
+                try:
+                    os.kill(self._pids.get(), signal.SIGTERM)
+                except OSError:
+                    pass  # Already exited.
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._close()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._close()
+
+    def _close(self):
+        self._pids.close()
+        self._pids = None
+        self._executor = None
+
+
+class ActivityProcessResult:
+    """The outcome of an activity run in a worker process."""
+
+    def __init__(self, status, outputs, callbacks, exception, cpu_seconds):
+        self.status: str = status
+        self.outputs: dict = outputs  # @output property name -> value
+        self.callbacks: list = callbacks  # ActivityBlockCallbacks, without the activity
+        self.exception: Exception = exception  # Raised by Activity.run(), or None
+        self.cpu_seconds: float = cpu_seconds
+
+    def apply(self, activity) -> None:
+        """Copy the result to 'activity', the instance in the activity block process."""
+        for name, value in self.outputs.items():
+            setattr(activity, name, value)
+        activity.status = self.status
+        for callback in self.callbacks:
+            callback.attach(activity)
+            activity.activity_block_callbacks.append(callback)
+
+
+class RemoteTraceback(Exception):
+    """The traceback of an exception raised in a worker process."""
+
+
+# ------------------------------  W O R K E R   P R O C E S S  -----------------------------------#
+
+
+def _initialize(activity_modules, pids):
+    pids.put(os.getpid())
+    for module in activity_modules:
+        importlib.import_module(module)
+
+
+def _ready():
+    return os.getpid()
+
+
+def _run_activity(activity_type, activity_config, arguments, inputs) -> ActivityProcessResult:
+    # ActivityData imports this module.
+    # pylint: disable=import-outside-toplevel
+    from autor.framework.activity_context import ActivityContext
+    from autor.framework.activity_data import ActivityData
+    from autor.framework.activity_factory import ActivityFactory
+    from autor.framework.context import Context
+    from autor.framework.context_properties_handler import ContextPropertiesHandler
+    from autor.framework.context_properties_registry import ContextPropertiesRegistry
+    from autor.framework.flow_context_store import FlowContextStore
+
+    activity = ActivityFactory.create(activity_type)
+
+    data = ActivityData()
+    for name, value in arguments.items():
+        setattr(data, name, value)
+    data.activity_config = activity_config
+    data.store = FlowContextStore()
+    data.activity_context = ActivityContext(
+        activity_block=data.activity_block_id, activity=data.activity_id, store=data.store
+    )
+    data.context_properties_handler = ContextPropertiesHandler(
+        activity,
+        Context(activity_block=data.activity_block_id, activity=data.activity_id, store=data.store),
+    )
+    activity.set_arguments(data)
+    for name, value in inputs.items():
+        setattr(activity, name, value)
+
+    exception = None
+    start = time.thread_time()
+    try:
+        if inspect.iscoroutinefunction(activity.run):
+            asyncio.run(activity.run())
+        else:
+            activity.run()
+    except Exception as e:  # pylint: disable=broad-except
+        exception = _picklable(e)
+        exception.remote_traceback = traceback.format_exc()
+    cpu_seconds = time.thread_time() - start
+
+    outputs = {}
+    for prop in ContextPropertiesRegistry.get_output_properties(activity):
+        try:
+            outputs[prop.name] = getattr(activity, prop.name)
+        except AttributeError:
+            pass  # Not set: reported by the activity block, as for the other activities.
+
+    return ActivityProcessResult(
+        outputs.pop("status"), outputs, activity.activity_block_callbacks, exception, cpu_seconds
+    )
+
+
+def _picklable(exception):
+    try:
+        pickle.loads(pickle.dumps(exception))
+        return exception
+    except Exception:  # pylint: disable=broad-except
+        logging.debug("Exception not picklable: %r", exception)
+        return AutorFrameworkException(f"{exception.__class__.__name__}: {exception}")
@@ -0,0 +1,153 @@
+#  Copyright 2022-Present Autor contributors
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import contextlib
+import cProfile
+import logging
+import os
+import threading
+import tracemalloc
+from typing import List
+
+from autor.framework.autor_framework_exception import AutorFrameworkValueException
+from autor.framework.constants import ProfileMode
+
+
+class ActivityProfiler:
+    """
+    Profiles the runs of selected activities. The profiler is configured in the 'profile'
+    section of the Flow Configuration, or with the --profile and --profile-activities command
+    line arguments (that override the configuration):
+
+        profile:
+          mode: cpu              # See constants.ProfileMode
+          activities: [A1, A2]   # Activity names or ids. Default: all the activities
+          directory: profiles    # Where the reports are written. Default: the working directory
+          top: 25                # memory: the number of allocation sites in the report
+
+    The reports are named by the activity run id:
+        cpu     <activity run id>.pstats      (cProfile, open with pstats or snakeviz)
+        memory  <activity run id>.memory.txt  (the top allocation sites, from tracemalloc)
+
+    tracemalloc traces the whole process: allocations of other threads are included.
+    Only one activity is profiled at a time: when activities run in parallel, an activity that
+    starts while another one is being profiled is not profiled.
+    """
+
+    def __init__(
+        self,
+        mode: str = None,
+        activities: List[str] = None,
+        directory: str = ".",
+        top: int = 25,
+    ):
+        if mode not in (None, ProfileMode.CPU, ProfileMode.MEMORY):
+            raise AutorFrameworkValueException(f"Unknown profile mode: {mode!r}")
+        if not isinstance(top, int) or top < 1:
+            raise AutorFrameworkValueException(
+                f"Profile 'top' must be a positive integer, received: {top!r}"
+            )
+
+        self._mode = mode
+        self._activities = set(activities) if activities else None
+        self._directory = directory
+        self._top = top
+        self._lock = threading.Lock()  # Held while an activity is being profiled.
+
+    @staticmethod
+    def from_configuration(
+        configuration: dict, mode: str = None, activities: List[str] = None
+    ) -> "ActivityProfiler":
+        """Create the profiler from the 'profile' section of the Flow Configuration.
+        'mode' and 'activities' (e.g. from the command line) override the configuration."""
+        return ActivityProfiler(
+            mode=mode or configuration.get("mode"),
+            activities=activities or configuration.get("activities"),
+            directory=configuration.get("directory", "."),
+            top=configuration.get("top", 25),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self._mode is not None
+
+    def profiles(self, activity_name: str, activity_id: str) -> bool:
+        if self._mode is None:
+            return False
+        return self._activities is None or bool({activity_name, activity_id} & self._activities)
+
+    @contextlib.contextmanager
+    def profile(self, activity_name: str, activity_id: str, activity_run_id: str):
+        """Profile the code in the with-block if the activity is selected.
+        Yields a list that will contain the path of the report after the with-block."""
+        report = []
+        if not self.profiles(activity_name, activity_id):
+            yield report
+            return
+
+        if not self._lock.acquire(blocking=False):
+            logging.warning(
+                "Activity '%s' not profiled: another activity is being profiled", activity_id
+            )
+            yield report
+            return
+
+        try:
+            yield from self._profile(activity_id, activity_run_id, report)
+        finally:
+            self._lock.release()
+
+    def _profile(self, activity_id, activity_run_id, report):
+        os.makedirs(self._directory, exist_ok=True)
+        if self._mode == ProfileMode.CPU:
+            path = os.path.join(self._directory, f"{activity_run_id}.pstats")
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield report
+            finally:
+                profiler.disable()
+                profiler.dump_stats(path)
+                report.append(path)
+        else:
+            path = os.path.join(self._directory, f"{activity_run_id}.memory.txt")
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+            try:
+                yield report
+            finally:
+                after = tracemalloc.take_snapshot()
+                peak = tracemalloc.get_traced_memory()[1]
+                if started:
+                    tracemalloc.stop()
+                self._write_memory_report(path, activity_id, before, after, peak)
+                report.append(path)
+
+        logging.info("Profile of activity '%s' written to: %s", activity_id, path)
+
+    def _write_memory_report(self, path, activity_id, before, after, peak):
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        before = before.filter_traces(filters)
+        after = after.filter_traces(filters)
+
+        differences = after.compare_to(before, "lineno")
+
+        with open(path, "w", encoding="utf8") as file:
+            file.write(f"Activity: {activity_id}\n")
+            file.write(f"Traced memory peak (process): {peak / 1024:.1f} KiB\n")
+            file.write(f"Top {self._top} allocation sites (size change during the run):\n")
+            for difference in differences[: self._top]:
+                file.write(f"{difference}\n")
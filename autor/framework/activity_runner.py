@@ -11,14 +11,27 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import asyncio
+import concurrent.futures
+import contextlib
+import inspect
 import logging
+import time
 
 from autor.activity import Activity
 from autor.framework.activity_data import ActivityData
 from autor.framework.activity_factory import ActivityFactory
+from autor.framework.activity_metrics import ActivityMetrics
+from autor.framework.activity_process_pool import RemoteTraceback
+from autor.framework.activity_watchdog import (
+    ActivityInterrupt,
+    ActivityTimeoutException,
+    ActivityWatchdog,
+)
 from autor.framework.check import Check
-from autor.framework.constants import Action, ExceptionType, SkipType, Status
+from autor.framework.constants import ActivityExecutor, Action, ExceptionType, SkipType, Status
 from autor.framework.context_properties_handler import ContextPropertiesHandler
+from autor.framework.context_properties_registry import ContextPropertiesRegistry
 from autor.framework.debug_config import DebugConfig
 from autor.framework.keys import FlowContextKeys as ctx
 from autor.framework.state_handler import StateHandler
@@ -36,20 +49,169 @@ class ActivityRunner:
     It creates the activity, runs it.
     """
 
-    def __init__(self):
+    def __init__(self, state_handler: StateHandler):
+        self._state_handler = state_handler  # The event bus of the activity block run.
         self._data = None
+        self._metrics = None
         self._error_occurred = False  # An exception outside Activity.run().
+        self._error = None  # The first exception outside Activity.run().
         self._activity_run_exception_occurred = False  # An exception inside Activity.run()
+        self._running = False  # True between start_activity() and finish_activity().
+        self._run_exception = None  # The exception of run(), registered by finish_activity().
+        self._report = []  # The path of the profiling report, see ActivityProfiler.
+        self._watchdog = None  # Enforces the time limit of the run, None: no limit.
 
     def run_activity(self, data: ActivityData):
+        if self.start_activity(data):
+            self.run()
+        return self.finish_activity()
+
+    # The steps of run_activity(), for running Activity.run() in another thread. start_activity()
+    # and finish_activity() change the states: they must be called in the thread of the
+    # activity block. run() and run_async() can be called in any thread.
+    def start_activity(self, data: ActivityData) -> bool:
+        """Preprocess the activity and change the state to BEFORE_ACTIVITY_RUN.
+
+        Returns:
+            bool -- True if the activity should be run: call run() (or run_async()) and then
+                finish_activity(). If False, call only finish_activity().
+        """
         self._data = data
+        self._metrics = ActivityMetrics()
 
         self._preprocess()
-        self._run()
+        self._running = self._ok_to_run()
+        if self._running:
+            self._watchdog = self._create_watchdog()
+        return self._running and self._before_run()
+
+    @property
+    def asynchronous(self) -> bool:
+        """True if the activity defines 'async def run()'."""
+        return inspect.iscoroutinefunction(self._data.activity.run)
+
+    def run(self) -> None:
+        """Run the activity. An asynchronous activity is run on the event loop of the activity
+        block and this thread waits until it has finished. The exception of Activity.run() is
+        registered by finish_activity(). An activity with 'executor: process' is run in a worker
+        process of the activity block (see ActivityProcessPool). A run with a time limit is
+        interrupted when the limit is reached (see ActivityWatchdog)."""
+        if self._data.activity_config.executor == ActivityExecutor.PROCESS:
+            self._run_in_process()
+        elif self.asynchronous:
+            self.run_async().result()
+        elif self._watchdog is None:
+            self._run()
+        else:
+            self._watchdog.run(self._run)
+            self._metrics.end(ctx.RUN)  # Not ended by a thread that is still running.
+
+    def _run(self):
+        self._metrics.start(ctx.RUN)
+        try:
+            with self._profile() as self._report:
+                self._data.activity.run()
+        except ActivityInterrupt:
+            pass  # Timed out, see _after_run().
+        except Exception as e:
+            # The exception of a thread that outlived the timeout is not the outcome of the run.
+            if not self._data.activity.expired:
+                self._run_exception = e
+        finally:
+            self._metrics.end(ctx.RUN)
+
+    def run_async(self) -> concurrent.futures.Future:
+        """Start running an asynchronous activity on the event loop of the activity block.
+
+        Returns:
+            concurrent.futures.Future -- Done when the activity has finished.
+        """
+        return self._data.event_loop.submit(self._run_coroutine())
+
+    def _run_in_process(self):
+        # Not profiled: the profiler measures this process. The worker sends the CPU time.
+        activity = self._data.activity
+        inputs = {}
+        for prop in ContextPropertiesRegistry.get_input_properties(activity):
+            try:
+                inputs[prop.name] = getattr(activity, prop.name)
+            except AttributeError:
+                pass  # An optional input that is not in the context.
+
+        self._metrics.start(ctx.RUN)
+        try:
+            timeout = self._watchdog.seconds if self._watchdog is not None else None
+            result = self._data.process_pool.run(self._data, inputs, timeout)
+            result.apply(activity)
+            self._metrics.add_cpu_seconds(result.cpu_seconds)
+            e = result.exception
+            if e is not None and getattr(e, "remote_traceback", None):
+                e.__cause__ = RemoteTraceback(e.remote_traceback)
+            self._run_exception = e
+        except concurrent.futures.TimeoutError:
+            self._watchdog.expire()
+        except Exception as e:
+            self._run_exception = e
+        finally:
+            self._metrics.end(ctx.RUN)
+
+    async def _run_coroutine(self):
+        # The task has its own copy of the context variables of the loop thread.
+        self._data.store.make_current()
+        # The CPU time of the loop thread includes the other coroutines: not measured.
+        self._metrics.start(ctx.RUN, cpu=False)
+        try:
+            with self._profile() as self._report:
+                if self._watchdog is None:
+                    await self._data.activity.run()
+                else:
+                    await self._run_coroutine_with_timeout()
+        except Exception as e:
+            self._run_exception = e
+        finally:
+            self._metrics.end(ctx.RUN)
+
+    async def _run_coroutine_with_timeout(self):
+        task = asyncio.ensure_future(self._data.activity.run())
+        done, _ = await asyncio.wait({task}, timeout=self._watchdog.seconds)
+        if task in done:
+            task.result()  # Raises the exception of the activity.
+            return
+
+        self._watchdog.expire()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    def _create_watchdog(self):
+        # The time limit: the activity timeout or the rest of the activity block budget.
+        limits = []
+        timeout = ActivityWatchdog.to_seconds(self._data.activity_config.timeout)
+        if timeout is not None:
+            limits.append(timeout)
+        if self._data.deadline is not None:
+            limits.append(max(self._data.deadline - time.monotonic(), 0.0))
+        if not limits:
+            return None
+        return ActivityWatchdog(self._data.activity, min(limits))
+
+    def finish_activity(self) -> bool:
+        """Change the state to AFTER_ACTIVITY_RUN and postprocess the activity.
+
+        Returns:
+            bool -- True if an error occurred outside Activity.run().
+        """
+        if self._running:
+            self._after_run()
+            self._running = False
         self._postprocess()
 
         return self._error_occurred
 
+    @property
+    def error(self) -> Exception:
+        """The first exception that occurred outside Activity.run(), or None."""
+        return self._error
+
     def _ok_to_run(self):
         # An activity will be run only if it is allowed by the framework and by the configuration
         #  AND no error has occurred.
@@ -57,15 +219,17 @@ class ActivityRunner:
             (self._data.action != Action.SKIP_BY_FRAMEWORK)
             and (self._data.action != Action.SKIP_BY_CONFIGURATION)
             and not self._error_occurred
+            and self._data.checkpoint is None  # Restored from a previous run.
         )
         return ok
 
     def _preprocess(self):
+        self._metrics.start(ctx.PREPROCESS)
         try:
             # self._data.activity = Activity()  # Default value in case the activity creation fails
 
             # ----------------------------------------------------------------#
-            StateHandler.change_state(State.BEFORE_ACTIVITY_PREPROCESS)
+            self._state_handler.change_state(State.BEFORE_ACTIVITY_PREPROCESS)
             # ----------------------------------------------------------------#
 
             Check.not_none(self._data.action, "Action not provided in the activity data.")
@@ -86,23 +250,34 @@ class ActivityRunner:
             elif self._data.action in (Action.SKIP_BY_FRAMEWORK, Action.SKIP_BY_CONFIGURATION):
                 self._data.activity.status = Status.SKIPPED
                 self._print("skipping activity...")
+            self._metrics.end(ctx.PREPROCESS)
 
-    def _run(self):
+    def _before_run(self) -> bool:
+        try:
+            # ----------------------------------------------------------------#
+            self._state_handler.change_state(State.BEFORE_ACTIVITY_RUN)
+            # ----------------------------------------------------------------#
+            self._print("running activity...")
+            logging.info(
+                "===== Running activity '%s' of type '%s' =====",
+                self._data.activity_name,
+                self._data.activity_type,
+            )
+            return True
+        except Exception as e:
+            self._run_exception = e
+            return False
 
-        if self._ok_to_run():
-            try:
-                # ----------------------------------------------------------------#
-                StateHandler.change_state(State.BEFORE_ACTIVITY_RUN)
-                # ----------------------------------------------------------------#
-                self._print("running activity...")
-                logging.info(
-                    "===== Running activity '%s' of type '%s' =====",
-                    self._data.activity_name,
-                    self._data.activity_type,
+    def _after_run(self):
+        try:
+            timed_out = self._watchdog is not None and self._watchdog.timed_out
+            if timed_out:
+                self._run_exception = ActivityTimeoutException(
+                    f"Activity timed out after {self._watchdog.seconds:.1f} seconds"
                 )
-                self._data.activity.run()
 
-            except Exception as e:
+            e = self._run_exception
+            if e is not None:
                 logging.warning(
                     f"Exception caught during activity run: {e.__class__.__name__}: {str(e)}"
                 )
@@ -115,14 +290,35 @@ class ActivityRunner:
                     ),
                     framework_error=False,
                 )
+            if timed_out:
+                self._data.activity.status = Status.TIMEOUT
+
+        finally:
+            self._save_profile(self._report)
+            # ----------------------------------------------------------------#
+            self._state_handler.change_state(State.AFTER_ACTIVITY_RUN)
+            # ----------------------------------------------------------------#
 
-            finally:
-                # ----------------------------------------------------------------#
-                StateHandler.change_state(State.AFTER_ACTIVITY_RUN)
-                # ----------------------------------------------------------------#
+    def _profile(self):
+        profiler = self._data.activity_profiler
+        if profiler is None:
+            return contextlib.nullcontext([])
+        return profiler.profile(
+            self._data.activity_name, self._data.activity_id, self._data.activity_run_id
+        )
+
+    def _save_profile(self, report):
+        # The path of the profiling report, if the activity was profiled.
+        if report:
+            self._data.context.set(ctx.PROFILE, report[0], propagate_value=False)
 
     def _postprocess(self):
+        self._metrics.start(ctx.POSTPROCESS)
         try:
+            if self._data.checkpoint is not None:
+                self._restore_activity()
+                return
+
             self._print("PRELIMINARY ACTIVITY STATUS: " + self._data.activity.status)
             # See rules: https://jira-dowhile.atlassian.net/l/c/zy6Q0oJ8
             self._adjust_activity_status()
@@ -138,13 +334,16 @@ class ActivityRunner:
             self._register_error(e, "Exception during activity post-processing")
 
         finally:
+            self._save_metrics()
             # ----------------------------------------------------------------#
-            StateHandler.change_state(State.AFTER_ACTIVITY_POSTPROCESS)
+            self._state_handler.change_state(State.AFTER_ACTIVITY_POSTPROCESS)
             # ----------------------------------------------------------------#
 
     def _register_error(self, exception, description="", context=None, framework_error=True):
         if framework_error:
             self._error_occurred = True
+            if self._error is None:
+                self._error = exception
 
         # Crete custom data to save with the error.
         custom = {}
@@ -155,6 +354,8 @@ class ActivityRunner:
 
         Util.register_exception(
             ex=exception,
+            store=self._data.store,
+            state=self._state_handler.get_current_state_name(),
             type=ExceptionType.ACTIVITY,
             description=description,
             context=context,
@@ -193,13 +394,55 @@ class ActivityRunner:
         handler = self._data.context_properties_handler
 
         try:
-            # Save activity output properties to context and push the conext to remote.
+            # Save activity output properties to context.
             # Mandatory output properties are required only from the activities with the status
-            #  SUCCESS.
-            handler.save_output_properties(mandatory_outputs_check=(status == Status.SUCCESS))
+            #  SUCCESS. The thread of an expired run may still be changing them: not saved.
+            outputs = []
+            if not self._data.activity.expired:
+                outputs = handler.save_output_properties(
+                    mandatory_outputs_check=(status == Status.SUCCESS), sync_remote=False
+                )
+            self._save_checkpoint(outputs)
+            # Push the context to remote, if the sync policy says so.
+            with self._metrics.context_sync():
+                self._data.context_sync_policy.activity_finished(self._data.context)
         except Exception as e:
             self._register_error(e)
 
+    def _save_checkpoint(self, outputs):
+        # The checkpoint allows resuming the activity block without running the activity again.
+        # The output values themselves are already stored in the activity context.
+        checkpoint = {}
+        checkpoint[ctx.ACTIVITY_STATUS] = self._data.activity.status
+        checkpoint[ctx.ACTION] = self._data.action
+        checkpoint[ctx.OUTPUTS] = outputs
+        self._data.context.set(ctx.CHECKPOINT, checkpoint, propagate_value=False)
+
+    def _restore_activity(self):
+        """Restore an activity that succeeded in a previous run of the same flow run. The outputs \
+            are propagated again, so that the flow and activity block levels are as if the \
+            activity had just been run."""
+        checkpoint = self._data.checkpoint
+        context = self._data.context
+
+        self._data.activity.status = checkpoint[ctx.ACTIVITY_STATUS]
+        self._print("RESTORED ACTIVITY STATUS: " + self._data.activity.status)
+        for key in checkpoint[ctx.OUTPUTS]:
+            context.set(key, context.get_from_activity(key))
+        context.set(ctx.ACTION, self._data.action)
+
+        with self._metrics.context_sync():
+            self._data.context_sync_policy.activity_finished(context)
+
+    def _save_metrics(self):
+        # The metrics are synced with the next context sync.
+        self._metrics.end(ctx.POSTPROCESS)
+        try:
+            self._data.metrics = self._metrics.to_dict()
+            self._data.context.set(ctx.METRICS, self._data.metrics, propagate_value=False)
+        except Exception as e:
+            self._register_error(e, "Exception saving the activity metrics")
+
     def _update_activity_context(self):
         activity = self._data.activity
         context = self._data.context
@@ -0,0 +1,156 @@
+#  Copyright 2022-Present Autor contributors
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import contextvars
+import ctypes
+import datetime
+import logging
+import re
+import threading
+from typing import Callable
+
+from autor.framework.autor_framework_exception import AutorFrameworkValueException
+
+
+class ActivityTimeoutException(Exception):
+    """Registered for an activity that did not finish within its time limit."""
+
+
+class ActivityInterrupt(BaseException):
+    """Raised in the thread of a timed-out activity. Not an Exception, so that the activity does
+    not catch it with 'except Exception'."""
+
+
+class ActivityWatchdog:
+    """
+    Enforces the time limit of an activity run (see ActivityRunner). The limit is the 'timeout' of
+    the activity or what is left of the budget of the activity block, the 'expectedMaxDuration'
+    of its worker, whichever ends first:
+
+        activityBlocks:
+          nightly:
+            worker:
+              expectedMaxDuration: 2h   # Seconds, or a number with the unit s, m or h
+            activities:
+              - type: BUILD
+                timeout: 30m
+                continueOn: [SUCCESS, TIMEOUT]
+
+    When the limit is reached, the child processes that the activity has registered (see
+    Activity.register_child_process()) are terminated, the run is interrupted and the status
+    of the activity is TIMEOUT:
+
+        def run()           ActivityInterrupt is raised in the thread of the run. If the thread
+                            does not finish within GRACE_SECONDS (e.g. it is blocked in a system
+                            call, or it catches the interrupt), the activity block continues and
+                            the thread is left running: it can outlive the timeout and the
+                            activity block run. The activity is marked expired (see
+                            Activity.expired), so that the thread cannot change its outcome.
+        async def run()     The coroutine is cancelled.
+        executor: process   The worker processes are terminated (see ActivityProcessPool): the
+                            other activities running in the pool fail.
+    """
+
+    # How long to wait for an interrupted thread to finish.
+    GRACE_SECONDS = 1.0
+
+    # "90", "90s", "15m", "2h", "1h30m"
+    _DURATION = re.compile(r"^(?:(\d+(?:\.\d+)?)h)?(?:(\d+(?:\.\d+)?)m)?(?:(\d+(?:\.\d+)?)s?)?$")
+
+    def __init__(self, activity, seconds: float):
+        self._activity = activity
+        self._seconds = seconds
+        self.timed_out = False
+        # The run finishes or times out, not both: both are decided under the lock.
+        self._lock = threading.Lock()
+        self._finished = False
+
+    @property
+    def seconds(self) -> float:
+        return self._seconds
+
+    def run(self, function: Callable) -> None:
+        """Call 'function' in a new thread and wait until it has finished or timed out."""
+        thread = threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(self._call, function),
+            name=f"autor-{self._activity.id}",
+            daemon=True,
+        )
+        thread.start()
+        thread.join(self._seconds)
+        with self._lock:
+            if self._finished:
+                thread.join()  # Returned from 'function', the thread is ending.
+                return
+            self.expire()
+            self._activity.expire(thread.ident)
+            ActivityWatchdog._interrupt(thread)
+
+        thread.join(ActivityWatchdog.GRACE_SECONDS)
+        if thread.is_alive():
+            logging.warning(
+                "Activity '%s' did not stop when interrupted: left running in thread '%s'",
+                self._activity.id,
+                thread.name,
+            )
+
+    def _call(self, function: Callable) -> None:
+        try:
+            try:
+                function()
+            finally:
+                with self._lock:
+                    self._finished = True
+        except ActivityInterrupt:
+            pass  # Interrupted after 'function' had returned: it had timed out first.
+
+    def expire(self) -> None:
+        """Mark the run timed out and terminate the child processes of the activity."""
+        self.timed_out = True
+        logging.warning(
+            "Activity '%s' timed out after %.1f seconds", self._activity.id, self._seconds
+        )
+        for process in self._activity.child_processes:
+            try:
+                process.terminate()
+            except Exception as e:  # pylint: disable=broad-except
+                logging.debug("Could not terminate %r: %r", process, e)
+
+    @staticmethod
+    def _interrupt(thread: threading.Thread) -> None:
+        ctypes.pythonapi.PyThreadState_SetAsyncExc(
+            ctypes.c_ulong(thread.ident), ctypes.py_object(ActivityInterrupt)
+        )
+
+    @staticmethod
+    def to_seconds(value, name: str = "timeout") -> float:
+        """Convert a duration of the Flow Configuration to seconds. None: no limit."""
+        if value is None:
+            return None
+        if isinstance(value, datetime.timedelta):
+            return value.total_seconds()
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0:
+            return float(value)
+
+        match = ActivityWatchdog._DURATION.match(str(value).strip())
+        if isinstance(value, str) and match and any(match.groups()):
+            hours, minutes, seconds = (float(g) if g else 0.0 for g in match.groups())
+            total = hours * 3600 + minutes * 60 + seconds
+            if total > 0:
+                return total
+
+        raise AutorFrameworkValueException(
+            f"'{name}' must be a positive number of seconds or a duration like '15m', "
+            + f"received: {value!r}"
+        )
@@ -13,6 +13,7 @@
 #    under the License.
 import argparse
 
+from autor.framework.constants import ProfileMode
 from autor.framework.keys import CommandLineKeys as cln
 
 
@@ -50,10 +51,13 @@ class CommandlineArgumentParser:
         parser.add_argument(
             # pylint: disable-next=no-member
             "--" + cln.ACTIVITY_BLOCK_ID,
-            required=True,
+            required=False,
             action="store",
             type=str,
-            help="The unique identifier of the activity block within the Flow Configuration",
+            help=(
+                "The unique identifier of the activity block within the Flow Configuration."
+                + " If not provided, all the activity blocks of the flow are run (see FlowRunner)"
+            ),
         )
 
         parser.add_argument(
@@ -68,4 +72,34 @@ class CommandlineArgumentParser:
             ),
         )
 
+        parser.add_argument(
+            # pylint: disable-next=no-member
+            "--" + cln.RESUME,
+            required=False,
+            action="store_true",
+            help=(
+                "Resume a failed activity block run: activities that succeeded in the same"
+                + " flow run are not run again. Requires --"
+                + cln.FLOW_RUN_ID
+            ),
+        )
+
+        parser.add_argument(
+            # pylint: disable-next=no-member
+            "--" + cln.PROFILE,
+            required=False,
+            action="store",
+            choices=[ProfileMode.CPU, ProfileMode.MEMORY],
+            help="Profile the activity runs: cpu (cProfile) or memory (tracemalloc)",
+        )
+
+        parser.add_argument(
+            # pylint: disable-next=no-member
+            "--" + cln.PROFILE_ACTIVITIES,
+            required=False,
+            action="store",
+            nargs="+",
+            help="The names or ids of the activities to profile. Default: all the activities",
+        )
+
         return parser
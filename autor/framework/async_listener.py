@@ -0,0 +1,114 @@
+#  Copyright 2022-Present Autor contributors
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import collections
+import logging
+import queue
+import threading
+from typing import Callable
+
+from autor.framework.autor_framework_exception import AutorFrameworkValueException
+from autor.framework.constants import QueueFullPolicy
+from autor.framework.state import State
+from autor.framework.state_listener import StateListener
+
+
+class AsyncListener:
+    """
+    Calls the hooks of an asynchronous StateListener in a worker thread (see
+    StateListener.asynchronous).
+
+    submit() puts an event on a bounded queue and returns at once. If the queue is full, it
+    waits (QueueFullPolicy.BLOCK) or drops the event (QueueFullPolicy.DROP). FRAMEWORK_END, the
+    last event, is never dropped. The exceptions raised by the hooks are collected and returned
+    by drain().
+
+    submit(), drain() and stop() should be called by the thread that changes the states.
+    """
+
+    def __init__(self, listener: StateListener):
+        if listener.queue_full not in (QueueFullPolicy.BLOCK, QueueFullPolicy.DROP):
+            raise AutorFrameworkValueException(
+                f"Unknown queue full policy of {listener.__class__.__name__}: "
+                + f"{listener.queue_full!r}"
+            )
+
+        self._listener = listener
+        self._block = listener.queue_full == QueueFullPolicy.BLOCK
+        self._queue = queue.Queue(maxsize=listener.queue_size)
+        # (state name, exception) of the failed hooks.
+        self._exceptions = collections.deque()
+        self._dropped = 0  # Events dropped since the latest drain().
+
+        self._thread = threading.Thread(
+            target=self._work,
+            name=f"autor-listener-{listener.__class__.__name__}",
+            daemon=True,
+        )
+        self._thread.start()
+
+    @property
+    def listener(self) -> StateListener:
+        return self._listener
+
+    def submit(self, hook: Callable, state: State) -> None:
+        """Queue a call of 'hook' (a hook of the listener) with 'state', a snapshot."""
+        if self._block or state.name == State.FRAMEWORK_END:
+            self._queue.put((hook, state))
+            return
+
+        try:
+            self._queue.put_nowait((hook, state))
+        except queue.Full:
+            self._dropped = self._dropped + 1
+
+    def drain(self) -> list:
+        """Wait until all the queued events have been processed.
+
+        Returns:
+            [(str, Exception)] -- The state names and the exceptions of the failed hooks.
+        """
+        self._queue.join()
+
+        if self._dropped > 0:
+            logging.warning(
+                "Asynchronous listener %s: dropped %d events (queue full)",
+                self._listener.__class__.__name__,
+                self._dropped,
+            )
+            self._dropped = 0
+
+        exceptions = []
+        while self._exceptions:
+            exceptions.append(self._exceptions.popleft())
+        return exceptions
+
+    def stop(self) -> None:
+        """Stop the worker thread after the queued events have been processed."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+
+                hook, state = job
+                try:
+                    hook(state)
+                except Exception as exception:
+                    self._exceptions.append((state.name, exception))
+            finally:
+                self._queue.task_done()
@@ -13,6 +13,7 @@
 #    under the License.
 from autor.framework.activity_block import ActivityBlock
 from autor.framework.argument_parser import CommandlineArgumentParser
+from autor.framework.flow_runner import FlowRunner
 from autor.framework.keys import ArgParserKeys as argp
 
 
@@ -24,12 +25,27 @@ def run():
 
     # pylint: disable=no-member
     flow_run_id = params.get(argp.FLOW_RUN_ID, None)
+    activity_block_id = params.get(argp.ACTIVITY_BLOCK_ID, None)
+
+    if activity_block_id is None:
+        # Run all the activity blocks of the flow
+        FlowRunner(
+            flow_config_url=params[argp.FLOW_CONFIG_URL],
+            flow_run_id=flow_run_id,
+            resume=params.get(argp.RESUME, False),
+            profile=params.get(argp.PROFILE, None),
+            profile_activities=params.get(argp.PROFILE_ACTIVITIES, None),
+        ).run()
+        return
 
     # Create and run activity block
     activity_block = ActivityBlock(
         flow_config_url=params[argp.FLOW_CONFIG_URL],
-        activity_block_id=params[argp.ACTIVITY_BLOCK_ID],
+        activity_block_id=activity_block_id,
         flow_run_id=flow_run_id,
+        resume=params.get(argp.RESUME, False),
+        profile=params.get(argp.PROFILE, None),
+        profile_activities=params.get(argp.PROFILE_ACTIVITIES, None),
     )
     # pylint: enable=no-member
     activity_block.run()
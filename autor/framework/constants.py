@@ -31,6 +31,7 @@ class Status:
     ERROR = 'ERROR'
     SKIPPED = 'SKIPPED'
     ABORTED = 'ABORTED'
+    TIMEOUT = 'TIMEOUT' # Interrupted by the time limit, see ActivityWatchdog
     UNKNOWN = 'UNKNOWN'
     ALL = 'ALL'
 
@@ -67,6 +68,47 @@ class Mode:
     # run the specified activity using a provided activity config.
     ACTIVITY = "ACTIVITY"
 
+# Policies for synchronizing the flow context with the remote context.
+class SyncPolicy:
+    # sync after every activity
+    PER_ACTIVITY = "per-activity"
+    # sync after every N activities
+    EVERY_N_ACTIVITIES = "every-n-activities"
+    # sync after an activity when at least the configured interval has passed since the last sync
+    TIME_INTERVAL = "time-interval"
+    # sync only at the end of the activity block
+    END_OF_BLOCK = "end-of-block"
+
+# Built-in codecs for serializing the context in remote contexts (see ContextCodec).
+class CodecType:
+    # JSON without whitespace
+    JSON = "json"
+    # length-prefixed binary format
+    BINARY = "binary"
+    # pickle, only for trusted remote contexts
+    PICKLE = "pickle"
+
+# What the activity profiler measures (see ActivityProfiler).
+class ProfileMode:
+    # cProfile, a .pstats file per activity run
+    CPU = "cpu"
+    # tracemalloc, a report of the top allocation sites per activity run
+    MEMORY = "memory"
+
+# Where an activity is run (the 'executor' of the activity configuration).
+class ActivityExecutor:
+    # in a thread of the activity block process (default)
+    THREAD = "thread"
+    # in a worker process of the activity block (see ActivityProcessPool)
+    PROCESS = "process"
+
+# What an asynchronous state listener does when its queue is full (see AsyncListener).
+class QueueFullPolicy:
+    # wait until the listener has processed an event
+    BLOCK = "block"
+    # drop the event
+    DROP = "drop"
+
 # Exception types in Autor context @TODO - do we need it?
 class ExceptionType:
     ACTIVITY_BLOCK_CALLBACK = "ACTIVITY_BLOCK_CALLBACK"
@@ -12,17 +12,27 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
 import logging
+from types import MappingProxyType
 from typing import Type
 
 from autor.framework.autor_framework_exception import (
     AutorFrameworkException,
     AutorFrameworkValueException,
 )
+from autor.framework.context_paths import ContextPaths
+from autor.framework.context_sync_worker import ContextSyncWorker
 from autor.framework.debug_config import DebugConfig
+from autor.framework.flow_context_store import FlowContextStore
 from autor.framework.remote_context import RemoteContext
 from autor.framework.util import Util
 
+# Returned by the private lookups for values that do not exist. Unlike _UNDEFINED, it can never
+# be stored in the context.
+_MISSING = object()
+_EMPTY = MappingProxyType({})
+
 
 # An internal class that represents the possible context focus level. A focus level
 # defines some of the context's default values (see Context.get()).
@@ -46,51 +56,33 @@ class Context:
     # ----------------------------------   S T A T I C   S E C T I O N  ---------------------------#
     # ---------------------------------------------------------------------------------------------#
 
-    # Static attributes and constants shared by all Context objects.
+    # Constants shared by all Context objects. The data of a flow run is kept in a
+    # FlowContextStore that is shared by the Context objects of the run.
 
     # C O N S T A N T S
     # ------------------
     # A string constant to use for detecting undefined values.
-    _UNDEFINED = "_UNDEFINED"
+    _UNDEFINED = FlowContextStore.UNDEFINED
 
     # Reserved key names for the innter context structure.
-    _ACTIVITY_BLOCKS = "_activityBlocks"
-    _ACTIVITIES = "_activities"
-
-    # I D
-    # -----------------------------------
-    # A unique identifier of the context
-    _id: str = _UNDEFINED
-
-    # L O C A L   A N D   R E M O T E   C O N T E X T
-    # -------------------------------------------------
-    # All Context objects share the same local context and remote context. The local context
-    # is the representation of the context that we're working with right now. The remote context,
-    # that is optional, is typically a data store where the context can be persisted.
-    #
-    # If no remote context is provided, then the information in the context will exist only
-    # during the execution.
-    #
-    # If remote conext is provided, then it can be used to synchronize the changes in the
-    # local context.
-    _local_context: dict = {}  # The internal representation of the local context.
-    _remote_context: RemoteContext = None  # Remote context that can be added by an extension.
-
-    @staticmethod
-    def print_context(message="") -> None:
-
-        Util.print_dict(Context._local_context, message)
-
-    @staticmethod
-    def set_context(context: dict) -> None:
-        Context._local_context = context
+    _ACTIVITY_BLOCKS = ContextPaths.ACTIVITY_BLOCKS
+    _ACTIVITIES = ContextPaths.ACTIVITIES
+    _LATEST = ContextPaths.LATEST
 
     # ---------------------------------------------------------------------------------------------#
     # ----------------------------------   D Y N A M I C  S E C T I O N  --------------------------#
     # ---------------------------------------------------------------------------------------------#
 
     # -------------------------------- I N I T  --------------------------------------#
-    def __init__(self, activity_block=None, activity=None):
+    def __init__(self, activity_block=None, activity=None, store: FlowContextStore = None):
+        """
+        Arguments:
+            activity_block {str} -- The activity block to focus on.
+            activity {str} -- The activity to focus on. Requires 'activity_block'.
+            store {FlowContextStore} -- The flow run data shared by the Context objects of \
+                the flow run. If not given, a new empty store is created.
+        """
+        self._store = store if store is not None else FlowContextStore()
         self._activity_block = activity_block
         self._activity = activity
 
@@ -109,44 +101,124 @@ class Context:
         else:
             self._focus = Focus.FLOW
 
+        # {(activity block, activity): dict} The resolved context dictionaries (see _resolve()).
+        self._resolved = {}
+        self._resolved_generation = self._store.generation
+
+    def print_context(self, message="") -> None:
+        Util.print_dict(self.local_context, message)
+
+    def set_context(self, context: dict) -> None:
+        self._store.set_context(context)
+
     # -------------------------  P R O P E R T I E S  -------------------------------#
 
+    # The flow run data shared by all Context objects of the flow run.
+    @property
+    def store(self) -> FlowContextStore:
+        return self._store
+
     # The unique identifier of the context (both for local and remote context)
-    # pylint: disable=no-self-use
     @property
     def id(self) -> str:
-        return Context._id
+        return self._store.id
 
     @id.setter
     def id(self, n):
-        Context._id = n
+        self._store.id = n
 
-    # The representation of the local context as a dictionary
+    # The representation of the local context as a dictionary, with the propagated values
+    # on every level. The internal representation stores each value only once
+    # (see ContextPaths), so the returned dictionary is a copy: it is not updated by later
+    # changes, and changing it does not change the context. Use set() to change the context.
     @property
-    def local_context(self) -> str:
-        return Context._local_context
+    def local_context(self) -> dict:
+        return ContextPaths.materialize(self._store.local_context)
 
     # Remote context is not mandatory. If set, the local context will be syncrhonized
     # with the remote context. If not set, the local context will not be synchronized
     # with remote context.
     @property
-    def remote_context(self) -> str:
-        return Context._remote_context
-
-    # pylint: enable=no-self-use
+    def remote_context(self) -> RemoteContext:
+        return self._store.remote_context
 
     @remote_context.setter
     def remote_context(self, n):
         self._print("set_remote_context: " + str(n))
-        Context._remote_context = n
+        self._store.remote_context = n
+
+    # The paths of the values that have changed since the latest remote sync.
+    @property
+    def changes(self) -> set:
+        return self._store.changes
 
     # ----------------------------------    R E M O T E   C O N T E X T   -------------------------#
-    def sync_remote(self) -> None:
-        if self.remote_context:
-            self._print("sync_remote: " + str(self.remote_context))
-            self.remote_context.sync(self.id, self.local_context)
-        else:
+    def sync_remote(self, force: bool = False) -> None:
+        """Synchronize the local context with the remote context.
+        If the sync worker is running, a snapshot of the local context is queued for syncing \
+            and the method returns without waiting for the remote context.
+
+        Arguments:
+            force {bool} -- Synchronize even if nothing has changed in the local context. \
+                Used for fetching the remote context.
+        Raises:
+            The exception of a failed asynchronous sync, once it has finished.
+        """
+        with self._store.lock:
+            self._sync_remote(force)
+
+    def _sync_remote(self, force: bool) -> None:
+        if self._store.sync_worker is not None:
+            self._store.sync_worker.merge(self._store.local_context, self._store.changes)
+            self._store.generation = self._store.generation + 1
+
+        if not self.remote_context:
             self._print("sync_remote: None -> skipping remote sync")
+            return
+
+        if not self._store.changes and not force:
+            self._print("sync_remote: no changes -> skipping remote sync")
+            return
+
+        self._print("sync_remote: " + str(self.remote_context))
+        changes = self._store.changes
+        self._store.changes = set()
+
+        if self._store.sync_worker is not None:
+            snapshot = copy.deepcopy(self._store.local_context)
+            self._store.sync_worker.submit(self.remote_context, self.id, snapshot, changes)
+            return
+
+        try:
+            self.remote_context.sync_changes(self.id, self._store.local_context, changes)
+        except Exception:
+            self._store.changes |= changes  # Try again on the next sync.
+            raise
+        finally:
+            # The remote context may have replaced dictionaries.
+            self._store.generation = self._store.generation + 1
+
+    def start_sync_worker(self, queue_size: int = 8) -> None:
+        """Sync the remote context asynchronously from now on (see ContextSyncWorker)."""
+        if self._store.sync_worker is None:
+            self._print("start_sync_worker: queue_size=" + str(queue_size))
+            self._store.sync_worker = ContextSyncWorker(queue_size)
+
+    def drain_remote(self) -> None:
+        """Wait until the queued asynchronous syncs have finished. \
+            No-op if the sync worker is not running."""
+        if self._store.sync_worker is not None:
+            try:
+                self._store.sync_worker.drain(self._store.local_context, self._store.changes)
+            finally:
+                self._store.generation = self._store.generation + 1
+
+    def stop_sync_worker(self) -> None:
+        """Wait for the queued syncs and go back to synchronous syncs."""
+        if self._store.sync_worker is not None:
+            worker = self._store.sync_worker
+            self._store.sync_worker = None
+            worker.stop()
 
     # ---------------------------------------------------------------------------------------------#
     # --------------------------------------   G E T   M E T H O D S   ----------------------------#
@@ -223,113 +295,117 @@ class Context:
     def _get_from_activity(
         self, key: str = None, default=_UNDEFINED, activity_block: str = None, activity: str = None
     ):
-        value = None
-        try:
-            value = (
-                self.local_context.get(self._ACTIVITY_BLOCKS)
-                .get(activity_block)
-                .get(self._ACTIVITIES)
-                .get(activity)
-                .get(key, default)
-            )  # pylint: disable=no-member
-            if value == self._UNDEFINED:
-                raise AutorFrameworkContextKeyNotFoundException(
-                    (
-                        "The activity context does not have the requested"
-                        + " key and no default value was provided."
-                    )
-                )
-
-        except Exception:
-            if default == self._UNDEFINED:
-                raise AutorFrameworkContextKeyNotFoundException(
-                    (
-                        f"The path to the context key: {key!r}"
-                        + " does not exist and no default value was provided."
-                    )
-                )
-            value = default
-        return value
+        return self._value_or_default(
+            self._lookup(key, activity_block, activity),
+            default,
+            f"The path to the context key: {key!r}"
+            + " does not exist and no default value was provided.",
+        )
 
     def _get_from_activity_block(
         self, key: str = None, default=_UNDEFINED, activity_block: str = None
     ):
-        value = None
-        try:
-            value = (
-                self.local_context.get(self._ACTIVITY_BLOCKS).get(activity_block).get(key, default)
-            )  # pylint: disable=no-member
-            if value == self._UNDEFINED:
-                raise AutorFrameworkContextKeyNotFoundException(
-                    (
-                        "The activity block context does not have the requested key:'{key}'"
-                        + " and no default value was provided."
-                    )
-                )
-
-        except Exception:
-            if default == self._UNDEFINED:
-                raise AutorFrameworkContextKeyNotFoundException(
-                    (
-                        "The path to the context key does not exist and no default"
-                        + " value was provided."
-                    )
-                )
-
-            value = default
-        return value
+        return self._value_or_default(
+            self._lookup(key, activity_block),
+            default,
+            f"The activity block context does not have the requested key: {key!r}"
+            + " and no default value was provided.",
+        )
 
     def _get_from_flow(self, key: str = None, default=_UNDEFINED):
-
-        value = self.local_context.get(key, default)
-        if value == self._UNDEFINED:
-            raise AutorFrameworkContextKeyNotFoundException(
-                (
-                    "The flow context does not have the requested"
-                    + " key and no default value was provided."
-                )
-            )
-
-        return value
+        return self._value_or_default(
+            self._lookup(key),
+            default,
+            "The flow context does not have the requested key and no default value was provided.",
+        )
 
     # ----------------------------   P R I V A T E   S E A R C H   M E T H O D S   ----------------#
 
     def _search_from_activity(
         self, key: str = None, default=_UNDEFINED, activity_block: str = None, activity: str = None
     ):
-
-        try:  # Search on the activity level
-            return self._get_from_activity(
-                key=key, activity_block=activity_block, activity=activity
-            )  # wihout default
-        except AutorFrameworkContextKeyNotFoundException:
-            pass
-
-        try:  # No value found on activity level -> try activity block level
-            return self._get_from_activity_block(
-                key=key, activity_block=activity_block
-            )  # without default
-        except AutorFrameworkContextKeyNotFoundException:
-            pass
-
-        # No value found on the the activity block level -> try flow level
-        #   (and now with the default value)
-        return self._get_from_flow(key=key, default=default)  # with default
+        value = self._lookup(key, activity_block, activity)  # Search on the activity level
+        if value is _MISSING:  # No value found on activity level -> try activity block level
+            value = self._lookup(key, activity_block)
+        if value is _MISSING:  # No value found on the activity block level -> try flow level
+            value = self._lookup(key)
+
+        return self._value_or_default(
+            value,
+            default,
+            "The flow context does not have the requested key and no default value was provided.",
+        )
 
     def _search_from_activity_block(
         self, key: str = None, default=_UNDEFINED, activity_block: str = None
     ):
+        value = self._lookup(key, activity_block)  # Search on the activity block level
+        if value is _MISSING:  # No value found on the activity block level -> try flow level
+            value = self._lookup(key)
+
+        return self._value_or_default(
+            value,
+            default,
+            "The flow context does not have the requested key and no default value was provided.",
+        )
 
-        try:  # Search on the activity block level
-            return self._get_from_activity_block(
-                key=key, activity_block=activity_block
-            )  # without default
-        except AutorFrameworkContextKeyNotFoundException:
-            pass
+    # -------------------------------   P R I V A T E   L O O K U P   -----------------------------#
+    #
+    # The lookups return _MISSING instead of raising, so that a search through the context levels
+    # costs only a few dictionary lookups.
+
+    def _lookup(self, key: str, activity_block: str = None, activity: str = None):
+        """Return the value of 'key' on the flow, activity block or activity level, \
+            or _MISSING if the value does not exist."""
+        if activity_block is None:
+            node = self._store.local_context
+        else:
+            node = self._resolve(activity_block, activity)
+            if node is None:
+                return _MISSING
+
+        value = _MISSING
+        if activity is None:
+            # Flow and activity block level values may have been propagated from below.
+            latest = node.get(self._LATEST)
+            if latest is not None:
+                path = latest.get(key)
+                if path:
+                    origin = self._resolve(path[1], path[3] if len(path) == 5 else None)
+                    if origin is not None:
+                        value = origin.get(path[-1], _MISSING)
+        if value is _MISSING:
+            value = node.get(key, _MISSING)
+        if isinstance(value, str) and value == Context._UNDEFINED:
+            return _MISSING
+        return value
 
-        # No value found on the the activity block level -> try flow level
-        # (and now with the default value)
-        return self._get_from_flow(key=key, default=default)  # with default
+    def _resolve(self, activity_block: str, activity: str = None):
+        """Return the dictionary of the activity block or activity, or None if it does not exist.
+        Resolved dictionaries are cached until the local context is replaced (see _generation).
+        """
+        if self._resolved_generation != self._store.generation:
+            self._resolved = {}
+            self._resolved_generation = self._store.generation
+
+        node = self._resolved.get((activity_block, activity))
+        if node is None:
+            node = self._store.local_context.get(self._ACTIVITY_BLOCKS, _EMPTY).get(
+                activity_block, _EMPTY
+            )
+            if activity is not None:
+                node = node.get(self._ACTIVITIES, _EMPTY).get(activity, _EMPTY)
+            if node is _EMPTY:
+                return None  # Not cached: the dictionary may be created later.
+            self._resolved[(activity_block, activity)] = node
+        return node
+
+    def _value_or_default(self, value, default, message: str):
+        if value is not _MISSING:
+            return value
+        if default == self._UNDEFINED:
+            raise AutorFrameworkContextKeyNotFoundException(message)
+        return default
 
     # ---------------------------------------------------------------------------------------------#
     # --------------------------------------   S E T   M E T H O D S   ----------------------------#
@@ -341,15 +417,15 @@ class Context:
 
         # A C T I V I T Y
         if self._focus == Focus.ACTIVITY:
-            self._set_to_activity(key=key, value=value, propagate_value=propagate_value)
+            self.set_to_activity(key=key, value=value, propagate_value=propagate_value)
 
         # A C T I V I T Y   B L O C K
         elif self._focus == Focus.ACTIVITY_BLOCK:
-            self._set_to_activity_block(key=key, value=value, propagate_value=propagate_value)
+            self.set_to_activity_block(key=key, value=value, propagate_value=propagate_value)
 
         # F L O W
         elif self._focus == Focus.FLOW:
-            self._set_to_flow(key=key, value=value)
+            self.set_to_flow(key=key, value=value)
 
         # E R R O R
         else:
@@ -363,25 +439,34 @@ class Context:
         activity_block: str = None,
         propagate_value: bool = True,
     ):
-        self._set_to_activity(
-            key=key,
-            value=value,
-            activity=activity,
-            activity_block=activity_block,
-            propagate_value=propagate_value,
-        )
+        with self._store.lock:
+            self._set_to_activity(
+                key=key,
+                value=value,
+                activity=activity,
+                activity_block=activity_block,
+                propagate_value=propagate_value,
+            )
 
     def set_to_activity_block(
         self, key: str, value: Type, activity_block: str = None, propagate_value: bool = True
     ):
-        self._set_to_activity_block(
-            key=key, value=value, activity_block=activity_block, propagate_value=propagate_value
-        )
+        with self._store.lock:
+            self._set_to_activity_block(
+                key=key,
+                value=value,
+                activity_block=activity_block,
+                propagate_value=propagate_value,
+            )
 
     def set_to_flow(self, key: str, value: Type):
-        self._set_to_flow(key=key, value=value)
+        with self._store.lock:
+            self._set_to_flow(key=key, value=value)
 
     # ------------------------------   P R I V A T E   S E T   M E T H O D S   --------------------#
+    #
+    # A value is stored only on the level where it is set. Propagating a value to the activity
+    # block and flow levels only updates their latest writer indexes (see ContextPaths).
 
     def _set_to_activity(
         self,
@@ -399,13 +484,24 @@ class Context:
 
         # Create the dictionary structure all the way to the key location,
         #  if it does not exist, and set the value.
-        self._local_context.setdefault(self._ACTIVITY_BLOCKS, {}).setdefault(
+        block_context = self._store.local_context.setdefault(self._ACTIVITY_BLOCKS, {}).setdefault(
             activity_block, {}
-        ).setdefault(self._ACTIVITIES, {}).setdefault(activity, {})[key] = value
+        )
+        activity_context = block_context.setdefault(self._ACTIVITIES, {}).setdefault(activity, {})
+        path = ContextPaths.activity(activity_block, activity, key)
 
         if propagate_value:
-            self._set_to_activity_block(key=key, value=value, propagate_value=propagate_value)
-            self._set_to_flow(key=key, value=value)
+            activity_context[key] = value
+            self._set_latest(block_context, key, path, activity_block)
+            self._set_latest(self._store.local_context, key, path)
+        else:
+            # The upper levels must keep the value that was propagated to them earlier.
+            previous = activity_context.get(key, _MISSING)
+            activity_context[key] = value
+            self._keep_latest(block_context, key, path, previous, activity_block)
+            self._keep_latest(self._store.local_context, key, path, previous)
+
+        self._store.changes.add(path)
 
     def _set_to_activity_block(
         self, key: str, value: Type, propagate_value: bool, activity_block: str = None
@@ -417,19 +513,64 @@ class Context:
 
         # Create the dictionary structure all the way to the key location, if it does not exist,
         #  and set the value.
-        self._local_context.setdefault(self._ACTIVITY_BLOCKS, {}).setdefault(activity_block, {})[
-            key
-        ] = value
+        block_context = self._store.local_context.setdefault(self._ACTIVITY_BLOCKS, {}).setdefault(
+            activity_block, {}
+        )
+        path = ContextPaths.activity_block(activity_block, key)
 
         if propagate_value:
-            self._set_to_flow(key=key, value=value)
+            block_context[key] = value
+            self._set_latest(self._store.local_context, key, path)
+        else:
+            previous = block_context.get(key, _MISSING)
+            block_context[key] = value
+            self._keep_latest(self._store.local_context, key, path, previous)
+
+        self._set_latest(block_context, key, (), activity_block)
+        self._store.changes.add(path)
 
     def _set_to_flow(self, key: str, value: Type):
         self._validate_key(key)
 
         # Create the dictionary structure all the way to the key location, if it does not exist,
         #  and set the value.
-        self._local_context[key] = value
+        self._store.local_context[key] = value
+        self._set_latest(self._store.local_context, key, ())
+        self._store.changes.add(ContextPaths.flow(key))
+
+    # pylint: disable-next=no-self-use
+    def _set_latest(self, level: dict, key: str, path: tuple, activity_block: str = None):
+        """Make the value in 'path' the latest value of 'key' on the level. An empty path \
+            refers to the value stored on the level itself."""
+        latest = level.get(self._LATEST)
+        if not path:
+            if latest is None or not latest.get(key):
+                return  # The own value is already the latest one -> no index entry needed.
+        elif latest is None:
+            latest = level[self._LATEST] = {}
+
+        latest[key] = path
+        if activity_block is None:
+            self._store.changes.add(ContextPaths.flow_latest(key))
+        else:
+            self._store.changes.add(ContextPaths.activity_block_latest(activity_block, key))
+
+    def _keep_latest(
+        self, level: dict, key: str, path: tuple, previous, activity_block: str = None
+    ):
+        """The value in 'path' has changed without propagation. If the level refers to it, \
+            store the previous value on the level itself."""
+        latest = level.get(self._LATEST)
+        if latest is None or not latest.get(key) or tuple(latest[key]) != path:
+            return
+
+        if previous is not _MISSING:
+            level[key] = previous
+        self._set_latest(level, key, (), activity_block)
+        if activity_block is None:
+            self._store.changes.add(ContextPaths.flow(key))
+        else:
+            self._store.changes.add(ContextPaths.activity_block(activity_block, key))
 
     # -------------------------------   P R I V A T E   H E L P   M E T H O D S   -----------------#
 
@@ -454,12 +595,14 @@ class Context:
                 "The context key: " + str(key) + "  must be of type 'str'"
             )
 
-        if key in (self._ACTIVITY_BLOCKS, self._ACTIVITIES):
+        if key in (self._ACTIVITY_BLOCKS, self._ACTIVITIES, self._LATEST):
             raise AutorFrameworkValueException(
                 "The context key may not use one of the reserved context words: "
                 + self._ACTIVITY_BLOCKS
-                + " or "
+                + ", "
                 + self._ACTIVITIES
+                + " or "
+                + self._LATEST
             )
 
     # -----------------------------   P R I N T S   -------------------------------#
@@ -0,0 +1,233 @@
+#  Copyright 2022-Present Autor contributors
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import abc
+import json
+import pickle
+import struct
+import time
+from typing import Any
+
+from autor.framework.autor_framework_exception import AutorFrameworkValueException
+from autor.framework.constants import CodecType
+
+
+class ContextCodec(abc.ABC):
+    """
+    Serializes context values for remote contexts. Inherit from this class and implement
+    _encode() and _decode() when creating own codecs.
+
+    encode() and decode() measure the time spent in the codec, see stats().
+    """
+
+    # The name of the codec (see constants.CodecType).
+    name = None
+    # False if the encoded values are UTF-8 text, True if they are arbitrary bytes.
+    binary = True
+
+    def __init__(self):
+        self._encode_calls = 0
+        self._encode_seconds = 0.0
+        self._encoded_bytes = 0
+        self._decode_calls = 0
+        self._decode_seconds = 0.0
+
+    @staticmethod
+    def create(name: str) -> "ContextCodec":
+        """Create one of the built-in codecs by its name (see constants.CodecType)."""
+        codecs = {
+            CodecType.JSON: JsonCodec,
+            CodecType.BINARY: BinaryCodec,
+            CodecType.PICKLE: PickleCodec,
+        }
+        if name not in codecs:
+            raise AutorFrameworkValueException(
+                f"Unknown context codec: {name!r}. Available codecs: {list(codecs)}"
+            )
+        return codecs[name]()
+
+    def encode(self, value: Any) -> bytes:
+        start = time.perf_counter()
+        encoded = self._encode(value)
+        self._encode_seconds = self._encode_seconds + time.perf_counter() - start
+        self._encode_calls = self._encode_calls + 1
+        self._encoded_bytes = self._encoded_bytes + len(encoded)
+        return encoded
+
+    def decode(self, data: bytes) -> Any:
+        start = time.perf_counter()
+        value = self._decode(data)
+        self._decode_seconds = self._decode_seconds + time.perf_counter() - start
+        self._decode_calls = self._decode_calls + 1
+        return value
+
+    def stats(self) -> dict:
+        """Return the number of calls and the time spent encoding and decoding so far."""
+        return {
+            "codec": self.name,
+            "encodeCalls": self._encode_calls,
+            "encodeSeconds": self._encode_seconds,
+            "encodedBytes": self._encoded_bytes,
+            "decodeCalls": self._decode_calls,
+            "decodeSeconds": self._decode_seconds,
+        }
+
+    @abc.abstractmethod
+    def _encode(self, value: Any) -> bytes:
+        """Return 'value' serialized."""
+
+    @abc.abstractmethod
+    def _decode(self, data: bytes) -> Any:
+        """Return the value serialized in 'data' by _encode()."""
+
+
+class JsonCodec(ContextCodec):
+    """JSON without indentation and whitespace. Decodes indented JSON as well."""
+
+    name = CodecType.JSON
+    binary = False
+
+    def _encode(self, value: Any) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode("utf8")
+
+    def _decode(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class PickleCodec(ContextCodec):
+    """Supports any picklable value. Use only if all the writers of the remote context are
+    trusted: decoding a pickle can execute arbitrary code."""
+
+    name = CodecType.PICKLE
+
+    def _encode(self, value: Any) -> bytes:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _decode(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+
+class BinaryCodec(ContextCodec):
+    """
+    A length-prefixed binary format in the style of MessagePack. Every value starts with a
+    one byte type tag:
+
+        N, T, F             None, True, False
+        i <int64>           int that fits in 64 bits
+        I <len> <ascii>     any other int
+        f <float64>         float
+        s <len> <utf8>      str
+        b <len> <bytes>     bytes
+        l <count> <values>  list or tuple (decoded as list)
+        m <count> <pairs>   dict (key, value, key, value, ...)
+
+    The lengths and counts are unsigned 32 bit integers; all numbers are big-endian.
+    """
+
+    name = CodecType.BINARY
+
+    _INT = struct.Struct(">q")
+    _FLOAT = struct.Struct(">d")
+    _LENGTH = struct.Struct(">I")
+
+    def _encode(self, value: Any) -> bytes:
+        buffer = bytearray()
+        self._write(buffer, value)
+        return bytes(buffer)
+
+    def _decode(self, data: bytes) -> Any:
+        value, offset = self._read(memoryview(data), 0)
+        if offset != len(data):
+            raise AutorFrameworkValueException(
+                f"Binary context codec: {len(data) - offset} extra bytes after the value"
+            )
+        return value
+
+    def _write(self, buffer: bytearray, value: Any) -> None:
+        # bool before int: bool is a subclass of int.
+        if value is None:
+            buffer += b"N"
+        elif value is True:
+            buffer += b"T"
+        elif value is False:
+            buffer += b"F"
+        elif isinstance(value, int):
+            if -(2**63) <= value < 2**63:
+                buffer += b"i" + self._INT.pack(value)
+            else:
+                self._write_sized(buffer, b"I", str(value).encode("ascii"))
+        elif isinstance(value, float):
+            buffer += b"f" + self._FLOAT.pack(value)
+        elif isinstance(value, str):
+            self._write_sized(buffer, b"s", value.encode("utf8"))
+        elif isinstance(value, (bytes, bytearray)):
+            self._write_sized(buffer, b"b", bytes(value))
+        elif isinstance(value, (list, tuple)):
+            buffer += b"l" + self._LENGTH.pack(len(value))
+            for item in value:
+                self._write(buffer, item)
+        elif isinstance(value, dict):
+            buffer += b"m" + self._LENGTH.pack(len(value))
+            for key, item in value.items():
+                self._write(buffer, key)
+                self._write(buffer, item)
+        else:
+            raise AutorFrameworkValueException(
+                f"Binary context codec cannot encode a value of type: {type(value).__name__}"
+            )
+
+    def _write_sized(self, buffer: bytearray, tag: bytes, data: bytes) -> None:
+        buffer += tag + self._LENGTH.pack(len(data))
+        buffer += data
+
+    def _read(self, data: memoryview, offset: int):
+        tag = data[offset : offset + 1].tobytes()
+        offset = offset + 1
+
+        if tag == b"N":
+            return None, offset
+        if tag == b"T":
+            return True, offset
+        if tag == b"F":
+            return False, offset
+        if tag == b"i":
+            return self._INT.unpack_from(data, offset)[0], offset + self._INT.size
+        if tag == b"f":
+            return self._FLOAT.unpack_from(data, offset)[0], offset + self._FLOAT.size
+        if tag in (b"I", b"s", b"b"):
+            length = self._LENGTH.unpack_from(data, offset)[0]
+            offset = offset + self._LENGTH.size
+            raw = data[offset : offset + length].tobytes()
+            if len(raw) != length:
+                raise AutorFrameworkValueException("Binary context codec: truncated value")
+            if tag == b"I":
+                return int(raw.decode("ascii")), offset + length
+            if tag == b"s":
+                return raw.decode("utf8"), offset + length
+            return raw, offset + length
+        if tag in (b"l", b"m"):
+            count = self._LENGTH.unpack_from(data, offset)[0]
+            offset = offset + self._LENGTH.size
+            if tag == b"l":
+                items = []
+                for _ in range(count):
+                    item, offset = self._read(data, offset)
+                    items.append(item)
+                return items, offset
+            mapping = {}
+            for _ in range(count):
+                key, offset = self._read(data, offset)
+                mapping[key], offset = self._read(data, offset)
+            return mapping, offset
+
+        raise AutorFrameworkValueException(f"Binary context codec: unknown type tag: {tag!r}")
@@ -0,0 +1,213 @@
+#  Copyright 2022-Present Autor contributors
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+from typing import Any, Iterator, Tuple
+
+
+class ContextPaths:
+    """
+    Helpers for addressing single values in the nested context dictionary.
+
+    A context dictionary has the following structure:
+
+        {
+            <flow key>: <value>,
+            "_latest": {<flow key>: <path>},
+            "_activityBlocks": {
+                <activity block>: {
+                    <activity block key>: <value>,
+                    "_latest": {<activity block key>: <path>},
+                    "_activities": {
+                        <activity>: {<activity key>: <value>}
+                    }
+                }
+            }
+        }
+
+    A value is stored only once, on the level where it was set. The "_latest" dictionaries are
+    the latest writer indexes of the flow and activity block levels: they map a key to the path
+    of the value that was propagated to the level most recently. An empty path means that the
+    value stored on the level itself is the latest one.
+
+    A path is a tuple of the dictionary keys that lead to one value, e.g.
+    ("_activityBlocks", "my-block", "_activities", "my-block-A1", "status").
+    Remote contexts can use paths to store and transfer single values instead of the whole
+    context.
+    """
+
+    # Reserved key names for the inner context structure.
+    ACTIVITY_BLOCKS = "_activityBlocks"
+    ACTIVITIES = "_activities"
+    LATEST = "_latest"
+
+    @staticmethod
+    def flow(key: str) -> Tuple[str, ...]:
+        return (key,)
+
+    @staticmethod
+    def activity_block(activity_block: str, key: str) -> Tuple[str, ...]:
+        return (ContextPaths.ACTIVITY_BLOCKS, activity_block, key)
+
+    @staticmethod
+    def activity(activity_block: str, activity: str, key: str) -> Tuple[str, ...]:
+        return (
+            ContextPaths.ACTIVITY_BLOCKS,
+            activity_block,
+            ContextPaths.ACTIVITIES,
+            activity,
+            key,
+        )
+
+    @staticmethod
+    def flow_latest(key: str) -> Tuple[str, ...]:
+        return (ContextPaths.LATEST, key)
+
+    @staticmethod
+    def activity_block_latest(activity_block: str, key: str) -> Tuple[str, ...]:
+        return (ContextPaths.ACTIVITY_BLOCKS, activity_block, ContextPaths.LATEST, key)
+
+    @staticmethod
+    def leaves(context: dict) -> Iterator[Tuple[Tuple[str, ...], Any]]:
+        """Iterate over all (path, value) pairs of the context, including the latest writer \
+            index entries."""
+        for key, value in context.items():
+            if key == ContextPaths.LATEST:
+                for latest_key, path in value.items():
+                    yield (ContextPaths.LATEST, latest_key), path
+                continue
+
+            if key != ContextPaths.ACTIVITY_BLOCKS:
+                yield (key,), value
+                continue
+
+            for block, block_context in value.items():
+                for block_key, block_value in block_context.items():
+                    if block_key == ContextPaths.LATEST:
+                        for latest_key, path in block_value.items():
+                            yield (
+                                ContextPaths.ACTIVITY_BLOCKS,
+                                block,
+                                ContextPaths.LATEST,
+                                latest_key,
+                            ), path
+                        continue
+
+                    if block_key != ContextPaths.ACTIVITIES:
+                        yield (ContextPaths.ACTIVITY_BLOCKS, block, block_key), block_value
+                        continue
+
+                    for activity, activity_context in block_value.items():
+                        for activity_key, activity_value in activity_context.items():
+                            yield (
+                                ContextPaths.ACTIVITY_BLOCKS,
+                                block,
+                                ContextPaths.ACTIVITIES,
+                                activity,
+                                activity_key,
+                            ), activity_value
+
+    @staticmethod
+    def get(context: dict, path: Tuple[str, ...], default=None) -> Any:
+        node = context
+        for key in path[:-1]:
+            node = node.get(key)
+            if node is None:
+                return default
+        return node.get(path[-1], default)
+
+    @staticmethod
+    def set(context: dict, path: Tuple[str, ...], value: Any) -> None:
+        node = context
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = value
+
+    @staticmethod
+    def materialize(context: dict) -> dict:
+        """Return a copy of the context where the latest writer indexes have been resolved, \
+            i.e. every propagated value is also stored on the flow and activity block levels."""
+        view = ContextPaths._resolve_level(context, context)
+
+        blocks = context.get(ContextPaths.ACTIVITY_BLOCKS)
+        if blocks is not None:
+            view[ContextPaths.ACTIVITY_BLOCKS] = {
+                block: ContextPaths._resolve_level(context, block_context)
+                for block, block_context in blocks.items()
+            }
+        return view
+
+    @staticmethod
+    def dematerialize(context: dict) -> dict:
+        """Convert a context in the materialized layout, e.g. one that was synced by a version \
+            without the latest writer indexes, to the internal layout. The context is changed \
+            in place and returned.
+
+        A value on the flow or activity block level that equals the value of the same key on a \
+        level below is taken as propagated from there: it is replaced by a latest writer index \
+        entry. If several levels below have an equal value, the last one is taken. The keys that \
+        already have an index entry on the level are not changed."""
+        missing = object()
+        origins = {}  # {flow key: path of the last equal activity block value}
+        blocks = context.get(ContextPaths.ACTIVITY_BLOCKS, {})
+        for block, block_context in blocks.items():
+            block_latest = block_context.get(ContextPaths.LATEST, {})
+            propagated = {}  # {activity block key: path of the last equal activity value}
+            for activity, values in block_context.get(ContextPaths.ACTIVITIES, {}).items():
+                for key, value in values.items():
+                    own = block_context.get(key, missing)
+                    if key not in block_latest and own is not missing and own == value:
+                        propagated[key] = ContextPaths.activity(block, activity, key)
+            for key, path in propagated.items():
+                block_context.setdefault(ContextPaths.LATEST, {})[key] = path
+                del block_context[key]
+
+            block_latest = block_context.get(ContextPaths.LATEST, {})
+            for key, value in ContextPaths._resolve_level(context, block_context).items():
+                own = context.get(key, missing)
+                if key != ContextPaths.ACTIVITIES and own is not missing and own == value:
+                    origins[key] = block_latest.get(key) or ContextPaths.activity_block(block, key)
+
+        latest = context.get(ContextPaths.LATEST, {})
+        for key, path in origins.items():
+            if key not in latest:
+                context.setdefault(ContextPaths.LATEST, {})[key] = tuple(path)
+                del context[key]
+        return context
+
+    @staticmethod
+    def dematerialize_values(values: dict) -> dict:
+        """dematerialize() for the values {path: value} of a context. Returns the values of \
+            the converted context."""
+        context = {}
+        for path, value in values.items():
+            ContextPaths.set(context, tuple(path), value)
+        return dict(ContextPaths.leaves(ContextPaths.dematerialize(context)))
+
+    @staticmethod
+    def _resolve_level(context: dict, level: dict) -> dict:
+        view = {}
+        for key, value in level.items():
+            if key == ContextPaths.ACTIVITY_BLOCKS:
+                continue
+            if key == ContextPaths.ACTIVITIES:
+                value = {activity: dict(values) for activity, values in value.items()}
+            if key != ContextPaths.LATEST:
+                view[key] = value
+
+        missing = object()
+        for key, path in level.get(ContextPaths.LATEST, {}).items():
+            if path:
+                value = ContextPaths.get(context, path, missing)
+                if value is not missing:
+                    view[key] = value
+        return view
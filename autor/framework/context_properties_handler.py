@@ -112,12 +112,18 @@ class ContextPropertiesHandler:
                     )
                 setattr(self._object, prop.name, prop_value)
 
-    def save_output_properties(self, mandatory_outputs_check: bool = True):
+    def save_output_properties(
+        self, mandatory_outputs_check: bool = True, sync_remote=True
+    ) -> List[str]:
         """Save the output properties values to the context and synchronize the \
             context with the remote context.
         Args:
             mandatory_outputs_check (bool, optional): If true, check that the mandatory \
                 output properties are provided by the object.
+            sync_remote (bool, optional): If true, synchronize the context with the remote \
+                context after saving. Defaults to True.
+        Returns:
+            List[str] -- The context keys of the saved output properties.
         Raises:
             ContextPropertiesHandlerValueException: If mandatory output properties are not \
                 provided and mandatory_outputs_check==True
@@ -126,6 +132,7 @@ class ContextPropertiesHandler:
 
         # Get a list of output properties for the object
         props: List[ContextProperty] = ContextPropertiesRegistry.get_output_properties(self._object)
+        saved_keys = []
 
         for prop in props:
             Check.is_instance_of(prop, ContextProperty)
@@ -166,6 +173,10 @@ class ContextPropertiesHandler:
                     prop.name, from_format=prp.format, to_format=ctx.format
                 )
                 self._context.set(ctx_key, prop_value)
+                saved_keys.append(ctx_key)
 
         # Synchronize the context with the remote context (if it exists)
-        self._context.sync_remote()
+        if sync_remote:
+            self._context.sync_remote()
+
+        return saved_keys
@@ -148,12 +148,34 @@ class ContextPropertiesRegistry:
             instance, ContextPropertiesRegistry.__outputs
         )
 
+    @staticmethod
+    def get_class_input_properties(cls: type) -> List[ContextProperty]:
+        """Get registered @input properties of the class, including the inherited ones."""
+        return ContextPropertiesRegistry.__get_class_properties(
+            cls, ContextPropertiesRegistry.__inputs
+        )
+
+    @staticmethod
+    def get_class_output_properties(cls: type) -> List[ContextProperty]:
+        """Get registered @output properties of the class, including the inherited ones."""
+        return ContextPropertiesRegistry.__get_class_properties(
+            cls, ContextPropertiesRegistry.__outputs
+        )
+
     # --------------------------- P R I V A T E   M E T H O D S ---------------------------------#
     @staticmethod
     def __get_properties(instance, properties: Dict[str, ContextProperty]) -> List[ContextProperty]:
         """Return a list of properties for the given instance."""
+        Check.not_none(instance, "The object to inspect for properties is None")
+        return ContextPropertiesRegistry.__get_class_properties(instance.__class__, properties)
 
-        class_names = ContextPropertiesRegistry.__get_instance_class_names(instance)
+    @staticmethod
+    def __get_class_properties(
+        cls: type, properties: Dict[str, ContextProperty]
+    ) -> List[ContextProperty]:
+        """Return a list of properties for the given class."""
+
+        class_names = [cl.__name__ for cl in inspect.getmro(cls)]
 
         # Create a list of all properties that are declared by the classes of the instance.
         instance_properties = []
@@ -163,17 +185,6 @@ class ContextPropertiesRegistry:
                 instance_properties.append(properties[id])
         return instance_properties
 
-    @staticmethod
-    def __get_instance_class_names(instance: object) -> List[str]:
-        Check.not_none(instance, "The object to inspect for properties is None")
-        classes = inspect.getmro(instance.__class__)
-
-        # The class name and the inherited class names for the instance.
-        class_names = []
-        for cl in classes:
-            class_names.append(cl.__name__)
-        return class_names
-
     @staticmethod
     # pylint: disable-next=redefined-builtin
     def _add_property(mandatory, type, property_list, func):
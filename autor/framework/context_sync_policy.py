@@ -0,0 +1,130 @@
+#  Copyright 2022-Present Autor contributors
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import time
+
+from autor.framework.autor_framework_exception import (
+    AutorFrameworkValueException,
+)
+from autor.framework.constants import SyncPolicy
+from autor.framework.context import Context
+
+
+class ContextSyncPolicy:
+    """
+    Decides when the flow context is synchronized with the remote context during an activity
+    block run.
+
+    The policy is read from the 'contextSync' section of the Flow Configuration:
+
+        contextSync:
+          policy: every-n-activities  # See constants.SyncPolicy. Default: per-activity
+          activities: 10              # every-n-activities: sync after every 10 activities
+          interval: 5.0               # time-interval: sync when 5 seconds have passed
+          asynchronous: true          # sync in a background thread. Default: false
+          queueSize: 8                # asynchronous: max number of queued syncs
+          codec: json                 # See constants.CodecType. Used by the remote context
+
+    Regardless of the policy, the context is always synchronized at the end of the activity
+    block and when Autor tears down (see flush()).
+    """
+
+    def __init__(
+        self,
+        policy: str = SyncPolicy.PER_ACTIVITY,
+        activities: int = 1,
+        interval: float = 0.0,
+        asynchronous: bool = False,
+        queue_size: int = 8,
+    ):
+        if policy not in (
+            SyncPolicy.PER_ACTIVITY,
+            SyncPolicy.EVERY_N_ACTIVITIES,
+            SyncPolicy.TIME_INTERVAL,
+            SyncPolicy.END_OF_BLOCK,
+        ):
+            raise AutorFrameworkValueException(f"Unknown context sync policy: {policy!r}")
+
+        if not isinstance(activities, int) or activities < 1:
+            raise AutorFrameworkValueException(
+                f"Context sync 'activities' must be a positive integer, received: {activities!r}"
+            )
+
+        if not isinstance(interval, (int, float)) or interval < 0:
+            raise AutorFrameworkValueException(
+                f"Context sync 'interval' must be a non-negative number, received: {interval!r}"
+            )
+
+        if not isinstance(queue_size, int) or queue_size < 1:
+            raise AutorFrameworkValueException(
+                f"Context sync 'queueSize' must be a positive integer, received: {queue_size!r}"
+            )
+
+        self._policy = policy
+        self._activities = activities
+        self._interval = interval
+        self._asynchronous = bool(asynchronous)
+        self._queue_size = queue_size
+
+        self._unsynced_activities = 0  # Activities finished since the latest sync.
+        self._latest_sync = time.monotonic()
+
+    @staticmethod
+    def from_configuration(configuration: dict) -> "ContextSyncPolicy":
+        """Create the policy from the 'contextSync' section of the Flow Configuration."""
+        return ContextSyncPolicy(
+            policy=configuration.get("policy", SyncPolicy.PER_ACTIVITY),
+            activities=configuration.get("activities", 1),
+            interval=configuration.get("interval", 0.0),
+            asynchronous=configuration.get("asynchronous", False),
+            queue_size=configuration.get("queueSize", 8),
+        )
+
+    @property
+    def policy(self) -> str:
+        return self._policy
+
+    @property
+    def asynchronous(self) -> bool:
+        return self._asynchronous
+
+    @property
+    def queue_size(self) -> int:
+        return self._queue_size
+
+    def activity_finished(self, context: Context) -> None:
+        """Called when an activity has saved its output properties to the context. \
+            Syncs the context if the policy says so."""
+        self._unsynced_activities = self._unsynced_activities + 1
+
+        if self._policy == SyncPolicy.PER_ACTIVITY:
+            due = True
+        elif self._policy == SyncPolicy.EVERY_N_ACTIVITIES:
+            due = self._unsynced_activities >= self._activities
+        elif self._policy == SyncPolicy.TIME_INTERVAL:
+            due = time.monotonic() - self._latest_sync >= self._interval
+        else:  # END_OF_BLOCK
+            due = False
+
+        if due:
+            self._sync(context)
+
+    def flush(self, context: Context) -> None:
+        """Sync the context regardless of the policy and wait for the asynchronous syncs."""
+        self._sync(context)
+        context.drain_remote()
+
+    def _sync(self, context: Context) -> None:
+        self._unsynced_activities = 0
+        self._latest_sync = time.monotonic()
+        context.sync_remote()
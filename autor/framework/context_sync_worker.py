@@ -0,0 +1,113 @@
+#  Copyright 2022-Present Autor contributors
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import collections
+import queue
+import threading
+
+from autor.framework.context_paths import ContextPaths
+from autor.framework.remote_context import RemoteContext
+
+_MISSING = object()
+
+
+class ContextSyncWorker:
+    """
+    Synchronizes context snapshots with the remote context in a background thread.
+
+    submit() puts a snapshot of the local context on a bounded queue and returns at once
+    (or blocks while the queue is full). The worker thread syncs the snapshots in order and
+    collects the values that the remote context added or changed in them. merge() applies
+    these remote values to the local context and raises the first error of a failed sync.
+
+    submit(), merge() and drain() should be called by the thread that owns the local context.
+    """
+
+    def __init__(self, queue_size: int = 8):
+        self._queue = queue.Queue(maxsize=queue_size)
+        # (updates, exception) of the finished syncs, in submit order.
+        self._results = collections.deque()
+        # The changes of the submitted syncs whose results have not been merged yet.
+        self._pending = collections.deque()
+
+        self._thread = threading.Thread(target=self._work, name="autor-context-sync", daemon=True)
+        self._thread.start()
+
+    # pylint: disable-next=redefined-builtin
+    def submit(self, remote: RemoteContext, id: str, snapshot: dict, changes: set) -> None:
+        """Queue a sync of 'snapshot'. Blocks while the queue is full."""
+        self._pending.append(changes)
+        self._queue.put((remote, id, snapshot, changes))
+
+    def merge(self, context: dict, changes: set) -> None:
+        """Apply the remote values of the finished syncs to 'context'.
+        Values that have changed locally after a snapshot was taken are not overwritten.
+
+        Arguments:
+            context {dict} -- The local context.
+            changes {set} -- The local changes that have not been submitted yet. The changes \
+                of failed syncs are added to this set, so that they are retried.
+        Raises:
+            The exception of the first failed sync, if any.
+        """
+        error = None
+        while self._results:
+            updates, exception = self._results.popleft()
+            submitted_changes = self._pending.popleft()
+
+            if exception is not None:
+                changes |= submitted_changes
+                if error is None:
+                    error = exception
+                continue
+
+            protected = changes.union(*self._pending)
+            for path, value in updates.items():
+                if path not in protected:
+                    ContextPaths.set(context, path, value)
+
+        if error is not None:
+            raise error
+
+    def drain(self, context: dict, changes: set) -> None:
+        """Wait until all the queued syncs have finished and merge their results."""
+        self._queue.join()
+        self.merge(context, changes)
+
+    def stop(self) -> None:
+        """Stop the worker thread after the queued syncs have finished."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+
+                remote, id, snapshot, changes = job  # pylint: disable=redefined-builtin
+                try:
+                    before = dict(ContextPaths.leaves(snapshot))
+                    remote.sync_changes(id, snapshot, changes)
+                    # The remote context sets new objects for the values it adds or changes.
+                    updates = {
+                        path: value
+                        for path, value in ContextPaths.leaves(snapshot)
+                        if before.get(path, _MISSING) is not value
+                    }
+                    self._results.append((updates, None))
+                except Exception as exception:
+                    self._results.append((None, exception))
+            finally:
+                self._queue.task_done()
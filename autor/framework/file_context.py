@@ -11,41 +11,463 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import contextlib
 import json
+import logging
+import os
+import struct
+import time
+import uuid
+from typing import Set, Tuple
+from urllib.parse import quote
 
+from autor.framework.context_codec import JsonCodec
+from autor.framework.context_paths import ContextPaths
 from autor.framework.extension_exception import AutorExtensionException
 from autor.framework.remote_context import RemoteContext
 
+try:
+    import fcntl
+except ImportError:  # Not available on Windows.
+    fcntl = None
+
 
 class FileContext(RemoteContext):
+    """
+    A remote context that stores the contexts in local files. The files are serialized with
+    the codec of the remote context (see RemoteContext.codec), compact JSON by default.
+    """
 
     # C O N S T A N T S
     # ------------------
     # A string constant to use as the name of file which is going to be the file context.
     _FILENAME = "file_context.json"
+    # The name of the append-only file with context changes (used in journal mode).
+    _JOURNAL_FILENAME = "file_context.journal"
+    # Sharded mode: the name of the file that lists the flow runs stored in the directory.
+    _INDEX_FILENAME = "index.json"
+
+    # The index is always JSON, so that it can be read without knowing the codec.
+    _INDEX_CODEC = JsonCodec()
+    # Journal records of binary codecs are prefixed with their length.
+    _RECORD_LENGTH = struct.Struct(">I")
+    # The key of the journal epoch in the file context snapshot.
+    _EPOCH_KEY = "_journalEpoch"
+    # How many times to re-read a snapshot that does not match its journal.
+    _READ_ATTEMPTS = 5
+    # The number of bytes read to find the epoch record at the start of a journal.
+    _HEADER_READ = 256
+
+    def __init__(
+        self,
+        journal: bool = False,
+        compact_every: int = 100,
+        directory: str = None,
+        retention: int = None,
+    ):
+        """
+        Arguments:
+            journal {bool} -- If True, each sync appends only the values that changed since the \
+                previous sync to the journal file instead of rewriting the whole file context.
+            compact_every {int} -- Journal mode only. The number of journal appends after which \
+                the journal is compacted into the file context snapshot.
+            directory {str} -- If given, each flow run is stored in its own file in this \
+                directory (sharded mode) instead of one file for all flow runs. The flow runs \
+                are listed in the index file of the directory.
+            retention {int} -- Sharded mode only. The maximum number of flow runs to keep. \
+                The oldest flow runs are removed when a new flow run is added.
+        """
+        if retention is not None and (not isinstance(retention, int) or retention < 1):
+            raise AutorExtensionException(
+                f"File context retention must be a positive integer, received: {retention!r}"
+            )
+
+        self._journal = journal
+        self._compact_every = compact_every
+        self._directory = directory
+        self._retention = retention
+        self._indexed = set()  # Sharded mode: the ids that have been added to the index.
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+        # Journal mode state.
+        self._writer_id = str(uuid.uuid4())  # Identifies the journal records written by us.
+        # {id: position in the journal that has been read so far}, None: re-read the snapshot.
+        self._journal_offsets = {}
+        self._journal_epochs = {}  # {id: epoch of the journal that has been read}
+        self._appends = 0  # Number of journal appends since the latest compaction.
+        self._synced = {}  # {id: {path: encoded value}} Values as of the latest sync.
+
     # pylint: disable-next=redefined-builtin
     def sync(self, id: str, context: dict) -> None:
-        file_content = {}
+        if self._journal:
+            self._sync_journal(id, context)
+        else:
+            self._sync_file(id, context)
+
+    # pylint: disable-next=redefined-builtin
+    def sync_changes(self, id: str, context: dict, changes: Set[Tuple[str, ...]]) -> None:
+        # The changes can be used only if this instance has synced the context before.
+        if self._journal and id in self._journal_offsets:
+            self._sync_journal(id, context, changes)
+        else:
+            self.sync(id, context)
+
+    # ------------------------------------   F U L L   F I L E   ---------------------------------#
+
+    # pylint: disable-next=redefined-builtin
+    def _sync_file(self, id: str, context: dict) -> None:
+        if self._directory is not None:
+            remote_context = self._load_shard(id, self._shard_path(id, ".json"))
+            remote_context.pop(self._EPOCH_KEY, None)
+            ContextPaths.dematerialize(remote_context)
+            remote_context.update(context)
+            context.update(remote_context)
+            self._write_file(self._shard_path(id, ".json"), self.codec.encode(remote_context))
+            self._add_to_index(id)
+            return
+
+        file_content = self._load_snapshot()
+        remote_context = file_content.get(id, {})  # File may contain more than one context
+        ContextPaths.dematerialize(remote_context)  # Synced by an older version.
+
+        remote_context.update(context)
+        context.update(remote_context)
+        file_content.update({id: remote_context})
+
         try:
-            with open(self._FILENAME, "r", encoding="utf8") as file_context:
-                file_content = json.load(file_context)
-                remote_context = file_content.get(id, {})  # File may contain more than one context
-        except FileNotFoundError:
-            remote_context = {}
+            with open(self._FILENAME, "wb") as file_context:
+                file_context.write(self.codec.encode(file_content))
         except Exception as exception:
+            # logging.error(f"Failed to open file context for syncing. Exception: {e.args}")
             raise AutorExtensionException(
                 f"Failed to open file context for syncing. Exception: {exception.args}"
             ) from exception
 
-        remote_context.update(context)
-        context.update(remote_context)
-        file_content.update({id: remote_context})
+    # ---------------------------------------   J O U R N A L   ----------------------------------#
+    #
+    # The journal is a file of records:
+    #   {"writer": <writer id>, "id": <context id>, "values": [[<path>, <value>], ...]}
+    # With the JSON codec there is one record per line. The records of other codecs are
+    # prefixed with their length (_RECORD_LENGTH).
+    #
+    # The file context snapshot (_FILENAME) keeps the format of the full file mode. The journal
+    # records are applied on top of the snapshot, and the journal is periodically compacted into
+    # the snapshot.
+    #
+    # Compaction writes a new snapshot and a new journal and renames them over the old ones. Both
+    # carry a new epoch: the snapshot under _EPOCH_KEY and the journal in its first record,
+    #   {"epoch": <epoch>}
+    # When the epoch of the journal is not the one read before, or the journal is shorter than
+    # the position read so far, the snapshot and the journal are read again from the start.
+    # Appends and compactions hold an exclusive lock on the journal lock file, reads a shared
+    # one. Without fcntl (Windows) there is no lock: the reads are retried until the epochs of the
+    # snapshot and the journal match, but the values appended during a compaction can be lost.
+    #
+    # In sharded mode every flow run has its own snapshot and journal file in the directory.
 
+    # pylint: disable-next=redefined-builtin
+    def _sync_journal(self, id: str, context: dict, changes: Set[Tuple[str, ...]] = None) -> None:
         try:
-            with open(self._FILENAME, "w", encoding="utf8") as file_context:
-                json.dump(file_content, file_context, indent=2)
+            # Values written by others since the previous sync.
+            incoming = self._read_journal(id)
+
+            # Without the set of changed paths, all values are compared with the synced ones.
+            if changes is None:
+                values = ContextPaths.leaves(context)
+            else:
+                values = ((path, ContextPaths.get(context, path)) for path in changes)
+
+            synced = self._synced.setdefault(id, {})
+            changed = {}  # {path: (encoded value, value)}
+            for path, value in values:
+                encoded = self.codec.encode(value)
+                if synced.get(path) != encoded:
+                    synced[path] = encoded
+                    changed[path] = (encoded, value)
+
+            # Local changes win over the remote ones.
+            for path, value in incoming.items():
+                if path not in changed:
+                    ContextPaths.set(context, path, value)
+                    synced[path] = self.codec.encode(value)
+
+            if changed:
+                self._append_journal(id, changed)
+            if self._directory is not None:
+                self._add_to_index(id)
+
+            if self._appends >= self._compact_every:
+                self.compact()
+
+        except AutorExtensionException:
+            raise
+        except Exception as exception:
+            raise AutorExtensionException(
+                f"Failed to sync file context journal. Exception: {exception.args}"
+            ) from exception
+
+    def compact(self) -> None:
+        """Merge the journal into the file context snapshot and start a new journal."""
+        if self._directory is not None:
+            for id in self._journal_offsets:  # pylint: disable=redefined-builtin
+                self._compact_shard(id)
+        else:
+            with self._journal_lock(self._JOURNAL_FILENAME, exclusive=True):
+                file_content = self._load_snapshot()
+
+                for record in self._journal_records(0, skip_own=False)[0]:
+                    remote_context = file_content.setdefault(record["id"], {})
+                    for path, value in record["values"]:
+                        ContextPaths.set(remote_context, tuple(path), value)
+
+                epoch = str(uuid.uuid4())
+                file_content[self._EPOCH_KEY] = epoch
+                self._write_file(self._FILENAME, self.codec.encode(file_content))
+                self._write_file(self._JOURNAL_FILENAME, self._encode_record({"epoch": epoch}))
+
+        # The compacted journal may have had records that were not read yet.
+        self._journal_offsets = dict.fromkeys(self._journal_offsets)
+        self._appends = 0
+
+    # pylint: disable-next=redefined-builtin
+    def _compact_shard(self, id: str) -> None:
+        journal_path = self._shard_path(id, ".journal")
+        with self._journal_lock(journal_path, exclusive=True):
+            remote_context = self._load_shard(id, self._shard_path(id, ".json"))
+            for record in self._journal_records(0, skip_own=False, path=journal_path)[0]:
+                for path, value in record["values"]:
+                    ContextPaths.set(remote_context, tuple(path), value)
+
+            epoch = str(uuid.uuid4())
+            remote_context[self._EPOCH_KEY] = epoch
+            self._write_file(self._shard_path(id, ".json"), self.codec.encode(remote_context))
+            self._write_file(journal_path, self._encode_record({"epoch": epoch}))
+
+    # pylint: disable-next=redefined-builtin
+    def _read_journal(self, id: str) -> dict:
+        """Return the values {path: value} for 'id' that are new since the previous read."""
+        if self._directory is not None:
+            snapshot_path = self._shard_path(id, ".json")
+            journal_path = self._shard_path(id, ".journal")
+        else:
+            snapshot_path, journal_path = None, self._JOURNAL_FILENAME
+
+        with self._journal_lock(journal_path, exclusive=False):
+            offset = self._journal_offsets.get(id)
+            if offset is not None:
+                records, end, _ = self._journal_records(
+                    offset, path=journal_path, epoch=self._journal_epochs.get(id)
+                )
+                if records is not None:
+                    self._journal_offsets[id] = end
+                    return FileContext._values(id, records, {})
+
+            # First sync, or the journal has been compacted since the previous read: read the
+            # whole snapshot and the whole journal.
+            for _ in range(self._READ_ATTEMPTS):
+                if snapshot_path is not None:
+                    snapshot = self._load_shard(id, snapshot_path)
+                    snapshot_epoch = snapshot.pop(self._EPOCH_KEY, None)
+                else:
+                    file_content = self._load_snapshot()
+                    snapshot = file_content.get(id, {})
+                    snapshot_epoch = file_content.get(self._EPOCH_KEY)
+                records, end, epoch = self._journal_records(0, path=journal_path)
+                if snapshot_epoch == epoch:
+                    break
+                # Compacted between the two reads (no lock): read both again.
+            else:
+                logging.warning("File context snapshot and journal do not match: %s", journal_path)
+
+        self._journal_offsets[id], self._journal_epochs[id] = end, epoch
+        # The snapshot and the journal may have been written by an older version.
+        return ContextPaths.dematerialize_values(
+            FileContext._values(id, records, dict(ContextPaths.leaves(snapshot)))
+        )
+
+    @staticmethod
+    # pylint: disable-next=redefined-builtin
+    def _values(id: str, records: list, incoming: dict) -> dict:
+        # Add the values of the records of 'id' to 'incoming', later ones win.
+        for record in records:
+            if record["id"] == id:
+                for path, value in record["values"]:
+                    incoming[tuple(path)] = value
+        return incoming
+
+    def _journal_records(
+        self, offset: int, skip_own: bool = True, path: str = _JOURNAL_FILENAME, epoch: str = None
+    ):
+        """Return the journal records starting at 'offset', the offset of the end of the read \
+            and the epoch of the journal. When reading from an 'offset' other than 0, the \
+            records are None if the journal is not the one of 'epoch' or it is shorter than \
+            'offset', i.e. it has been replaced by a compaction."""
+        try:
+            with open(path, "rb") as journal:
+                if os.fstat(journal.fileno()).st_size < offset:
+                    return None, 0, None
+                header, header_end = self._decode_records(journal.read(self._HEADER_READ), 1)
+                journal_epoch = None
+                if header and "values" not in header[0]:
+                    journal_epoch = header[0].get("epoch")
+                if offset and journal_epoch != epoch:
+                    return None, 0, journal_epoch
+                journal.seek(max(offset, header_end if journal_epoch is not None else 0))
+                data = journal.read()
+                offset = journal.tell() - len(data)
+        except FileNotFoundError:
+            return (None if offset else []), 0, None
+
+        records, position = self._decode_records(data)
+        records = [
+            record
+            for record in records
+            if "values" in record and not (skip_own and record.get("writer") == self._writer_id)
+        ]
+        return records, offset + position, journal_epoch
+
+    def _decode_records(self, data: bytes, limit: int = None):
+        # Decode the complete records at the start of 'data', at most 'limit' records.
+        # Returns the records and the position after the last one.
+        records = []
+        position = 0
+        while position < len(data) and (limit is None or len(records) < limit):
+            if isinstance(self.codec, JsonCodec):
+                end = data.find(b"\n", position)
+                if end < 0:
+                    break  # A record that is still being written.
+                start, end = position, end + 1
+            else:
+                start = position + self._RECORD_LENGTH.size
+                if start > len(data):
+                    break
+                end = start + self._RECORD_LENGTH.unpack_from(data, position)[0]
+                if end > len(data):
+                    break  # A record that is still being written.
+
+            records.append(self.codec.decode(data[start:end]))
+            position = end
+        return records, position
+
+    def _encode_record(self, record: dict) -> bytes:
+        if isinstance(self.codec, JsonCodec):
+            return self.codec.encode(record) + b"\n"
+        encoded = self.codec.encode(record)
+        return self._RECORD_LENGTH.pack(len(encoded)) + encoded
+
+    # pylint: disable-next=redefined-builtin
+    def _append_journal(self, id: str, changed: dict) -> None:
+        if isinstance(self.codec, JsonCodec):
+            # The values are already encoded -> build the record line around them.
+            values = b",".join(
+                b"[" + json.dumps(list(path)).encode("utf8") + b"," + encoded + b"]"
+                for path, (encoded, _) in changed.items()
+            )
+            record = (
+                f'{{"writer":{json.dumps(self._writer_id)},"id":{json.dumps(id)},'.encode("utf8")
+                + b'"values":['
+                + values
+                + b"]}\n"
+            )
+        else:
+            record = self._encode_record(
+                {
+                    "writer": self._writer_id,
+                    "id": id,
+                    "values": [[list(path), value] for path, (_, value) in changed.items()],
+                }
+            )
+
+        if self._directory is not None:
+            path = self._shard_path(id, ".journal")
+        else:
+            path = self._JOURNAL_FILENAME
+        with self._journal_lock(path, exclusive=True):
+            with open(path, "ab") as journal:
+                journal.write(record)
+        self._appends = self._appends + 1
+
+    @contextlib.contextmanager
+    def _journal_lock(self, journal_path: str, exclusive: bool):
+        # Serializes the appends and the compactions of all the instances that use the journal.
+        if fcntl is None:
+            yield
+            return
+        with open(journal_path + ".lock", "ab") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load_snapshot(self) -> dict:
+        try:
+            with open(self._FILENAME, "rb") as file_context:
+                return self.codec.decode(file_context.read())
+        except FileNotFoundError:
+            return {}
         except Exception as exception:
-            # logging.error(f"Failed to open file context for syncing. Exception: {e.args}")
             raise AutorExtensionException(
                 f"Failed to open file context for syncing. Exception: {exception.args}"
             ) from exception
+
+    # ---------------------------------------   S H A R D S   ------------------------------------#
+    #
+    # The index file maps each flow run id to its shard file name and creation time:
+    #   {<id>: {"file": <file name>, "created": <seconds since the epoch>}}
+
+    # pylint: disable-next=redefined-builtin
+    def _shard_path(self, id: str, extension: str) -> str:
+        return os.path.join(self._directory, quote(id, safe="") + extension)
+
+    # pylint: disable-next=redefined-builtin
+    def _load_shard(self, id: str, path: str, codec=None) -> dict:
+        try:
+            with open(path, "rb") as shard:
+                return (codec or self.codec).decode(shard.read())
+        except FileNotFoundError:
+            return {}
+        except Exception as exception:
+            raise AutorExtensionException(
+                f"Failed to open file context of flow run: {id}. Exception: {exception.args}"
+            ) from exception
+
+    def _write_file(self, path: str, data: bytes) -> None:
+        # Write to a temporary file first, so that readers never see a partially written file.
+        temporary_path = f"{path}.{self._writer_id}.tmp"
+        try:
+            with open(temporary_path, "wb") as file:
+                file.write(data)
+            os.replace(temporary_path, path)
+        except Exception as exception:
+            raise AutorExtensionException(
+                f"Failed to write file context: {path}. Exception: {exception.args}"
+            ) from exception
+
+    # pylint: disable-next=redefined-builtin
+    def _add_to_index(self, id: str) -> None:
+        """Add the flow run to the index and apply the retention limit. \
+            The index is updated only once per flow run and instance."""
+        if id in self._indexed:
+            return
+
+        index_path = os.path.join(self._directory, self._INDEX_FILENAME)
+        index = self._load_shard(id, index_path, codec=self._INDEX_CODEC)
+        if id not in index:
+            index[id] = {"file": os.path.basename(self._shard_path(id, "")), "created": time.time()}
+
+        if self._retention is not None and len(index) > self._retention:
+            oldest = sorted(
+                (run for run in index if run != id), key=lambda run: index[run]["created"]
+            )
+            for run in oldest[: len(index) - self._retention]:
+                for extension in (".json", ".journal", ".journal.lock"):
+                    try:
+                        os.remove(os.path.join(self._directory, index[run]["file"] + extension))
+                    except FileNotFoundError:
+                        pass
+                del index[run]
+
+        self._write_file(index_path, self._INDEX_CODEC.encode(index))
+        self._indexed.add(id)
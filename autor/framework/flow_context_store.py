@@ -0,0 +1,129 @@
+#  Copyright 2022-Present Autor contributors
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import contextvars
+import logging
+import threading
+from typing import List
+
+from autor.framework.context_paths import ContextPaths
+from autor.framework.context_sync_worker import ContextSyncWorker
+from autor.framework.remote_context import RemoteContext
+
+
+class FlowContextStore:
+    """
+    The data of one flow run: the local context, the remote context and the exceptions
+    registered during the run.
+
+    All Context objects created with the same store share its data. ActivityBlock creates
+    one store per run, so that one process can run several flows (e.g. on threads)
+    without the runs seeing each other's data. FlowRunner shares one store between the
+    activity blocks of a flow run: the Context objects change and sync the local context
+    while holding the lock of the store.
+    """
+
+    # A string constant to use for detecting undefined values.
+    UNDEFINED = "_UNDEFINED"
+
+    # The store of the activity block run of the calling thread or task, see current().
+    _current = contextvars.ContextVar("autor_flow_context_store", default=None)
+
+    def __init__(self, id: str = UNDEFINED):  # pylint: disable=redefined-builtin
+        # I D
+        # -----------------------------------
+        # A unique identifier of the context
+        self.id: str = id
+
+        # L O C A L   A N D   R E M O T E   C O N T E X T
+        # -------------------------------------------------
+        # The local context is the representation of the context that we're working with right
+        # now. The remote context, that is optional, is typically a data store where the context
+        # can be persisted. If provided, it is used to synchronize the changes in the local
+        # context.
+        self.local_context: dict = {}  # The internal representation (see ContextPaths).
+        self.remote_context: RemoteContext = None  # Can be added by an extension.
+
+        # C H A N G E S
+        # -------------------------------------------------
+        # The paths (see ContextPaths) of the values that have been set in the local context
+        # since the latest remote sync. If nothing has changed, the remote sync is skipped.
+        self.changes: set = set()
+
+        # A S Y N C H R O N O U S   S Y N C
+        # -------------------------------------------------
+        # If set, the remote syncs are done by a background thread.
+        self.sync_worker: ContextSyncWorker = None
+
+        # L O C K
+        # -------------------------------------------------
+        # Held while the local context is changed or synced.
+        self.lock = threading.RLock()
+
+        # G E N E R A T I O N
+        # -------------------------------------------------
+        # Incremented whenever the dictionaries of the local context may have been replaced.
+        # Invalidates the dictionaries cached by the Context objects.
+        self.generation: int = 0
+
+        # E X C E P T I O N S
+        # -------------------------------------------------
+        # Registered with Util.register_exception().
+        self.framework_exceptions: List[Exception] = []
+        self.other_exceptions: List[Exception] = []
+        self.first_exception: Exception = None
+        self.abort_exception: Exception = None
+
+    @staticmethod
+    def current() -> "FlowContextStore":
+        """Return the store of the activity block run that the calling code runs in, or None.
+
+        For the code that is not given the store of its flow run. ActivityBlock.run() sets the
+        store for its thread, and the threads and tasks that run its activities get it as well.
+        Other threads started by the activities do not: pass the store instead.
+        """
+        return FlowContextStore._current.get()
+
+    def make_current(self) -> contextvars.Token:
+        """Make this store the one returned by current() in the calling thread or task.
+
+        Returns:
+            contextvars.Token -- For restoring the previous store with reset_current().
+        """
+        return FlowContextStore._current.set(self)
+
+    @staticmethod
+    def reset_current(token: contextvars.Token) -> None:
+        """Restore the store that was current before make_current() returned 'token'."""
+        FlowContextStore._current.reset(token)
+
+    def set_context(self, context: dict) -> None:
+        """Replace the local context. All values are considered changed."""
+        self.local_context = context
+        self.changes = {path for path, _ in ContextPaths.leaves(context)}
+        self.generation = self.generation + 1
+
+    def print_all_exceptions(self) -> None:
+        if len(self.framework_exceptions) == 0 and len(self.other_exceptions) == 0:
+            logging.debug(" No registered exceptions")
+            return
+
+        if len(self.framework_exceptions) > 0:
+            logging.debug(" Framework exceptions:")
+            for ex in self.framework_exceptions:
+                logging.debug(f" * {str(ex)}")
+
+        if len(self.other_exceptions) > 0:
+            logging.debug(" Non-framework exceptions:")
+            for ex in self.other_exceptions:
+                logging.debug(f" * {str(ex)}")
@@ -0,0 +1,182 @@
+#  Copyright 2022-Present Autor contributors
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import concurrent.futures
+import logging
+import uuid
+from typing import Dict, List
+
+from autor.flow_configuration.flow_configuration import FlowConfiguration
+from autor.flow_configuration.flow_configuration_factory import load_flow_configuration
+from autor.framework.activity_block import ActivityBlock
+from autor.framework.autor_framework_exception import AutorFrameworkValueException
+from autor.framework.check import Check
+from autor.framework.constants import Status
+from autor.framework.flow_context_store import FlowContextStore
+from autor.framework.util import Util
+
+
+class FlowRunner:
+    """
+    Runs all the activity blocks of a flow in one process, in the order given by the 'dependsOn'
+    lists of the blocks. The blocks that do not depend on each other are run at the same time:
+
+        flowId: my-flow
+        maxWorkers: 4           # The max number of blocks running at the same time.
+        activityBlocks:
+          build:
+            activities: ...
+          test:
+            dependsOn: [build]
+            activities: ...
+          lint:
+            dependsOn: [build]  # test and lint are run at the same time, after build
+            activities: ...
+
+    A block is run when all the blocks that it depends on have finished with the status SUCCESS.
+    If one of them did not succeed, the block is not run and its status is SKIPPED.
+
+    The blocks share the flow run id and one flow context (FlowContextStore) in memory: a block
+    reads the outputs of the earlier blocks without a remote sync. The context is synced with
+    the remote context only at the start and at the end of each block. The remote context is
+    the one set up by the extensions of the first block that starts. The blocks that do not
+    depend on other blocks start a new flow context (see StateKeys.FLOW_CREATE_NEW_CONTEXT) if
+    the flow run is new. Each block keeps the exception that aborted it; the exceptions of all
+    the blocks are printed when the flow has finished.
+    """
+
+    def __init__(
+        self,
+        flow_config_url: str = None,
+        flow_run_id: str = None,
+        resume: bool = False,
+        profile: str = None,
+        profile_activities: list = None,
+    ):
+        Check.is_non_empty_string(flow_config_url, "flow_config_url")
+        if resume and flow_run_id is None:
+            raise AutorFrameworkValueException("Resuming a flow requires flow_run_id")
+
+        self._flow_config_url = flow_config_url
+        self._new_flow_run = flow_run_id is None
+        self._flow_run_id = flow_run_id if flow_run_id is not None else str(uuid.uuid4())
+        self._resume = resume
+        self._profile = profile
+        self._profile_activities = profile_activities
+        self._flow_store = FlowContextStore()
+
+    def run(self) -> Dict[str, str]:
+        """Run the activity blocks of the flow.
+
+        Returns:
+            {str: str} -- The status of each activity block, by activity block id.
+        """
+        flow_config = load_flow_configuration(self._flow_config_url)
+        order = FlowRunner._order(flow_config)
+        depends_on = {
+            block_id: flow_config.activity_block(block_id).depends_on for block_id in order
+        }
+        logging.info("RUNNING flow: '%s', activity blocks: %s", flow_config.flow_id, order)
+
+        statuses = {}
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=flow_config.max_workers, thread_name_prefix=f"autor-{flow_config.flow_id}"
+        ) as executor:
+            pending = list(order)
+            running = {}  # Future -> activity block id
+            while pending or running:
+                # The blocks are in dependency order: a skipped block is seen by its dependents
+                # in the same pass.
+                for block_id in list(pending):
+                    if any(d not in statuses for d in depends_on[block_id]):
+                        continue
+                    pending.remove(block_id)
+                    failed = [d for d in depends_on[block_id] if statuses[d] != Status.SUCCESS]
+                    if failed:
+                        logging.warning(
+                            "Activity block '%s' not run: activity blocks %s did not succeed",
+                            block_id,
+                            failed,
+                        )
+                        statuses[block_id] = Status.SKIPPED
+                    else:
+                        future = executor.submit(
+                            self._run_activity_block, block_id, not depends_on[block_id]
+                        )
+                        running[future] = block_id
+
+                if running:
+                    done, _ = concurrent.futures.wait(
+                        running, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    for future in done:
+                        statuses[running.pop(future)] = future.result()
+
+        logging.info("\n%s", Util.format_banner("F L O W   F I N I S H E D"))
+        for block_id in order:
+            logging.info("%-60s %s", block_id, statuses[block_id])
+        self._flow_store.print_all_exceptions()
+        return statuses
+
+    def _run_activity_block(self, activity_block_id: str, root: bool) -> str:
+        try:
+            activity_block = ActivityBlock(
+                flow_config_url=self._flow_config_url,
+                activity_block_id=activity_block_id,
+                flow_run_id=self._flow_run_id,
+                resume=self._resume,
+                profile=self._profile,
+                profile_activities=self._profile_activities,
+                flow_store=self._flow_store,
+                new_flow_run=self._new_flow_run and root,
+            )
+            activity_block.run()
+            return activity_block.status
+        except Exception:
+            logging.exception("Activity block '%s' could not be run", activity_block_id)
+            return Status.ERROR
+
+    @staticmethod
+    def _order(flow_config: FlowConfiguration) -> List[str]:
+        # The activity block ids in an order where each block comes after its dependencies.
+        # Raises AutorFrameworkValueException for unknown dependencies and cycles.
+        block_ids = list(flow_config.activity_block_ids)
+        depends_on = {}
+        for block_id in block_ids:
+            depends_on[block_id] = flow_config.activity_block(block_id).depends_on
+            for dependency in depends_on[block_id]:
+                if dependency not in block_ids:
+                    raise AutorFrameworkValueException(
+                        f"Activity block {block_id!r} depends on an unknown block: {dependency!r}"
+                    )
+
+        order = []
+        visiting = []
+
+        def visit(block_id):
+            if block_id in order:
+                return
+            if block_id in visiting:
+                cycle = visiting[visiting.index(block_id) :] + [block_id]
+                raise AutorFrameworkValueException(
+                    f"Activity block dependencies form a cycle: {' -> '.join(cycle)}"
+                )
+            visiting.append(block_id)
+            for dependency in depends_on[block_id]:
+                visit(dependency)
+            visiting.pop()
+            order.append(block_id)
+
+        for block_id in block_ids:
+            visit(block_id)
+        return order
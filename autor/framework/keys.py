@@ -95,14 +95,19 @@ keys = [
     "BEFORE_BLOCK",
     "CALLBACK_CLASS",
     "CALLBACK_EXCEPTIONS",
+    "CHECKPOINT",
     "CLASS",
     "CONTEXT",
+    "CONTEXT_SYNC_SECONDS",
     "CONTINUE_ON",
+    "COUNT",
+    "CPU_SECONDS",
     "CUSTOM",
     "CREDENTIALS_STORE_USER_ID",
     "DEALLOCATION_NEEDED",
     "DESCRIPTION",
     "DETAILED_ACTIVITY_STATUS",
+    "END",
     "EXCEPTION",
     "EXCEPTIONS",
     "EXCEPTION_MESSAGE",
@@ -121,15 +126,32 @@ keys = [
     "INTERNAL_ACTIVITY_DATA",
     "LOGS_URL",
     "MAIN_ACTIVITY_STATUS",
+    "MAX",
     "MESSAGE",
+    "METRICS",
+    "METRICS_SUMMARY",
     "NAMESPACE",
+    "OUTPUTS",
+    "P50",
+    "P95",
+    "PEAK_RSS_DELTA_KB",
+    "POSTPROCESS",
+    "PREPROCESS",
     "PRODUCT_ID",
+    "PROFILE",
+    "PROFILE_ACTIVITIES",
     "RAS_API_ENDPOINT",
     "RAS_CLIENT_ID",
     "RAS_HOST_URL",
+    "RESUME",
+    "RUN",
     "RUN_ON",
+    "SECONDS",
+    "START",
+    "STATE_HANDLER",
     "STATE_LISTENERS",
     "STATE_PRODUCERS",
+    "STATE_TIMINGS",
     "SEND_SOURCE_CREATED",
     "SEND_SOURCE_PUBLISHED",
     "SKIP_TYPE",
@@ -12,6 +12,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 import abc
+from typing import Set, Tuple
+
+from autor.framework.context_codec import ContextCodec, JsonCodec
 
 
 class RemoteContext:
@@ -23,6 +26,20 @@ class RemoteContext:
     class when creating own remote context classes.
     """
 
+    _codec: ContextCodec = None
+
+    @property
+    def codec(self) -> ContextCodec:
+        """The codec that remote contexts should use for serializing the context. \
+            Can be selected with 'contextSync.codec' in the Flow Configuration. Default: JSON."""
+        if self._codec is None:
+            self._codec = JsonCodec()
+        return self._codec
+
+    @codec.setter
+    def codec(self, codec: ContextCodec):
+        self._codec = codec
+
     @abc.abstractmethod
     # pylint: disable-next=redefined-builtin
     def sync(self, id: str, context: dict) -> None:
@@ -35,3 +52,19 @@ class RemoteContext:
             context {dict} -- The local dictionary that should be synchronized with \
                 the remote context.
         """
+
+    # pylint: disable-next=redefined-builtin
+    def sync_changes(self, id: str, context: dict, changes: Set[Tuple[str, ...]]) -> None:
+        """Synchronize the local context with the remote context, when the values in 'changes' \
+            are known to be the only local values that have changed since the previous sync.
+        Remote contexts that can push single values should override this method. By default \
+            the whole context is synchronized with sync().
+
+        Arguments:
+            id {str} -- Unique identifier of the flow instance context.
+            context {dict} -- The local dictionary that should be synchronized with \
+                the remote context.
+            changes {Set[Tuple[str, ...]]} -- The paths (see ContextPaths) of the values that \
+                have been set in the local context since the previous sync.
+        """
+        self.sync(id, context)
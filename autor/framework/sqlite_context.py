@@ -0,0 +1,193 @@
+#  Copyright 2022-Present Autor contributors
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import sqlite3
+from typing import Set, Tuple
+
+from autor.framework.context_paths import ContextPaths
+from autor.framework.extension_exception import AutorExtensionException
+from autor.framework.remote_context import RemoteContext
+
+
+class SQLiteContext(RemoteContext):
+    """
+    A remote context that stores every context value as its own row in an SQLite database.
+
+    A sync upserts only the changed values in one transaction and reads back only the values
+    that other writers have changed since the previous sync. The database uses WAL mode, so
+    several Autor processes on the same host can sync the same flow context concurrently
+    without losing each other's writes.
+    """
+
+    # C O N S T A N T S
+    # ------------------
+    # The default name of the database file.
+    _DATABASE = "sqlite_context.db"
+
+    # The value used in the activity_block and activity columns for values that are
+    # not stored on that level.
+    _NONE = ""
+    # Latest writer index entries (see ContextPaths) are stored with this activity column.
+    _LATEST = ContextPaths.LATEST
+
+    _SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS context_values (
+            flow_run_id     TEXT NOT NULL,
+            activity_block  TEXT NOT NULL,
+            activity        TEXT NOT NULL,
+            key             TEXT NOT NULL,
+            value           NOT NULL,
+            revision        INTEGER NOT NULL,
+            PRIMARY KEY (flow_run_id, activity_block, activity, key)
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS context_values_revision
+            ON context_values (flow_run_id, revision)
+        """,
+    )
+
+    def __init__(self, database: str = _DATABASE, timeout: float = 30.0):
+        """
+        Arguments:
+            database {str} -- The path to the database file.
+            timeout {float} -- Seconds to wait for a concurrent writer to finish its transaction.
+        """
+        self._database = database
+        self._timeout = timeout
+        self._connection = None
+        self._revisions = {}  # {id: the latest revision that has been read}
+
+    # pylint: disable-next=redefined-builtin
+    def sync(self, id: str, context: dict) -> None:
+        self._sync(id, context, {path for path, _ in ContextPaths.leaves(context)})
+
+    # pylint: disable-next=redefined-builtin
+    def sync_changes(self, id: str, context: dict, changes: Set[Tuple[str, ...]]) -> None:
+        # The changes can be used only if this instance has synced the context before.
+        if id in self._revisions:
+            self._sync(id, context, changes)
+        else:
+            self.sync(id, context)
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    # pylint: disable-next=redefined-builtin
+    def _sync(self, id: str, context: dict, changes: Set[Tuple[str, ...]]) -> None:
+        try:
+            connection = self._connect()
+            # IMMEDIATE: take the write lock at once, so that the read revisions and the
+            # written revision are consistent with the other writers.
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                revision = self._revisions.get(id, 0)
+                rows = connection.execute(
+                    (
+                        "SELECT activity_block, activity, key, value, revision"
+                        + " FROM context_values WHERE flow_run_id = ? AND revision > ?"
+                    ),
+                    (id, revision),
+                ).fetchall()
+
+                latest = max([revision] + [row[4] for row in rows])
+                if changes:
+                    latest = latest + 1
+                    connection.executemany(
+                        (
+                            "INSERT INTO context_values"
+                            + " (flow_run_id, activity_block, activity, key, value, revision)"
+                            + " VALUES (?, ?, ?, ?, ?, ?)"
+                            + " ON CONFLICT (flow_run_id, activity_block, activity, key)"
+                            + " DO UPDATE SET value = excluded.value, revision = excluded.revision"
+                        ),
+                        [
+                            (id,)
+                            + self._to_columns(path)
+                            + (self._encode(ContextPaths.get(context, path)), latest)
+                            for path in changes
+                        ],
+                    )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        except Exception as exception:
+            raise AutorExtensionException(
+                f"Failed to sync SQLite context: {self._database}. Exception: {exception.args}"
+            ) from exception
+
+        self._revisions[id] = latest
+
+        values = {
+            self._to_path(activity_block, activity, key): self._decode(value)
+            for activity_block, activity, key, value, _ in rows
+        }
+        if revision == 0:
+            # All values of the flow run: they may have been synced by an older version.
+            values = ContextPaths.dematerialize_values(values)
+
+        # Local changes win over the remote ones.
+        for path, value in values.items():
+            if path not in changes:
+                ContextPaths.set(context, path, value)
+
+    def _encode(self, value):
+        # Text codecs are stored as TEXT, so that the database stays human readable.
+        encoded = self.codec.encode(value)
+        return encoded if self.codec.binary else encoded.decode("utf8")
+
+    def _decode(self, value):
+        return self.codec.decode(value.encode("utf8") if isinstance(value, str) else value)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            # isolation_level=None: transactions are handled explicitly in _sync().
+            # check_same_thread=False: the context may be synced from a background thread.
+            connection = sqlite3.connect(
+                self._database,
+                timeout=self._timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            for statement in self._SCHEMA:
+                connection.execute(statement)
+            self._connection = connection
+        return self._connection
+
+    def _to_columns(self, path: Tuple[str, ...]) -> Tuple[str, str, str]:
+        if len(path) == 1:  # Flow
+            return self._NONE, self._NONE, path[0]
+        if len(path) == 2:  # Flow latest writer index
+            return self._NONE, self._LATEST, path[1]
+        if len(path) == 3:  # Activity block
+            return path[1], self._NONE, path[2]
+        if len(path) == 4:  # Activity block latest writer index
+            return path[1], self._LATEST, path[3]
+        return path[1], path[3], path[4]  # Activity
+
+    def _to_path(self, activity_block: str, activity: str, key: str) -> Tuple[str, ...]:
+        if activity == self._LATEST:
+            if activity_block == self._NONE:
+                return ContextPaths.flow_latest(key)
+            return ContextPaths.activity_block_latest(activity_block, key)
+        if activity_block == self._NONE:
+            return ContextPaths.flow(key)
+        if activity == self._NONE:
+            return ContextPaths.activity_block(activity_block, key)
+        return ContextPaths.activity(activity_block, activity, key)
@@ -11,11 +11,16 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import functools
 import logging
+import threading
+from types import MappingProxyType
 
+from autor.framework.async_listener import AsyncListener
 from autor.framework.autor_framework_exception import AutorFrameworkException
 from autor.framework.constants import ExceptionType
 from autor.framework.debug_config import DebugConfig
+from autor.framework.keys import FlowContextKeys as ctx
 from autor.framework.keys import StateKeys as ste
 from autor.framework.state import (
     AfterActivityBlock,
@@ -33,6 +38,8 @@ from autor.framework.state import (
 )
 from autor.framework.state_listener import StateListener
 from autor.framework.state_producer import StateProducer
+from autor.framework.state_timings import StateTimings
+from autor.framework.state_view import StateView
 from autor.framework.util import Util
 
 # ------------------------------------------------------------------------------#
@@ -45,308 +52,333 @@ from autor.framework.util import Util
 
 # ________________________ S T A T E   H A N D L E R ______________________________#
 
+# State name -> (the StateListener hook that receives the state, the class of the state).
+_HOOKS = {
+    State.FRAMEWORK_START: ("on_framework_start", FrameworkStart),
+    State.BEFORE_ACTIVITY_BLOCK: ("on_before_activity_block", BeforeActivityBlock),
+    State.SELECT_ACTIVITY: ("on_select_activity", SelectActivity),
+    State.BEFORE_ACTIVITY_PREPROCESS: ("on_before_activity_preprocess", BeforeActivityPreprocess),
+    State.BEFORE_ACTIVITY_RUN: ("on_before_activity_run", BeforeActivityRun),
+    State.AFTER_ACTIVITY_RUN: ("on_after_activity_run", AfterActivityRun),
+    State.AFTER_ACTIVITY_POSTPROCESS: (
+        "on_after_activity_postprocess",
+        AfterActivityPostprocess,
+    ),
+    State.BEFORE_ACTIVITY_BLOCK_CALLBACKS: (
+        "on_before_activity_block_callbacks",
+        BeforeActivityBlockCallbacks,
+    ),
+    State.AFTER_ACTIVITY_BLOCK: ("on_after_activity_block", AfterActivityBlock),
+    State.FRAMEWORK_END: ("on_framework_end", FrameworkEnd),
+    State.ERROR: ("on_error", Error),
+}
+
 
 class StateHandler(StateProducer):
+    """
+    The event bus of one activity block run. ActivityBlock creates its own StateHandler, so that
+    several activity blocks can run on threads of the same process without receiving each
+    other's events. The listener and producer registration is thread-safe.
+    """
 
-    _current_state_name: State = State.UNKNOWN
+    def __init__(self):
+        self._current_state_name: str = State.UNKNOWN
 
-    _listeners = []  # A list of objects who are interested in state change events.
-    _producers = []  # A list of objects who are contirbuting to state data.
+        self._listeners = []  # A list of objects who are interested in state change events.
+        self._callbacks = StateHandler._build_callbacks([])  # The listener hooks per state.
+        self._async_callbacks = StateHandler._build_callbacks([])  # Asynchronous listeners.
+        self._async_listeners = {}  # id(listener) -> AsyncListener
+        self._producer_hooks = []  # (on_before_state, on_after_state) of the producers.
 
-    _framework_ended = False
+        # The wall time and calls of the hooks. None: not measured (see enable_timings()).
+        self._timings: StateTimings = None
+        self._producers = []  # A list of objects who are contirbuting to state data.
 
-    # _______________ ADMINISTRATION of STATE PRODUCER AND LISTNER LISTS _______________#
-    @staticmethod
-    def framework_ended():
-        return StateHandler._framework_ended
+        self._framework_ended = False
+        # The lists given to the listeners in the current state, see state_fields().
+        self._offered = {}
 
-    @staticmethod
-    def get_current_state_name():
-        return StateHandler._current_state_name
+        self._lock = threading.RLock()  # Guards the listener and producer lists.
 
-    @staticmethod
-    def add_state_producer(producer: StateProducer):
-        StateHandler._producers.append(producer)
+        # The state data, a live view over the producers. Reused by all the states.
+        self._view = StateView()
+        # The State objects by state name. Created once: they read the state data from the view.
+        self._states = {}
 
-    @staticmethod
-    def remove_state_producer(producer: StateProducer):
-        if producer in StateHandler._producers:
-            StateHandler._producers.remove(producer)
-        else:
-            logging.debug(
-                (
-                    "WARNING: Could not remove producer: "
-                    + "%s from producers list. Producer not in the list."
-                ),
-                producer,
-            )
+        # The StateHandler provides the listener and producer lists to the state data.
+        self.add_state_producer(self)
 
-    @staticmethod
-    def add_state_listener(listener: StateListener):
-        StateHandler._listeners.append(listener)
+    # _______________ ADMINISTRATION of STATE PRODUCER AND LISTNER LISTS _______________#
+    def framework_ended(self):
+        return self._framework_ended
+
+    def get_current_state_name(self):
+        return self._current_state_name
+
+    def enable_timings(self, spans: bool = False) -> None:
+        """Measure the wall time and the calls of the listener hooks and the producer callbacks.
+        The results are returned by timings() and saved in the context at FRAMEWORK_END.
+
+        Arguments:
+            spans {bool} -- Record every call as well, see timing_spans().
+        """
+        with self._lock:
+            if self._timings is None:
+                self._timings = StateTimings()
+                self._set_listeners(self._listeners)
+                self._set_producers(self._producers)
+            if spans:
+                self._timings.record_spans()
+
+    def timings(self) -> dict:
+        """Return the measurements, see StateTimings.stats(). Empty if not enabled."""
+        return self._timings.stats() if self._timings is not None else {}
+
+    def timing_spans(self) -> list:
+        """Return the recorded calls, see StateTimings.spans(). Empty if not enabled."""
+        return self._timings.spans() if self._timings is not None else []
+
+    def add_state_producer(self, producer: StateProducer):
+        with self._lock:
+            self._set_producers(self._producers + [producer])
+            for key, (getter, setter) in producer.state_fields().items():
+                self._view.add_field(key, getter, setter)
+
+    def remove_state_producer(self, producer: StateProducer):
+        with self._lock:
+            if producer in self._producers:
+                self._set_producers([p for p in self._producers if p is not producer])
+                self._view.remove_fields(producer.state_fields())
+                return
+
+        logging.debug(
+            (
+                "WARNING: Could not remove producer: "
+                + "%s from producers list. Producer not in the list."
+            ),
+            producer,
+        )
+
+    def add_state_listener(self, listener: StateListener):
+        with self._lock:
+            self._set_listeners(self._listeners + [listener])
+
+    def remove_state_listener(self, listener: StateListener):
+        with self._lock:
+            if listener in self._listeners:
+                self._set_listeners([l for l in self._listeners if l is not listener])
+                return
+
+        logging.debug(
+            (
+                "WARNING: Could not remove listener: %s from listeners list. "
+                + "Listener not in the list."
+            ),
+            listener,
+        )
+
+    def remove_all_listeners(self):
+        with self._lock:
+            self._set_listeners([])
+
+    def _set_listeners(self, listeners: list):
+        # Start a worker for each new asynchronous listener, stop the workers of the removed ones.
+        workers = {}
+        for listener in listeners:
+            if getattr(listener, "asynchronous", False):
+                worker = self._async_listeners.get(id(listener))
+                workers[id(listener)] = worker if worker is not None else AsyncListener(listener)
+        for key, worker in self._async_listeners.items():
+            if key not in workers:
+                worker.stop()
+
+        # Build the dispatch table once per registration, so that a state change only calls
+        # the hooks that the listeners have implemented.
+        self._listeners = listeners
+        self._async_listeners = workers
+        self._callbacks = StateHandler._build_callbacks(
+            [l for l in listeners if id(l) not in workers], timings=self._timings
+        )
+        self._async_callbacks = StateHandler._build_callbacks(
+            [l for l in listeners if id(l) in workers], workers, self._timings
+        )
+
+    def _set_producers(self, producers: list):
+        self._producers = producers
+        hooks = []
+        for producer in producers:
+            before, after = producer.on_before_state, producer.on_after_state
+            if self._timings is not None:
+                name = StateTimings.name_of(producer)
+                before = self._timings.wrap(name, "on_before_state", before)
+                after = self._timings.wrap(name, "on_after_state", after)
+            hooks.append((before, after))
+        self._producer_hooks = hooks
 
     @staticmethod
-    def remove_state_listener(listener: StateListener):
-        if listener in StateHandler._listeners:
-            StateHandler._listeners.remove(listener)
-        else:
-            logging.debug(
-                (
-                    "WARNING: Could not remove listener: %s from listeners list. "
-                    + "Listener not in the list."
-                ),
-                listener,
-            )
+    def _build_callbacks(
+        listeners: list, workers: dict = None, timings: StateTimings = None
+    ) -> dict:
+        """Return {state name: [(listener class name, hook)]} with the hooks that the listeners
+        override. The on_state() hooks are under the key None. The hooks of asynchronous
+        listeners submit the state to the worker of the listener (see AsyncListener).
+        The class name is taken here: the hook may be wrapped (see StateTimings.wrap())."""
+        callbacks = {state_name: [] for state_name in _HOOKS}
+        callbacks[None] = []
+        hooks = [(state_name, hook) for state_name, (hook, _) in _HOOKS.items()]
+        hooks.append((None, "on_state"))
 
-    @staticmethod
-    def remove_all_listeners():
-        StateHandler._listeners = []
+        for listener in listeners:
+            for state_name, hook in hooks:
+                method = getattr(listener, hook, None)
+                if method is None:
+                    continue
+                # The empty default implementation of StateListener.
+                if getattr(method, "__func__", None) is getattr(StateListener, hook):
+                    continue
+                if timings is not None:
+                    method = timings.wrap(StateTimings.name_of(listener), hook, method, state_name)
+                if workers is not None:
+                    method = functools.partial(workers[id(listener)].submit, method)
+                callbacks[state_name].append((listener.__class__.__name__, method))
+
+        return callbacks
+
+    def _drain_async_listeners(self, state_data) -> None:
+        # Wait for the asynchronous listeners and register the exceptions of their hooks.
+        for worker in list(self._async_listeners.values()):
+            for state_name, e in worker.drain():
+                Util.register_exception(
+                    ex=e,
+                    store=self._store(state_data),
+                    state=state_name,
+                    description=(
+                        "Extension exception in: " + worker.listener.__class__.__name__
+                    ),
+                    type=ExceptionType.EXTENSION,
+                    framework_error=False,
+                )
 
-    @staticmethod
-    def change_state(state_name: str) -> dict:
+    def change_state(self, state_name: str) -> dict:
 
-        StateHandler._current_state_name = state_name
+        self._current_state_name = state_name
         if state_name == State.FRAMEWORK_END:
-            StateHandler._framework_ended = True
+            self._framework_ended = True
 
         if DebugConfig.print_state_names:
             Util.print_framed(text=state_name, frame_symbol=":")
 
-        # Dictionary that represents the state date.
-        state_data = {}
+        # The lists are replaced, never modified, on registration -> the references can be
+        # iterated without holding the lock, even if a listener registers another listener.
+        producer_hooks = self._producer_hooks
+        callbacks = self._callbacks
+        async_callbacks = self._async_callbacks
+
+        # The state data. Values that the producers or listeners set without a field in the
+        # view belong to the previous state.
+        state_data = self._view
+        state_data.clear()
 
         # ---------- ON-BEFORE-STATE -----------#
-        for producer in StateHandler._producers:
-            producer.on_before_state(state_name, state_data)
+        for on_before_state, _ in producer_hooks:
+            on_before_state(state_name, state_data)
 
         # ------------ ON-STATE ---------------#
         # Create the state-specific state-object.
-        StateHandler._run_callbacks(state_name, state_data, StateHandler._listeners)
+        self._run_callbacks(state_name, state_data, callbacks)
+        self._submit_async_callbacks(state_name, state_data, async_callbacks)
+
+        if state_name == State.FRAMEWORK_END:
+            self._drain_async_listeners(state_data)
+            if self._timings is not None:
+                self._save_timings(state_data)
 
         # ---------- ON-AFTER-STATE -----------#
-        for producer in StateHandler._producers:
-            producer.on_after_state(state_name, state_data)
+        for _, on_after_state in producer_hooks:
+            on_after_state(state_name, state_data)
 
         return state_data
 
-    @staticmethod
-    # pylint: disable=too-many-branches, too-many-statements
-    def _run_callbacks(state_name, state_data, listeners):
-
-        state = None
-
-        if state_name == State.FRAMEWORK_START:
-            state = FrameworkStart(state_data)
-            for listener in listeners:
-                try:
-                    listener.on_framework_start(state)
-                except Exception as e:
-                    Util.register_exception(
-                        ex=e,
-                        description="Extension exception in: {listener.__class__.__name__}",
-                        type=ExceptionType.EXTENSION,
-                        framework_error=False,
-                    )
-
-        elif state_name == State.BEFORE_ACTIVITY_BLOCK:
-            state = BeforeActivityBlock(state_data)
-            for listener in listeners:
-                try:
-                    listener.on_before_activity_block(state)
-                except Exception as e:
-                    Util.register_exception(
-                        ex=e,
-                        description="Extension exception in: {listener.__class__.__name__}",
-                        type=ExceptionType.EXTENSION,
-                        framework_error=False,
-                    )
-
-        elif state_name == State.SELECT_ACTIVITY:
-            state = SelectActivity(state_data)
-            for listener in listeners:
-                try:
-                    listener.on_select_activity(state)
-                except Exception as e:
-                    Util.register_exception(
-                        ex=e,
-                        description="Extension exception in: {listener.__class__.__name__}",
-                        type=ExceptionType.EXTENSION,
-                        framework_error=False,
-                    )
-
-        elif state_name == State.BEFORE_ACTIVITY_PREPROCESS:
-            state = BeforeActivityPreprocess(state_data)
-            for listener in listeners:
-                try:
-                    listener.on_before_activity_preprocess(state)
-                except Exception as e:
-                    Util.register_exception(
-                        ex=e,
-                        description="Extension exception in: {listener.__class__.__name__}",
-                        type=ExceptionType.EXTENSION,
-                        framework_error=False,
-                    )
-
-        elif state_name == State.BEFORE_ACTIVITY_RUN:
-            state = BeforeActivityRun(state_data)
-            for listener in listeners:
-                try:
-                    listener.on_before_activity_run(state)
-                except Exception as e:
-                    Util.register_exception(
-                        ex=e,
-                        description="Extension exception in: {listener.__class__.__name__}",
-                        type=ExceptionType.EXTENSION,
-                        framework_error=False,
-                    )
-
-        elif state_name == State.AFTER_ACTIVITY_RUN:
-            state = AfterActivityRun(state_data)
-            for listener in listeners:
-                try:
-                    listener.on_after_activity_run(state)
-                except Exception as e:
-                    Util.register_exception(
-                        ex=e,
-                        description="Extension exception in: {listener.__class__.__name__}",
-                        type=ExceptionType.EXTENSION,
-                        framework_error=False,
-                    )
-
-        elif state_name == State.AFTER_ACTIVITY_POSTPROCESS:
-            state = AfterActivityPostprocess(state_data)
-            for listener in listeners:
-                try:
-                    listener.on_after_activity_postprocess(state)
-                except Exception as e:
-                    Util.register_exception(
-                        ex=e,
-                        description="Extension exception in: {listener.__class__.__name__}",
-                        type=ExceptionType.EXTENSION,
-                        framework_error=False,
-                    )
-
-        elif state_name == State.BEFORE_ACTIVITY_BLOCK_CALLBACKS:
-            state = BeforeActivityBlockCallbacks(state_data)
-            for listener in listeners:
-                try:
-                    listener.on_before_activity_block_callbacks(state)
-                except Exception as e:
-                    Util.register_exception(
-                        ex=e,
-                        description="Extension exception in: {listener.__class__.__name__}",
-                        type=ExceptionType.EXTENSION,
-                        framework_error=False,
-                    )
-
-        elif state_name == State.AFTER_ACTIVITY_BLOCK:
-            state = AfterActivityBlock(state_data)
-            for listener in listeners:
-                try:
-                    listener.on_after_activity_block(state)
-                except Exception as e:
-                    Util.register_exception(
-                        ex=e,
-                        description="Extension exception in: {listener.__class__.__name__}",
-                        type=ExceptionType.EXTENSION,
-                        framework_error=False,
-                    )
-
-        elif state_name == State.FRAMEWORK_END:
-            state = FrameworkEnd(state_data)
-            for listener in listeners:
-                try:
-                    listener.on_framework_end(state)
-                except Exception as e:
-                    Util.register_exception(
-                        ex=e,
-                        description="Extension exception in: {listener.__class__.__name__}",
-                        type=ExceptionType.EXTENSION,
-                        framework_error=False,
-                    )
-
-        elif state_name == State.ERROR:
-            state = Error(state_data)
-            for listener in listeners:
-                try:
-                    listener.on_error(state)
-                except Exception as e:
-                    Util.register_exception(
-                        ex=e,
-                        description="Extension exception in: {listener.__class__.__name__}",
-                        type=ExceptionType.EXTENSION,
-                        framework_error=False,
-                    )
-
-        else:
+    def _run_callbacks(self, state_name, state_data, callbacks):
+        if state_name not in _HOOKS:
             raise AutorFrameworkException("Unknown state_name: " + str(state_name))
 
-        for listener in listeners:
+        hooks = callbacks[state_name] + callbacks[None]
+        if not hooks:
+            return
+
+        state = self._states.get(state_name)
+        if state is None:
+            state = StateHandler._create_state(state_name, state_data)
+            self._states[state_name] = state
+
+        for owner, hook in hooks:
             try:
-                listener.on_state(state)
+                hook(state)
             except Exception as e:
                 Util.register_exception(
                     ex=e,
-                    description="Extension exception in: {listener.__class__.__name__}",
+                    store=self._store(state_data),
+                    state=state_name,
+                    description="Extension exception in: " + owner,
                     type=ExceptionType.EXTENSION,
                     framework_error=False,
                 )
 
-    @staticmethod
-    def _create_state(state_name: str, state_data: dict) -> State:
-
-        state = None
-
-        if state_name == State.FRAMEWORK_START:
-            state = FrameworkStart(state_data)
-
-        if state_name == State.BEFORE_ACTIVITY_BLOCK:
-            state = BeforeActivityBlock(state_data)
-
-        if state_name == State.SELECT_ACTIVITY:
-            state = SelectActivity(state_data)
+    def _submit_async_callbacks(self, state_name, state_data, async_callbacks):
+        hooks = async_callbacks[state_name] + async_callbacks[None]
+        if not hooks:
+            return
 
-        if state_name == State.BEFORE_ACTIVITY_PREPROCESS:
-            state = BeforeActivityPreprocess(state_data)
+        # The asynchronous listeners get an immutable snapshot: the state data changes while
+        # they are processing the events.
+        state = StateHandler._create_state(state_name, StateHandler._freeze(state_data))
+        for _, hook in hooks:
+            hook(state)
 
-        if state_name == State.BEFORE_ACTIVITY_RUN:
-            state = BeforeActivityRun(state_data)
-
-        if state_name == State.AFTER_ACTIVITY_RUN:
-            state = AfterActivityRun(state_data)
-
-        if state_name == State.AFTER_ACTIVITY_POSTPROCESS:
-            state = AfterActivityPostprocess(state_data)
-
-        if state_name == State.BEFORE_ACTIVITY_BLOCK_CALLBACKS:
-            state = BeforeActivityBlockCallbacks(state_data)
-
-        if state_name == State.AFTER_ACTIVITY_BLOCK:
-            state = AfterActivityBlock(state_data)
+    def _save_timings(self, state_data) -> None:
+        # pylint: disable=no-member
+        # Save the timings on the activity block level of the flow context.
+        context = state_data.get(ste.ACTIVITY_BLOCK_CONTEXT, state_data.get(ste.FLOW_CONTEXT))
+        if context is not None:
+            context.set(ctx.STATE_TIMINGS, self.timings())
 
-        if state_name == State.FRAMEWORK_END:
-            state = FrameworkEnd(state_data)
+    @staticmethod
+    def _store(state_data: dict):
+        # The flow run data is provided by the state producers in the flow context.
+        flow_context = state_data.get(ste.FLOW_CONTEXT)
+        return flow_context.store if flow_context is not None else None
 
-        if state_name == State.ERROR:
-            state = Error(state_data)
+    @staticmethod
+    def _freeze(value):
+        # A read-only copy of the dicts, lists and sets in 'value', at any depth. Other objects
+        # (e.g. contexts and activities) are not copied: they are the live framework objects.
+        if isinstance(value, (dict, MappingProxyType, StateView)):
+            return MappingProxyType({k: StateHandler._freeze(v) for k, v in value.items()})
+        if isinstance(value, (list, tuple)):
+            return tuple(StateHandler._freeze(v) for v in value)
+        if isinstance(value, (set, frozenset)):
+            return frozenset(value)
+        return value
 
-        if state is None:
+    @staticmethod
+    def _create_state(state_name: str, state_data: dict) -> State:
+        if state_name not in _HOOKS:
             raise AutorFrameworkException(f"Cannot create state: Unknown state_name: {state_name}")
 
-        return state
+        _, state_class = _HOOKS[state_name]
+        return state_class(state_data)
 
     # ____________________ PRINT METHODS ________________________#
 
-    @staticmethod
-    def _print_producers():
+    def _print_producers(self):
         logging.debug("PRODUCERS:")
-        for producer in StateHandler._producers:
+        for producer in self._producers:
             logging.debug("   - " + str(producer))
 
-    @staticmethod
-    def _print_listeners():
+    def _print_listeners(self):
         logging.debug("LISTENERS:")
-        for listener in StateHandler._listeners:
+        for listener in self._listeners:
             logging.debug("   - " + str(listener))
 
     @staticmethod
@@ -367,15 +399,43 @@ class StateHandler(StateProducer):
     # Let the StateHandler add the lists with state producers and listeners
     # to the state infomration.
 
-    def on_before_state(self, state_name, state_data: dict) -> None:
+    def state_fields(self) -> dict:
         # pylint: disable=no-member
-        state_data[ste.STATE_LISTENERS] = StateHandler._listeners
-        state_data[ste.STATE_PRODUCERS] = StateHandler._producers
+        return {
+            ste.STATE_LISTENERS: (
+                lambda: self._offer(ste.STATE_LISTENERS, self._listeners),
+                lambda value: self._replace(ste.STATE_LISTENERS, value),
+            ),
+            ste.STATE_PRODUCERS: (
+                lambda: self._offer(ste.STATE_PRODUCERS, self._producers),
+                lambda value: self._replace(ste.STATE_PRODUCERS, value),
+            ),
+            ste.STATE_HANDLER: (lambda: self, None),
+        }
+
+    def _offer(self, key, current: list) -> list:
+        # The listeners get a copy (made once per state): the lists that are being iterated
+        # are never modified.
+        if key not in self._offered:
+            with self._lock:
+                self._offered[key] = (list(current), list(current))
+        return self._offered[key][0]
+
+    def _replace(self, key, value: list) -> None:
+        self._offered[key] = (value, None)
+
+    def on_before_state(self, state_name, state_data: dict) -> None:
+        self._offered.clear()
 
     def on_after_state(self, state_name, state_data: dict) -> None:
         # pylint: disable=no-member
-        StateHandler._listeners = state_data[ste.STATE_LISTENERS]
-        StateHandler._producers = state_data[ste.STATE_PRODUCERS]
-
-
-StateHandler.add_state_producer(StateHandler())
+        # Take the lists from the state data only if a listener has changed them. Otherwise a
+        # registration done by another thread during the state would be lost.
+        with self._lock:
+            for key, (offered, original) in self._offered.items():
+                if offered == original:
+                    continue
+                if key == ste.STATE_LISTENERS:
+                    self._set_listeners(list(offered))
+                else:
+                    self._set_producers(list(offered))
@@ -13,6 +13,7 @@
 #    under the License.
 import abc
 
+from autor.framework.constants import QueueFullPolicy
 from autor.framework.state import (
     AfterActivityBlock,
     AfterActivityPostprocess,
@@ -43,6 +44,16 @@ from autor.framework.state import (
 class StateListener:
     __metaclass__ = abc.ABCMeta
 
+    # An asynchronous listener only observes: it receives read-only snapshots of the states in
+    # a worker thread, so it never delays the activities. The dicts, lists and sets of the state
+    # data are copied at any depth; other objects, such as contexts and activities, are live.
+    # The events wait in a queue of 'queue_size' events; 'queue_full' decides what happens when
+    # the queue is full.
+    # All the events have been processed when FRAMEWORK_END has been handled.
+    asynchronous = False
+    queue_size = 100
+    queue_full = QueueFullPolicy.BLOCK
+
     @abc.abstractmethod
     def on_state(self, state: State):
         pass
@@ -24,3 +24,8 @@ class StateProducer:
     @abc.abstractmethod
     def on_after_state(self, state_name, state_data: dict) -> None:
         pass
+
+    def state_fields(self) -> dict:
+        """Return {state key: (getter, setter)} for the state data that lives in the producer.
+        Called once, when the producer is registered. See StateView."""
+        return {}
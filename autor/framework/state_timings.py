@@ -0,0 +1,91 @@
+#  Copyright 2022-Present Autor contributors
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import threading
+import time
+from typing import Callable, List
+
+
+class StateTimings:
+    """
+    The wall time and the number of calls of the state listener hooks (one hook per state, plus
+    on_state) and of the state producer callbacks, per listener/producer class, hook and state.
+    The hooks that are called in every state (on_state, on_before_state and on_after_state) are
+    measured for each state separately, so that the slow states can be found.
+
+    StateHandler wraps the hooks with wrap() when the timings are enabled. When they are not,
+    the hooks are called directly and nothing is measured.
+
+    If record_spans() has been called, every call is also recorded as a span (see spans()).
+    """
+
+    def __init__(self):
+        # (class name, hook name, state name) -> [calls, seconds]
+        self._entries = {}
+        self._lock = threading.Lock()  # The hooks are called in the threads of the activities.
+        # (class name, hook name, start, seconds, thread id) of the calls. None: not recorded.
+        self._spans = None
+
+    def record_spans(self) -> None:
+        """Record every call from now on. The start times are time.monotonic() values."""
+        if self._spans is None:
+            self._spans = []
+
+    def spans(self) -> List[tuple]:
+        """Return the recorded calls: [(class name, hook name, start, seconds, thread id)]."""
+        return list(self._spans) if self._spans is not None else []
+
+    @staticmethod
+    def name_of(instance) -> str:
+        """The name of a listener or producer: the name used in the 'extensions' list of the
+        Flow Configuration."""
+        cls = instance.__class__
+        return f"{cls.__module__}.{cls.__qualname__}"
+
+    def wrap(self, name: str, hook_name: str, hook: Callable, state_name: str = None) -> Callable:
+        """Return 'hook' wrapped so that its calls are measured under (name, hook_name, state).
+        The state is 'state_name', or if None, the state of the call: the first argument of the
+        hook is the State (listeners) or the state name (producers)."""
+        entries = self._entries
+        lock = self._lock
+
+        def timed(*args, **kwargs):
+            spans = self._spans
+            span_start = time.monotonic() if spans is not None else None
+            start = time.perf_counter()
+            try:
+                return hook(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                state = state_name or (args[0] if isinstance(args[0], str) else args[0].name)
+                with lock:
+                    entry = entries.setdefault((name, hook_name, state), [0, 0.0])
+                    entry[1] = entry[1] + seconds
+                    entry[0] = entry[0] + 1
+                if spans is not None:
+                    spans.append((name, hook_name, span_start, seconds, threading.get_ident()))
+
+        return timed
+
+    def stats(self) -> dict:
+        """Return {name: {hook name: {state name: {"calls": int, "seconds": float}}}} of the
+        called hooks."""
+        stats = {}
+        with self._lock:
+            entries = list(self._entries.items())
+        for (name, hook_name, state), (calls, seconds) in entries:
+            stats.setdefault(name, {}).setdefault(hook_name, {})[state] = {
+                "calls": calls,
+                "seconds": seconds,
+            }
+        return stats
@@ -0,0 +1,104 @@
+#  Copyright 2022-Present Autor contributors
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+from collections.abc import MutableMapping
+from typing import Any, Callable
+
+from autor.framework.autor_framework_exception import AutorFrameworkException
+
+# Returned by a field getter when the value does not exist in the current state
+# (e.g. the activity keys before the first activity has been selected).
+ABSENT = object()
+
+
+class StateView(MutableMapping):
+    """
+    The state data as a live view over the state producers.
+
+    A producer adds a field (a getter and an optional setter) per state key when it is
+    registered. Reading a key calls the getter and writing a key calls the setter, so the
+    state data does not need to be rebuilt and copied back on every state change. Keys without
+    a field, and keys whose getter returns ABSENT, are kept in the view itself until the next
+    state change (see clear()).
+
+    The values can be read as items or as attributes: view[ste.FLOW_CONTEXT] or
+    view.flowContext.
+    """
+
+    def __init__(self):
+        # Set with object.__setattr__(): see __setattr__().
+        object.__setattr__(self, "_fields", {})  # key -> (getter, setter)
+        object.__setattr__(self, "_values", {})  # Values of the keys without a field.
+
+    def add_field(self, key: str, getter: Callable[[], Any], setter: Callable = None) -> None:
+        """Add a state key whose value lives in a state producer.
+
+        Arguments:
+            key {str} -- The state key (see keys.StateKeys).
+            getter {Callable} -- Returns the current value, or ABSENT.
+            setter {Callable} -- Sets the value. None for keys that the listeners may not change.
+        """
+        self._fields[key] = (getter, setter)
+
+    def remove_fields(self, keys) -> None:
+        for key in keys:
+            self._fields.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove the values of the keys without a field. The fields are not affected."""
+        self._values.clear()
+
+    def __getitem__(self, key):
+        field = self._fields.get(key)
+        if field is not None:
+            value = field[0]()
+            if value is not ABSENT:
+                return value
+        return self._values[key]
+
+    def __setitem__(self, key, value):
+        field = self._fields.get(key)
+        if field is not None and field[0]() is not ABSENT:
+            if field[1] is None:
+                raise AutorFrameworkException(f"The state key is read-only: {key}")
+            field[1](value)
+        else:
+            self._values[key] = value
+
+    def __delitem__(self, key):
+        del self._values[key]
+
+    def __iter__(self):
+        for key, field in list(self._fields.items()):
+            if field[0]() is not ABSENT:
+                yield key
+        for key in list(self._values):
+            if key not in self._fields or self._fields[key][0]() is ABSENT:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+    def __repr__(self):
+        return repr(dict(self))
@@ -22,6 +22,7 @@ import os
 import pprint
 import sys
 import traceback
+import warnings
 
 from autor.framework.constants import ExceptionType
 from autor.framework.debug_config import DebugConfig
@@ -108,80 +109,120 @@ class Util:
             string = "None"
         return string
 
-    _first_exception = None
-    _abort_exception = None
+    @staticmethod
+    def _deprecated(name: str, replacement: str) -> None:
+        warnings.warn(
+            f"Util.{name}() is deprecated, use {replacement} of the FlowContextStore of the "
+            + "flow run",
+            DeprecationWarning,
+            stacklevel=3,
+        )
 
     @staticmethod
-    def get_first_exception_message():
-        if Util._first_exception is not None:
-            return str(Util._first_exception)
+    def _current_store():
+        # pylint: disable=import-outside-toplevel
+        from autor.framework.flow_context_store import FlowContextStore
 
-        return None
+        return FlowContextStore.current()
+
+    @staticmethod
+    def get_first_exception_message():
+        Util._deprecated("get_first_exception_message", "first_exception")
+        exception = Util._first_exception()
+        return str(exception) if exception is not None else None
 
     @staticmethod
     def get_first_exception():
-        return Util._first_exception
+        Util._deprecated("get_first_exception", "first_exception")
+        return Util._first_exception()
 
     @staticmethod
     def get_abort_exception_message():
-        if Util._abort_exception is not None:
-            return str(Util._abort_exception)
-
-        return None
+        Util._deprecated("get_abort_exception_message", "abort_exception")
+        exception = Util._abort_exception()
+        return str(exception) if exception is not None else None
 
     @staticmethod
     def get_abort_exception():
-        return Util._abort_exception
-
-    _framework_exceptions = []
-    _other_exceptions = []
+        Util._deprecated("get_abort_exception", "abort_exception")
+        return Util._abort_exception()
 
     @staticmethod
     def debug_reset():
-        Util._framework_exceptions = []
-        Util._other_exceptions = []
-        Util._first_exception = None
-        Util._abort_exception = None
+        Util._deprecated("debug_reset", "a new FlowContextStore")
+        store = Util._current_store()
+        if store is not None:
+            with store.lock:
+                store.framework_exceptions = []
+                store.other_exceptions = []
+                store.first_exception = None
+                store.abort_exception = None
 
     @staticmethod
     def print_all_exceptions():
-        if len(Util._framework_exceptions) == 0 and len(Util._other_exceptions) == 0:
-            logging.debug(" No registered exceptions")
-            return
+        Util._deprecated("print_all_exceptions", "print_all_exceptions()")
+        store = Util._current_store()
+        if store is not None:
+            store.print_all_exceptions()
 
-        if len(Util._framework_exceptions) > 0:
-            logging.debug(" Framework exceptions:")
-            for ex in Util._framework_exceptions:
-                logging.debug(f" * {str(ex)}")
+    @staticmethod
+    def _first_exception():
+        store = Util._current_store()
+        return store.first_exception if store is not None else None
 
-        if len(Util._other_exceptions) > 0:
-            logging.debug(" Non-framework exceptions:")
-            for ex in Util._other_exceptions:
-                logging.debug(f" * {str(ex)}")
+    @staticmethod
+    def _abort_exception():
+        store = Util._current_store()
+        return store.abort_exception if store is not None else None
 
     @staticmethod
     def register_exception(
-        ex: Exception, context=None, description="", type="", custom=None, framework_error=True
+        ex: Exception,
+        context=None,
+        description="",
+        type="",
+        custom=None,
+        framework_error=True,
+        state=None,
+        store=None,
     ):
+        """Register an exception of a flow run: keep it in the store of the flow run and add it \
+            to the exceptions in the context.
+
+        Arguments:
+            ex {Exception} -- The exception to register.
+            context {Context} -- The context to add the exception to. Default: the flow level \
+                context of the store.
+            state {str} -- The state that the flow run was in (see StateHandler).
+            store {FlowContextStore} -- The data of the flow run. Default: the store of \
+                'context', or the current store (see FlowContextStore.current()). If there is \
+                no store, the exception is only logged.
+        """
         # pylint: disable=redefined-builtin, too-many-branches
-
-        if framework_error:
-            Util._framework_exceptions.append(ex)
-        else:
-            Util._other_exceptions.append(ex)
         # pylint: disable=import-outside-toplevel
         from autor.framework.context import Context
 
-        if context is None:
-            context = Context()
-        exceptions = context.get(ctx.EXCEPTIONS, [])
-        exception = {}
+        if store is None:
+            store = context.store if context is not None else Util._current_store()
 
-        if Util._first_exception is None:
-            Util._first_exception = ex
+        if store is not None:
+            # The activity blocks of a flow run can share the store (see FlowRunner).
+            with store.lock:
+                if framework_error:
+                    store.framework_exceptions.append(ex)
+                else:
+                    store.other_exceptions.append(ex)
 
-        if Util._abort_exception is None and framework_error:
-            Util._abort_exception = ex
+                if store.first_exception is None:
+                    store.first_exception = ex
+
+                if store.abort_exception is None and framework_error:
+                    store.abort_exception = ex
+
+            if context is None:
+                context = Context(store=store)
+
+        exception = {}
 
         exception[ctx.MESSAGE] = str(ex)
         exception[ctx.CLASS] = ex.__class__.__name__
@@ -194,9 +235,9 @@ class Util:
         elif isinstance(ex, AutorExtensionException):
             exception[ctx.TYPE] = ExceptionType.EXTENSION
 
-        from autor.framework.state_handler import StateHandler
+        from autor.framework.state import State
 
-        exception[ctx.STATE] = StateHandler.get_current_state_name()
+        exception[ctx.STATE] = state if state is not None else State.UNKNOWN
 
         st_list = list(traceback.TracebackException.from_exception(ex).format())
         formatted_st = []
@@ -246,8 +287,11 @@ class Util:
         Util._print_registered_exception("")
         Util._print_registered_exception("")
 
-        exceptions.append(exception)
-        context.set(ctx.EXCEPTIONS, exceptions)
+        if context is not None:
+            with context.store.lock:
+                exceptions = context.get(ctx.EXCEPTIONS, [])
+                exceptions.append(exception)
+                context.set(ctx.EXCEPTIONS, exceptions)
 
         if type == ExceptionType.EXTENSION and DebugConfig.exit_on_extension_exceptions:
             logging.error("Exiting due to extension exception.")
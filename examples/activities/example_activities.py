@@ -13,6 +13,8 @@
 #    under the License.
 
 
+import asyncio
+
 from autor import Activity
 from autor.framework.activity_block_callback import ActivityBlockCallback
 from autor.framework.activity_registry import ActivityRegistry
@@ -183,3 +185,34 @@ class EmptyActivity(Activity):
 class MessageActivity(Activity):
     def run(self):
         print(self.configuration["message"])
+
+
+# An asynchronous activity: run on the event loop of the activity block.
+@ActivityRegistry.activity(type="ASYNC_SLEEP")
+class AsyncSleepActivity(Activity):
+    async def run(self):
+        await asyncio.sleep(self.configuration.get("seconds", 1))
+        print(f"{self.name} slept")
+
+
+# A CPU-bound activity: run with 'executor: process' to run it in a worker process.
+@ActivityRegistry.activity(type="PRIMES")
+class PrimesActivity(Activity):
+    @property
+    @output(mandatory=True, type=int)
+    def prime_count(self) -> int:
+        return self.__prime_count
+
+    @prime_count.setter
+    def prime_count(self, n) -> None:
+        self.__prime_count = n
+
+    def run(self):
+        limit = self.configuration.get("limit", 1000000)
+        sieve = bytearray([1]) * (limit + 1)
+        sieve[0:2] = b"\x00\x00"
+        for n in range(2, int(limit**0.5) + 1):
+            if sieve[n]:
+                sieve[n * n :: n] = bytearray(len(range(n * n, limit + 1, n)))
+        self.prime_count = sum(sieve)
+        print(f"{self.name}: {self.prime_count} primes up to {limit}")
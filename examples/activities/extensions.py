@@ -18,6 +18,7 @@ from autor.framework.context import Context, RemoteContext
 from autor.framework.debug_config import DebugConfig
 from autor.framework.file_context import FileContext
 from autor.framework.keys import StateKeys as ste
+from autor.framework.sqlite_context import SQLiteContext
 from autor.framework.state import State
 from autor.framework.state_listener import StateListener
 
@@ -55,3 +56,26 @@ class AddFileContext(StateListener):
         print("EXTENSION AddFileContext>>>>")
         if state.name == State.FRAMEWORK_START:
             state.dict[ste.FLOW_CONTEXT].remote_context = FileContext()
+
+
+class AddJournalFileContext(StateListener):
+    def on_state(self, state: State):
+        print("EXTENSION AddJournalFileContext>>>>")
+        if state.name == State.FRAMEWORK_START:
+            state.dict[ste.FLOW_CONTEXT].remote_context = FileContext(journal=True)
+
+
+class AddShardedFileContext(StateListener):
+    def on_state(self, state: State):
+        print("EXTENSION AddShardedFileContext>>>>")
+        if state.name == State.FRAMEWORK_START:
+            state.dict[ste.FLOW_CONTEXT].remote_context = FileContext(
+                directory="file_contexts", retention=100
+            )
+
+
+class AddSQLiteContext(StateListener):
+    def on_state(self, state: State):
+        print("EXTENSION AddSQLiteContext>>>>")
+        if state.name == State.FRAMEWORK_START:
+            state.dict[ste.FLOW_CONTEXT].remote_context = SQLiteContext()
@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+import pytest
+import yaml
+
+from autor.framework.activity_block import ActivityBlock
+from autor.framework.context import Context
+from autor.framework.flow_context_store import FlowContextStore
+from autor.framework.keys import FlowContextKeys as ctx
+from autor.framework.keys import StateKeys as ste
+from autor.framework.state_handler import StateHandler
+from autor.framework.state_producer import StateProducer
+
+
+@pytest.fixture
+def flow_config(tmp_path):
+    """Return a function that writes a Flow Configuration to tmp_path and returns its URL:
+
+    flow_config({"block": {"activities": [{"type": "NOOP"}]}}, extensions=[...])
+    """
+
+    def write(activity_blocks: dict, flow_id: str = "test-flow", **options) -> str:
+        config = {"flowId": flow_id, **options, "activityBlocks": activity_blocks}
+        path = tmp_path / "flow-config.yml"
+        path.write_text(yaml.safe_dump(config, sort_keys=False))
+        return str(path)
+
+    return write
+
+
+@pytest.fixture
+def run_block(flow_config):
+    """Return a function that runs an activity block with the id 'block' and returns it. The
+    activities are types or activity configurations, the keyword arguments are the options of
+    the block:
+
+    run_block(["NOOP", {"type": "SLOW", "timeout": 0.1}], parallel=True)
+    """
+
+    def run(activities: list, **block_options) -> ActivityBlock:
+        activities = [a if isinstance(a, dict) else {"type": a} for a in activities]
+        url = flow_config({"block": {**block_options, "activities": activities}})
+        block = ActivityBlock(flow_config_url=url, activity_block_id="block")
+        block.run()
+        return block
+
+    return run
+
+
+class Block(StateProducer):
+    """A state producer in place of an activity block run: the state data are the 'values',
+    which the tests can change between the states."""
+
+    def __init__(self):
+        self.store = FlowContextStore()
+        self.values = {
+            ste.FLOW_ID: "flow",
+            ste.FLOW_RUN_ID: "run",
+            ste.FLOW_CONFIG: None,
+            ste.FLOW_CONTEXT: Context(store=self.store),
+            ste.ACTIVITY_BLOCK_ID: "block",
+            ste.ACTIVITY_BLOCK_STATUS: "FAIL",
+            ste.ACTIVITY_GROUP_TYPE: "MAIN_ACTIVITY",
+            ste.ACTIVITY_ID: "block-A1",
+            ste.ACTIVITY_RUN_ID: "run-A1",
+            ste.ACTIVITY_TYPE: "Sleep",
+            ste.ACTIVITY_INSTANCE: SimpleNamespace(status="SUCCESS"),
+            ste.INTERNAL_ACTIVITY_DATA: SimpleNamespace(
+                metrics={ctx.SECONDS: 0.2, ctx.CONTEXT_SYNC_SECONDS: 0.002}
+            ),
+        }
+
+    def state_fields(self):
+        return {key: (lambda key=key: self.values[key], None) for key in self.values}
+
+    def on_before_state(self, state_name, state_data):
+        pass
+
+    def on_after_state(self, state_name, state_data):
+        pass
+
+
+@pytest.fixture
+def block():
+    return Block()
+
+
+@pytest.fixture
+def state_handler(block):
+    """A StateHandler with 'block' as its state producer."""
+    handler = StateHandler()
+    handler.add_state_producer(block)
+    return handler
@@ -0,0 +1,27 @@
+from autor.framework.activity_metrics import ActivityMetrics
+
+
+def test_summary_per_activity_type():
+    metrics = [("A", {"seconds": float(s), "cpuSeconds": 1.0}) for s in range(1, 21)]
+    metrics.append(("B", {"seconds": 5.0, "cpuSeconds": None}))
+
+    summary = ActivityMetrics.summarize(metrics)
+
+    assert summary["A"]["count"] == 20
+    assert summary["A"]["seconds"] == {"p50": 10.0, "p95": 19.0, "max": 20.0}
+    assert summary["A"]["cpuSeconds"]["max"] == 1.0
+    assert summary["B"] == {"count": 1, "seconds": {"p50": 5.0, "p95": 5.0, "max": 5.0}}
+
+
+def test_phases_and_context_sync_are_measured():
+    metrics = ActivityMetrics()
+    metrics.start("preprocess")
+    metrics.end("preprocess")
+    with metrics.context_sync():
+        pass
+
+    result = metrics.to_dict()
+    assert result["preprocess"]["end"] >= result["preprocess"]["start"]
+    assert result["seconds"] == result["preprocess"]["seconds"]
+    assert result["contextSyncSeconds"] >= 0
+    assert "run" not in result
@@ -0,0 +1,31 @@
+import pstats
+
+from autor.framework.activity_profiler import ActivityProfiler
+
+
+def test_only_the_selected_activities_are_profiled(tmp_path):
+    profiler = ActivityProfiler.from_configuration(
+        {"mode": "memory", "directory": str(tmp_path)}, mode="cpu", activities=["A2"]
+    )
+
+    with profiler.profile("A1", "block-A1", "run-1") as report:
+        sum(range(100))
+    assert report == []
+
+    with profiler.profile("A2", "block-A2", "run-2") as report:
+        sum(range(100))
+    assert report == [str(tmp_path / "run-2.pstats")]
+    assert pstats.Stats(report[0]).total_calls > 0
+
+
+def test_memory_report(tmp_path):
+    profiler = ActivityProfiler(mode="memory", directory=str(tmp_path), top=5)
+
+    with profiler.profile("A1", "block-A1", "run-1") as report:
+        data = [bytearray(1024) for _ in range(100)]
+
+    text = (tmp_path / "run-1.memory.txt").read_text()
+    assert report == [str(tmp_path / "run-1.memory.txt")]
+    assert "Top 5 allocation sites" in text
+    assert "test_activity_profiler.py" in text
+    del data
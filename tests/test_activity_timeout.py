@@ -0,0 +1,177 @@
+import asyncio
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from autor import Activity
+from autor.framework.activity_registry import ActivityRegistry
+from autor.framework.activity_watchdog import ActivityInterrupt, ActivityWatchdog
+from autor.framework.autor_framework_exception import AutorFrameworkValueException
+from autor.framework.constants import Status
+
+
+@ActivityRegistry.activity(type="TIMEOUT_BUSY")
+class TimeoutBusy(Activity):
+    def run(self):
+        end = time.monotonic() + 30
+        while time.monotonic() < end:
+            try:
+                pass
+            except Exception:  # Does not catch the interrupt.
+                pass
+
+
+@ActivityRegistry.activity(type="TIMEOUT_CHILD")
+class TimeoutChild(Activity):
+    def run(self):
+        process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+        self.register_child_process(process)
+        process.wait()
+
+
+@ActivityRegistry.activity(type="TIMEOUT_ASYNC")
+class TimeoutAsync(Activity):
+    async def run(self):
+        await asyncio.sleep(30)
+
+
+@ActivityRegistry.activity(type="TIMEOUT_QUICK")
+class TimeoutQuick(Activity):
+    def run(self):
+        pass
+
+
+late_writes = []
+late_writes_done = threading.Event()
+
+
+@ActivityRegistry.activity(type="TIMEOUT_LATE")
+class TimeoutLate(Activity):
+    def run(self):
+        try:
+            time.sleep(0.5)  # The interrupt is raised when the sleep has ended.
+        finally:
+            late_writes.append(self.expired)
+            for write in (
+                lambda: setattr(self, "status", Status.SUCCESS),
+                self.save_properties_to_context,
+            ):
+                try:
+                    write()
+                    late_writes.append("written")
+                except ActivityInterrupt:
+                    late_writes.append("interrupted")
+            late_writes_done.set()
+
+
+@pytest.mark.parametrize("activity_type", ["TIMEOUT_BUSY", "TIMEOUT_CHILD", "TIMEOUT_ASYNC"])
+def test_activity_timeout(run_block, activity_type):
+    start = time.monotonic()
+    block = run_block(
+        [
+            {"type": activity_type, "timeout": 0.2, "continueOn": ["SUCCESS", "TIMEOUT"]},
+            "TIMEOUT_QUICK",
+        ]
+    )
+
+    assert [a.status for a in block._main_activities] == [Status.TIMEOUT, Status.SUCCESS]
+    assert block.status == Status.ERROR
+    assert time.monotonic() - start < 10
+
+
+def test_process_activity_timeout(run_block):
+    start = time.monotonic()
+    block = run_block([{"type": "TIMEOUT_BUSY", "timeout": 0.5, "executor": "process"}])
+
+    assert block._main_activities[0].status == Status.TIMEOUT
+    assert time.monotonic() - start < 10
+
+
+def test_activity_block_budget(run_block):
+    start = time.monotonic()
+    block = run_block(
+        ["TIMEOUT_QUICK", "TIMEOUT_BUSY", "TIMEOUT_QUICK"],
+        worker={"expectedMaxDuration": "0.3s"},
+    )
+
+    # The timeout interrupts the block: the last activity is not run.
+    assert [a.status for a in block._main_activities] == [
+        Status.SUCCESS,
+        Status.TIMEOUT,
+        Status.SKIPPED,
+    ]
+    assert time.monotonic() - start < 10
+
+
+def test_thread_left_running_cannot_change_the_outcome(run_block, monkeypatch):
+    monkeypatch.setattr(ActivityWatchdog, "GRACE_SECONDS", 0.05)
+    late_writes.clear()
+    late_writes_done.clear()
+    block = run_block([{"type": "TIMEOUT_LATE", "timeout": 0.1}])
+
+    assert late_writes_done.wait(10)
+    assert late_writes == [True, "interrupted", "interrupted"]
+    assert block._main_activities[0].status == Status.TIMEOUT
+
+
+class WatchedActivity:
+    id = "watched"
+    child_processes = []
+
+    def __init__(self):
+        self.expired_threads = []
+
+    def expire(self, thread_id):
+        self.expired_threads.append(thread_id)
+
+
+def test_run_finished_after_the_limit_but_before_the_expiry(monkeypatch):
+    release = threading.Event()
+    join = threading.Thread.join
+
+    def late_join(thread, timeout=None):
+        join(thread, timeout)
+        if thread.name == "autor-watched" and timeout == 0.05:
+            release.set()  # The run finishes when the limit is reached, before it is expired.
+            join(thread)
+
+    monkeypatch.setattr(threading.Thread, "join", late_join)
+    activity, returned = WatchedActivity(), []
+    watchdog = ActivityWatchdog(activity, 0.05)
+    watchdog.run(lambda: returned.append(release.wait(10)))
+
+    assert returned == [True]
+    assert not watchdog.timed_out and activity.expired_threads == []
+
+
+def test_run_finishing_while_it_is_expired_is_interrupted(monkeypatch):
+    release, unhandled = threading.Event(), []
+    expire = ActivityWatchdog.expire
+
+    def slow_expire(watchdog):
+        expire(watchdog)
+        release.set()  # The run returns and waits until it has been interrupted.
+        time.sleep(0.1)
+
+    monkeypatch.setattr(ActivityWatchdog, "expire", slow_expire)
+    monkeypatch.setattr(threading, "excepthook", unhandled.append)
+    activity = WatchedActivity()
+    watchdog = ActivityWatchdog(activity, 0.05)
+    watchdog.run(lambda: release.wait(10))
+
+    assert watchdog.timed_out and len(activity.expired_threads) == 1
+    assert unhandled == []  # The late interrupt does not escape the thread.
+
+
+def test_durations():
+    assert ActivityWatchdog.to_seconds(None) is None
+    assert ActivityWatchdog.to_seconds(90) == 90
+    assert ActivityWatchdog.to_seconds("90") == 90
+    assert ActivityWatchdog.to_seconds("1h30m") == 5400
+    assert ActivityWatchdog.to_seconds("0.5s") == 0.5
+    for value in ("soon", 0, "0s", True):
+        with pytest.raises(AutorFrameworkValueException):
+            ActivityWatchdog.to_seconds(value)
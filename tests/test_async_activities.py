@@ -0,0 +1,52 @@
+import asyncio
+import threading
+
+import pytest
+
+from autor import Activity
+from autor.framework.activity_registry import ActivityRegistry
+from autor.framework.constants import Status
+
+
+class Signal:
+    event = None  # Created on the event loop of the block.
+    threads = set()
+
+
+@ActivityRegistry.activity(type="ASYNC_WAITER")
+class AsyncWaiter(Activity):
+    async def run(self):
+        Signal.threads.add(threading.current_thread().name)
+        Signal.event = Signal.event or asyncio.Event()
+        await asyncio.wait_for(Signal.event.wait(), timeout=10)
+
+
+@ActivityRegistry.activity(type="ASYNC_SETTER")
+class AsyncSetter(Activity):
+    async def run(self):
+        Signal.threads.add(threading.current_thread().name)
+        Signal.event = Signal.event or asyncio.Event()
+        Signal.event.set()
+
+
+@pytest.fixture(autouse=True)
+def reset_signal():
+    Signal.event = None
+    Signal.threads = set()
+
+
+def test_async_activities_overlap_on_the_event_loop(run_block):
+    block = run_block(
+        [{"type": t, "continueOn": ["ALL"]} for t in ("ASYNC_WAITER", "ASYNC_SETTER")],
+        parallel=True,
+    )
+
+    assert [a.status for a in block._main_activities] == [Status.SUCCESS] * 2
+    assert Signal.threads == {"autor-block-loop"}
+
+
+def test_async_activity_in_a_sequential_block(run_block):
+    block = run_block(["ASYNC_SETTER", "ASYNC_WAITER"])
+
+    assert block._activity_block_status == Status.SUCCESS
+    assert not any(t.name == "autor-block-loop" for t in threading.enumerate())
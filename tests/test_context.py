@@ -0,0 +1,230 @@
+import json
+import threading
+
+import pytest
+
+from autor.framework.context import AutorFrameworkContextKeyNotFoundException, Context
+from autor.framework.context_paths import ContextPaths
+from autor.framework.flow_context_store import FlowContextStore
+from autor.framework.keys import FlowContextKeys as ctx
+from autor.framework.remote_context import RemoteContext
+from autor.framework.util import Util
+
+
+class RecordingRemoteContext(RemoteContext):
+    def __init__(self):
+        self.synced_changes = []
+
+    # pylint: disable-next=redefined-builtin
+    def sync(self, id, context):
+        pass
+
+    # pylint: disable-next=redefined-builtin
+    def sync_changes(self, id, context, changes):
+        self.synced_changes.append(set(changes))
+
+
+@pytest.fixture
+def store():
+    return FlowContextStore()
+
+
+def test_sync_remote_passes_changed_paths(store):
+    remote = RecordingRemoteContext()
+    flow = Context(store=store)
+    flow.remote_context = remote
+
+    Context(store=store, activity_block="B", activity="B-A1").set("score", 1)
+    flow.sync_remote()
+
+    assert remote.synced_changes == [
+        {
+            ("_activityBlocks", "B", "_activities", "B-A1", "score"),
+            ("_activityBlocks", "B", "_latest", "score"),
+            ("_latest", "score"),
+        }
+    ]
+
+
+def test_sync_remote_is_skipped_when_nothing_changed(store):
+    remote = RecordingRemoteContext()
+    flow = Context(store=store)
+    flow.remote_context = remote
+
+    flow.set("a", 1)
+    flow.sync_remote()
+    flow.sync_remote()
+    assert remote.synced_changes == [{("a",)}]
+
+    flow.sync_remote(force=True)
+    assert remote.synced_changes == [{("a",)}, set()]
+
+
+def test_sync_worker_merges_remote_values_without_overwriting_local_changes(store):
+    class RemoteWriter(RemoteContext):
+        # pylint: disable-next=redefined-builtin
+        def sync(self, id, context):
+            context["remote"] = "r"
+            context["a"] = "remote a"
+
+    flow = Context(store=store)
+    flow.remote_context = RemoteWriter()
+    flow.start_sync_worker()
+    try:
+        flow.set("a", 1)
+        flow.sync_remote()
+        flow.set("a", 2)  # Changed after the snapshot was taken.
+        flow.drain_remote()
+    finally:
+        flow.stop_sync_worker()
+
+    assert flow.get("remote") == "r"
+    assert flow.get("a") == 2
+
+
+def test_search_falls_back_to_activity_block_and_flow(store):
+    flow = Context(store=store)
+    activity = Context(store=store, activity_block="B", activity="B-A1")
+
+    assert activity.get("x", default=None, search=True) is None
+    with pytest.raises(AutorFrameworkContextKeyNotFoundException):
+        activity.get("x", search=True)
+
+    flow.set("x", "flow")
+    assert activity.get("x", search=True) == "flow"
+    Context(store=store, activity_block="B").set("x", "block", propagate_value=False)
+    assert activity.get("x", search=True) == "block"
+    activity.set("x", "activity", propagate_value=False)
+    assert activity.get("x", search=True) == "activity"
+
+    # Cached dictionaries are not used after the local context has been replaced.
+    flow.set_context({})
+    assert activity.get("x", default=None, search=True) is None
+
+
+def test_propagated_values_are_stored_once(store):
+    flow = Context(store=store)
+    block = Context(store=store, activity_block="B")
+    activity = Context(store=store, activity_block="B", activity="B-A1")
+
+    results = list(range(1000))
+    activity.set("results", results)
+    block.set("status", "RUNNING")
+
+    assert store.local_context == {
+        "_latest": {
+            "results": ("_activityBlocks", "B", "_activities", "B-A1", "results"),
+            "status": ("_activityBlocks", "B", "status"),
+        },
+        "_activityBlocks": {
+            "B": {
+                "_activities": {"B-A1": {"results": results}},
+                "_latest": {"results": ("_activityBlocks", "B", "_activities", "B-A1", "results")},
+                "status": "RUNNING",
+            }
+        },
+    }
+    assert flow.local_context == {
+        "results": results,
+        "status": "RUNNING",
+        "_activityBlocks": {
+            "B": {
+                "results": results,
+                "status": "RUNNING",
+                "_activities": {"B-A1": {"results": results}},
+            }
+        },
+    }
+
+
+def test_local_context_is_a_copy(store):
+    Context(store=store, activity_block="B", activity="B-A1").set("x", 1)
+    local_context = Context(store=store).local_context
+
+    assert json.loads(json.dumps(local_context)) == local_context
+    local_context["x"] = 2
+    local_context["_activityBlocks"]["B"]["_activities"]["B-A1"]["x"] = 2
+    assert Context(store=store).get("x") == 1
+    assert Context(store=store, activity_block="B", activity="B-A1").get("x") == 1
+
+
+def test_materialized_context_is_converted(store):
+    results = [1, 2, 3]
+    materialized = {
+        "results": results,
+        "flowKey": "flow",
+        "_activityBlocks": {
+            "B": {
+                "results": results,
+                "status": "RUNNING",
+                "_activities": {"B-A1": {"results": results, "status": "SUCCESS"}},
+            }
+        },
+    }
+
+    store.set_context(ContextPaths.dematerialize(materialized))
+    assert store.local_context == {
+        "flowKey": "flow",
+        "_latest": {"results": ("_activityBlocks", "B", "_activities", "B-A1", "results")},
+        "_activityBlocks": {
+            "B": {
+                "status": "RUNNING",
+                "_latest": {"results": ("_activityBlocks", "B", "_activities", "B-A1", "results")},
+                "_activities": {"B-A1": {"results": results, "status": "SUCCESS"}},
+            }
+        },
+    }
+    assert Context(store=store).get("results") == results
+    assert Context(store=store, activity_block="B").get("status") == "RUNNING"
+
+
+def test_latest_writer_wins_on_each_level(store):
+    flow = Context(store=store)
+    block = Context(store=store, activity_block="B")
+    activity = Context(store=store, activity_block="B", activity="B-A1")
+
+    activity.set("x", 1)
+    flow.set("x", 2)
+    assert (flow.get("x"), block.get("x"), activity.get("x")) == (2, 1, 1)
+
+    block.set("x", 3)
+    assert (flow.get("x"), block.get("x"), activity.get("x")) == (3, 3, 1)
+
+    # Without propagation the upper levels keep the previously propagated value.
+    activity.set("x", 4)
+    activity.set("x", 5, propagate_value=False)
+    assert (flow.get("x"), block.get("x"), activity.get("x")) == (4, 4, 5)
+
+
+def test_stores_are_independent(store):
+    other = FlowContextStore()
+    Context(store=store).set("x", 1)
+    Context(store=other, activity_block="B", activity="B-A1").set("x", 2)
+
+    assert Context(store=store).get("x") == 1
+    assert Context(store=other).get("x") == 2
+    assert Context(store=store, activity_block="B").get("x", default=None) is None
+
+
+def test_register_exception_without_a_store(store):
+    context = Context(store=store, activity_block="B")
+    Util.register_exception(ValueError("in context"), context=context)
+    assert store.abort_exception.args == ("in context",)
+    assert context.get(ctx.EXCEPTIONS)[0][ctx.MESSAGE] == "in context"
+
+    current = store.make_current()
+    try:
+        Util.register_exception(ValueError("current"), framework_error=False)
+        assert [str(e) for e in store.other_exceptions] == ["current"]
+        with pytest.deprecated_call():
+            assert Util.get_abort_exception_message() == "in context"
+
+        # Other threads have their own current store.
+        other = []
+        thread = threading.Thread(target=lambda: other.append(FlowContextStore.current()))
+        thread.start()
+        thread.join()
+        assert other == [None]
+    finally:
+        FlowContextStore.reset_current(current)
+    assert FlowContextStore.current() is None
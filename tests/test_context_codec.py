@@ -0,0 +1,57 @@
+import pytest
+
+from autor.framework.autor_framework_exception import AutorFrameworkValueException
+from autor.framework.context_codec import ContextCodec
+from autor.framework.file_context import FileContext
+
+VALUE = {
+    "none": None,
+    "flags": [True, False],
+    "numbers": [0, -1, 2**63, 1.5],
+    "text": "käyttäjä",
+    "raw": b"\x00\x01",
+    "nested": {"list": [{"a": 1}], "empty": {}},
+}
+
+
+@pytest.mark.parametrize("name", ["binary", "pickle"])
+def test_codec_round_trip(name):
+    codec = ContextCodec.create(name)
+    assert codec.decode(codec.encode(VALUE)) == VALUE
+
+    stats = codec.stats()
+    assert (stats["codec"], stats["encodeCalls"], stats["decodeCalls"]) == (name, 1, 1)
+
+
+def test_json_codec_is_compact():
+    assert ContextCodec.create("json").encode({"a": [1, 2]}) == b'{"a":[1,2]}'
+
+
+def test_unknown_codec():
+    with pytest.raises(AutorFrameworkValueException):
+        ContextCodec.create("yaml")
+
+
+def test_codec_must_implement_encode_and_decode():
+    class EncodeOnly(ContextCodec):
+        def _encode(self, value):
+            return b""
+
+    with pytest.raises(TypeError):
+        EncodeOnly()
+
+
+@pytest.mark.parametrize("name", ["json", "binary"])
+def test_file_context_journal_with_codec(tmp_path, monkeypatch, name):
+    monkeypatch.chdir(tmp_path)
+    first, second = FileContext(journal=True), FileContext(journal=True)
+    first.codec, second.codec = ContextCodec.create(name), ContextCodec.create(name)
+
+    first_context, second_context = {"a": 1}, {}
+    first.sync("flow-1", first_context)
+    second.sync("flow-1", second_context)
+    first_context["a"] = 2
+    first.sync_changes("flow-1", first_context, {("a",)})
+    second.sync_changes("flow-1", second_context, set())
+
+    assert second_context == {"a": 2}
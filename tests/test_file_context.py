@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+
+import pytest
+
+from autor.framework.file_context import FileContext
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+def _block(key, value):
+    return {"_activityBlocks": {"B": {"_activities": {"B-A1": {key: value}}}}}
+
+
+def test_journal_appends_only_changed_values():
+    remote = FileContext(journal=True)
+    context = {"flowKey": 1}
+    remote.sync("flow-1", context)
+
+    context["flowKey"] = 2
+    context.update(_block("status", "SUCCESS"))
+    remote.sync("flow-1", context)
+    remote.sync("flow-1", context)  # Nothing changed -> nothing appended
+
+    with open(FileContext._JOURNAL_FILENAME, encoding="utf8") as journal:
+        records = [json.loads(line) for line in journal]
+
+    assert [record["values"] for record in records] == [
+        [[["flowKey"], 1]],
+        [
+            [["flowKey"], 2],
+            [["_activityBlocks", "B", "_activities", "B-A1", "status"], "SUCCESS"],
+        ],
+    ]
+
+
+def test_journal_merges_values_from_other_writers():
+    first = FileContext(journal=True)
+    second = FileContext(journal=True)
+
+    first_context = {"a": 1}
+    first.sync("flow-1", first_context)
+
+    second_context = _block("b", 2)
+    second.sync("flow-1", second_context)
+    first.sync("flow-1", first_context)
+
+    assert first_context == {"a": 1, **_block("b", 2)}
+    assert second_context == {"a": 1, **_block("b", 2)}
+
+
+def test_journal_compaction_keeps_the_context():
+    remote = FileContext(journal=True, compact_every=2)
+    context = {}
+    for i in range(5):
+        context[f"key{i}"] = i
+        remote.sync("flow-1", context)
+
+    restored = {}
+    FileContext(journal=True).sync("flow-1", restored)
+    assert restored == context
+
+    with open(FileContext._FILENAME, encoding="utf8") as snapshot:
+        assert json.load(snapshot)["flow-1"] == {f"key{i}": i for i in range(4)}
+
+
+def test_journal_compaction_by_another_instance_keeps_unread_records():
+    first = FileContext(journal=True, compact_every=3)
+    second = FileContext(journal=True, compact_every=4)
+    first_context, second_context = {}, {}
+    for i in range(10):
+        first_context[f"a{i}"] = i
+        first.sync("flow-1", first_context)
+        second_context[f"b{i}"] = i
+        second.sync("flow-1", second_context)
+    first.sync("flow-1", first_context)
+    second.sync("flow-1", second_context)
+
+    expected = {f"{key}{i}": i for key in "ab" for i in range(10)}
+    assert first_context == expected
+    assert second_context == expected
+
+
+@pytest.mark.parametrize("directory", [None, "contexts"])
+def test_journal_compacted_while_other_instances_write(directory):
+    def write(key):
+        remote = FileContext(journal=True, compact_every=2, directory=directory)
+        context = {}
+        for i in range(50):
+            context[f"{key}{i}"] = i
+            remote.sync("flow-1", context)
+
+    threads = [threading.Thread(target=write, args=(key,)) for key in "abc"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    restored = {}
+    FileContext(journal=True, directory=directory).sync("flow-1", restored)
+    assert restored == {f"{key}{i}": i for key in "abc" for i in range(50)}
+
+
+@pytest.mark.parametrize("journal", [False, True])
+def test_sharded_directory_has_one_file_per_flow_run(journal):
+    remote = FileContext(journal=journal, directory="contexts")
+    remote.sync("flow-1", {"a": 1})
+    remote.sync("flow/2", {"b": 2})
+
+    restored = {}
+    FileContext(journal=journal, directory="contexts").sync("flow/2", restored)
+    assert restored == {"b": 2}
+
+    with open("contexts/index.json", encoding="utf8") as index:
+        assert {run: entry["file"] for run, entry in json.load(index).items()} == {
+            "flow-1": "flow-1",
+            "flow/2": "flow%2F2",
+        }
+
+
+def test_sharded_journal_compaction_by_another_instance_keeps_unread_records():
+    first = FileContext(journal=True, compact_every=3, directory="contexts")
+    second = FileContext(journal=True, compact_every=4, directory="contexts")
+    first_context, second_context = {}, {}
+    for i in range(10):
+        first_context[f"a{i}"] = i
+        first.sync("flow-1", first_context)
+        second_context[f"b{i}"] = i
+        second.sync("flow-1", second_context)
+    first.sync("flow-1", first_context)
+    second.sync("flow-1", second_context)
+
+    expected = {f"{key}{i}": i for key in "ab" for i in range(10)}
+    assert first_context == expected
+    assert second_context == expected
+
+    restored = {}
+    FileContext(journal=True, directory="contexts").sync("flow-1", restored)
+    assert restored == expected
+
+
+def test_sharded_retention_removes_the_oldest_flow_runs():
+    remote = FileContext(directory="contexts", retention=2)
+    for run in ("flow-1", "flow-2", "flow-3"):
+        remote.sync(run, {"run": run})
+
+    assert sorted(os.listdir("contexts")) == ["flow-2.json", "flow-3.json", "index.json"]
+
+
+@pytest.mark.parametrize("journal", [False, True])
+def test_materialized_context_of_an_older_version_is_converted(journal):
+    latest = ["_activityBlocks", "B", "_activities", "B-A1", "status"]
+    materialized = _block("status", "SUCCESS")
+    materialized["_activityBlocks"]["B"]["status"] = "SUCCESS"
+    with open(FileContext._FILENAME, "w", encoding="utf8") as snapshot:
+        json.dump({"flow-1": {"status": "SUCCESS", **materialized}}, snapshot)
+
+    context = {}
+    FileContext(journal=journal).sync("flow-1", context)
+    assert "status" not in context
+    assert [list(path) for path in context["_latest"].values()] == [latest]
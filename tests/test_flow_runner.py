@@ -0,0 +1,163 @@
+import threading
+
+import pytest
+
+from autor import Activity
+from autor.framework.activity_registry import ActivityRegistry
+from autor.framework.autor_framework_exception import AutorFrameworkValueException
+from autor.framework.constants import Status
+from autor.framework.context_properties_registry import ContextPropertiesRegistry
+from autor.framework.flow_runner import FlowRunner
+from autor.framework.keys import StateKeys as ste
+from autor.framework.remote_context import RemoteContext
+from autor.framework.state import State
+from autor.framework.state_listener import StateListener
+
+output = ContextPropertiesRegistry.output
+# pylint: disable-next=redefined-builtin
+input = ContextPropertiesRegistry.input
+
+# FLOW_PEER activities succeed only if two of them run at the same time.
+barrier = threading.Barrier(2, timeout=10)
+
+
+@ActivityRegistry.activity(type="FLOW_WRITER")
+class FlowWriter(Activity):
+    @property
+    @output(mandatory=True, type=int)
+    def flow_score(self) -> int:
+        return self.__score
+
+    @flow_score.setter
+    def flow_score(self, n) -> None:
+        self.__score = n
+
+    def run(self):
+        self.flow_score = 7
+
+
+@ActivityRegistry.activity(type="FLOW_PEER")
+class FlowPeer(Activity):
+    def run(self):
+        barrier.wait()
+
+
+@ActivityRegistry.activity(type="FLOW_READER")
+class FlowReader(Activity):
+    def __init__(self):
+        super().__init__()
+        self.__score = None
+
+    @property
+    @input(mandatory=True, type=int)
+    def flow_score(self) -> int:
+        return self.__score
+
+    @flow_score.setter
+    def flow_score(self, n) -> None:
+        self.__score = n
+
+    def run(self):
+        assert self.flow_score == 7
+
+
+@ActivityRegistry.activity(type="FLOW_FAILER")
+class FlowFailer(Activity):
+    def run(self):
+        self.status = Status.FAIL
+
+
+@ActivityRegistry.activity(type="FLOW_RAISER")
+class FlowRaiser(Activity):
+    def run(self):
+        barrier.wait()
+        raise ValueError(self.id)
+
+
+class MemoryContext(RemoteContext):
+    syncs = []  # (instance, id)
+
+    # pylint: disable-next=redefined-builtin
+    def sync(self, id: str, context: dict) -> None:
+        MemoryContext.syncs.append((self, id))
+
+
+class AddMemoryContext(StateListener):
+    new_context = {}  # Activity block id -> FLOW_CREATE_NEW_CONTEXT
+
+    def on_state(self, state: State):
+        if state.name == State.FRAMEWORK_START:
+            block_id = state.dict[ste.ACTIVITY_BLOCK_ID]
+            AddMemoryContext.new_context[block_id] = state.dict[ste.FLOW_CREATE_NEW_CONTEXT]
+            state.dict[ste.FLOW_CONTEXT].remote_context = MemoryContext()
+
+
+def run_flow(flow_config, blocks, extensions=(), runner=None):
+    url = flow_config(
+        {
+            block_id: {"dependsOn": depends_on, "activities": [{"type": activity_type}]}
+            for block_id, (depends_on, activity_type) in blocks.items()
+        },
+        **({"extensions": list(extensions)} if extensions else {}),
+    )
+    return (runner or FlowRunner)(flow_config_url=url).run()
+
+
+def test_blocks_run_in_dependency_order(flow_config):
+    statuses = run_flow(
+        flow_config,
+        {
+            "read": [["left", "right"], "FLOW_READER"],
+            "left": [["write"], "FLOW_PEER"],
+            "right": [["write"], "FLOW_PEER"],
+            "write": [[], "FLOW_WRITER"],
+        },
+    )
+
+    # left and right meet at the barrier; read sees the output of write in the shared context.
+    assert statuses == {b: Status.SUCCESS for b in ("write", "left", "right", "read")}
+
+
+def test_dependents_of_a_failed_block_are_skipped(flow_config):
+    statuses = run_flow(
+        flow_config,
+        {"fail": [[], "FLOW_FAILER"], "after": [["fail"], "FLOW_WRITER"]},
+    )
+
+    assert statuses == {"fail": Status.FAIL, "after": Status.SKIPPED}
+
+
+def test_dependency_cycle(flow_config):
+    with pytest.raises(AutorFrameworkValueException, match="a -> b -> a"):
+        run_flow(flow_config, {"a": [["b"], "FLOW_WRITER"], "b": [["a"], "FLOW_WRITER"]})
+
+
+def test_concurrent_blocks_keep_their_own_exceptions(flow_config):
+    runners = []
+
+    def runner(**kwargs):
+        runners.append(FlowRunner(**kwargs))
+        return runners[-1]
+
+    statuses = run_flow(
+        flow_config, {"a": [[], "FLOW_RAISER"], "b": [[], "FLOW_RAISER"]}, runner=runner
+    )
+
+    assert statuses == {"a": Status.ERROR, "b": Status.ERROR}
+    store = runners[0]._flow_store
+    assert sorted(str(e) for e in store.other_exceptions) == ["a-activity1", "b-activity1"]
+
+
+def test_remote_context_is_set_up_once(flow_config):
+    MemoryContext.syncs.clear()
+    AddMemoryContext.new_context.clear()
+    statuses = run_flow(
+        flow_config,
+        {"write": [[], "FLOW_WRITER"], "read": [["write"], "FLOW_READER"]},
+        extensions=["tests.test_flow_runner.AddMemoryContext"],
+    )
+
+    assert statuses == {"write": Status.SUCCESS, "read": Status.SUCCESS}
+    assert len({remote for remote, _ in MemoryContext.syncs}) == 1
+    # A new flow run: only the first block starts a new flow context.
+    assert AddMemoryContext.new_context == {"write": True, "read": False}
@@ -0,0 +1,62 @@
+from autor.extensions.openmetrics_exporter import OpenMetricsExporter
+from autor.framework.constants import ExceptionType
+from autor.framework.keys import StateKeys as ste
+from autor.framework.state import State
+from autor.framework.util import Util
+
+
+def test_block_statistics(tmp_path, monkeypatch, block, state_handler):
+    monkeypatch.chdir(tmp_path)  # The default file is written to the working directory.
+    state_handler.add_state_listener(OpenMetricsExporter())
+
+    # Registered before the run: not counted.
+    Util.register_exception(Exception("old"), store=block.store, type=ExceptionType.SET_UP)
+    state_handler.change_state(State.BEFORE_ACTIVITY_BLOCK)
+    state_handler.change_state(State.AFTER_ACTIVITY_POSTPROCESS)
+    state_handler.change_state(State.AFTER_ACTIVITY_POSTPROCESS)
+    Util.register_exception(Exception("new"), store=block.store, type=ExceptionType.ACTIVITY_BLOCK)
+    state_handler.change_state(State.AFTER_ACTIVITY_BLOCK)
+
+    lines = (tmp_path / "autor-block.prom").read_text().splitlines()
+    labels = 'flow="flow",block="block"'
+    assert lines[-1] == "# EOF"
+    assert f'autor_activity_block_status{{{labels},status="FAIL"}} 1' in lines
+    assert (
+        f'autor_activities{{{labels},group="MAIN_ACTIVITY",type="Sleep",status="SUCCESS"}} 2'
+        in lines
+    )
+    assert f'autor_activity_duration_seconds_bucket{{{labels},type="Sleep",le="0.1"}} 0' in lines
+    assert f'autor_activity_duration_seconds_bucket{{{labels},type="Sleep",le="0.5"}} 2' in lines
+    assert f'autor_activity_duration_seconds_count{{{labels},type="Sleep"}} 2' in lines
+    assert f'autor_exceptions{{{labels},type="ACTIVITY_BLOCK"}} 1' in lines
+    assert not any('type="SET_UP"' in line for line in lines)
+    assert any(line.startswith("autor_context_size_bytes{") for line in lines)
+
+
+def test_aborted_block(tmp_path, monkeypatch, block, state_handler):
+    monkeypatch.chdir(tmp_path)
+    block.values[ste.ACTIVITY_BLOCK_STATUS] = "ABORTED"
+    state_handler.add_state_listener(OpenMetricsExporter())
+
+    # Aborted during set up: no BEFORE_ACTIVITY_BLOCK and AFTER_ACTIVITY_BLOCK.
+    state_handler.change_state(State.FRAMEWORK_START)
+    Util.register_exception(Exception("set up"), store=block.store, type=ExceptionType.SET_UP)
+    state_handler.change_state(State.FRAMEWORK_END)
+
+    lines = (tmp_path / "autor-block.prom").read_text().splitlines()
+    labels = 'flow="flow",block="block"'
+    assert f'autor_activity_block_status{{{labels},status="ABORTED"}} 1' in lines
+    assert f'autor_exceptions{{{labels},type="SET_UP"}} 1' in lines
+
+
+def test_file_written_once(tmp_path, monkeypatch, state_handler):
+    monkeypatch.chdir(tmp_path)
+    state_handler.add_state_listener(OpenMetricsExporter())
+
+    state_handler.change_state(State.FRAMEWORK_START)
+    state_handler.change_state(State.BEFORE_ACTIVITY_BLOCK)
+    state_handler.change_state(State.AFTER_ACTIVITY_BLOCK)
+    (tmp_path / "autor-block.prom").unlink()
+    state_handler.change_state(State.FRAMEWORK_END)
+
+    assert not (tmp_path / "autor-block.prom").exists()
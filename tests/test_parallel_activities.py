@@ -0,0 +1,238 @@
+import threading
+import time
+
+import pytest
+
+from autor import Activity
+from autor.flow_configuration.activity_configuration import ActivityConfiguration
+from autor.framework.activity_block import ActivityBlock
+from autor.framework.activity_dependencies import ActivityDependencies
+from autor.framework.activity_registry import ActivityRegistry
+from autor.framework.constants import ActivityGroupType, Status
+from autor.framework.context_properties_registry import ContextPropertiesRegistry
+from autor.framework.flow_context_store import FlowContextStore
+from autor.framework.keys import StateKeys as ste
+from autor.framework.state_listener import StateListener
+from autor.framework.util import Util
+
+output = ContextPropertiesRegistry.output
+# pylint: disable-next=redefined-builtin
+input = ContextPropertiesRegistry.input
+
+# PARALLEL_WAITER and PARALLEL_PEER succeed only if they run at the same time.
+barrier = threading.Barrier(2, timeout=10)
+
+
+@ActivityRegistry.activity(type="PARALLEL_WAITER")
+class ParallelWaiter(Activity):
+    @property
+    @output(mandatory=True, type=int)
+    def parallel_score(self) -> int:
+        return self.__score
+
+    @parallel_score.setter
+    def parallel_score(self, n) -> None:
+        self.__score = n
+
+    def run(self):
+        barrier.wait()
+        self.parallel_score = 10
+
+
+@ActivityRegistry.activity(type="PARALLEL_PEER")
+class ParallelPeer(Activity):
+    def run(self):
+        barrier.wait()
+
+
+@ActivityRegistry.activity(type="PARALLEL_READER")
+class ParallelReader(Activity):
+    def __init__(self):
+        super().__init__()
+        self.__score = None
+
+    @property
+    @input(mandatory=True, type=int)
+    def parallel_score(self) -> int:
+        return self.__score
+
+    @parallel_score.setter
+    def parallel_score(self, n) -> None:
+        self.__score = n
+
+    def run(self):
+        assert self.parallel_score == 10
+
+
+@ActivityRegistry.activity(type="PARALLEL_NOOP")
+class ParallelNoop(Activity):
+    def run(self):
+        pass
+
+
+@ActivityRegistry.activity(type="PARALLEL_FAIL")
+class ParallelFail(Activity):
+    def run(self):
+        raise ValueError("Failed")
+
+
+slow_runs = []
+
+
+@ActivityRegistry.activity(type="PARALLEL_SLOW")
+class ParallelSlow(Activity):
+    def run(self):
+        time.sleep(0.2)
+        slow_runs.append(self.id)
+
+
+@ActivityRegistry.activity(type="PARALLEL_REGISTER")
+class ParallelRegister(Activity):
+    def run(self):
+        Util.register_exception(ValueError(self.id), framework_error=False)
+
+
+@ActivityRegistry.activity(type="PARALLEL_REGISTER_ASYNC")
+class ParallelRegisterAsync(Activity):
+    async def run(self):
+        Util.register_exception(ValueError(self.id), framework_error=False)
+
+
+def configs(*types, run_on=None, continue_on=("ALL",)):
+    return [
+        ActivityConfiguration(
+            {
+                "type": t,
+                **({"runOn": run_on} if run_on else {}),
+                **({"continueOn": list(continue_on)} if continue_on else {}),
+            },
+            {},
+            {},
+        )
+        for t in types
+    ]
+
+
+def test_dependencies():
+    dependencies = ActivityDependencies(
+        configs(
+            "PARALLEL_WAITER", "PARALLEL_WAITER", "PARALLEL_READER", "UNKNOWN", "PARALLEL_READER"
+        )
+    )
+    assert dependencies.dependencies(0) == set()
+    assert dependencies.dependencies(1) == {0}  # Writes what 0 writes.
+    assert dependencies.dependencies(2) == {0, 1}  # Reads what 0 and 1 write.
+    assert dependencies.dependencies(3) == {0, 1, 2}
+    assert dependencies.dependencies(4) == {0, 1, 3}
+
+    readers = ActivityDependencies(configs("PARALLEL_READER", "PARALLEL_READER"))
+    assert readers.dependencies(1) == set()
+    assert ActivityDependencies(
+        configs("PARALLEL_READER") + configs("PARALLEL_READER", run_on={"activityStatus": {}})
+    ).dependencies(1) == {0}
+
+    # An activity that can interrupt the block (default continueOn) is run alone.
+    interrupting = ActivityDependencies(
+        configs("PARALLEL_READER")
+        + configs("PARALLEL_READER", continue_on=None)
+        + configs("PARALLEL_READER")
+    )
+    assert interrupting.dependencies(1) == {0}
+    assert interrupting.dependencies(2) == {1}  # And on 0 through 1.
+    assert ActivityDependencies(
+        configs("PARALLEL_READER", "PARALLEL_READER"), configs("PARALLEL_NOOP", continue_on=None)
+    ).dependencies(1) == {0}
+
+
+def test_independent_main_activities_run_in_parallel(run_block):
+    block = run_block(
+        [
+            {"type": t, "continueOn": ["ALL"]}
+            for t in ("PARALLEL_WAITER", "PARALLEL_READER", "PARALLEL_PEER")
+        ],
+        parallel=True,
+        beforeActivity={"activities": [{"type": "PARALLEL_NOOP", "continueOn": ["ALL"]}]},
+    )
+
+    assert block._activity_block_status == Status.SUCCESS
+    assert [a.status for a in block._main_activities] == [Status.SUCCESS] * 3
+
+
+def test_activities_after_an_interrupting_one_are_not_started(run_block):
+    slow_runs.clear()
+    slow = {"type": "PARALLEL_SLOW", "continueOn": ["ALL"]}
+    block = run_block([slow, "PARALLEL_FAIL", slow], parallel=True)
+
+    # As in a sequential run: the first slow activity has finished before the failing one is
+    # started, and the last one is skipped.
+    assert [a.status for a in block._main_activities] == [
+        Status.SUCCESS,
+        Status.ERROR,
+        Status.SKIPPED,
+    ]
+    assert slow_runs == ["block-activity1"]
+
+
+def test_concurrent_blocks_register_exceptions_in_their_own_store(flow_config):
+    url = flow_config(
+        {
+            "block": {
+                "parallel": True,
+                "activities": [
+                    {"type": t, "continueOn": ["ALL"]}
+                    for t in ("PARALLEL_REGISTER", "PARALLEL_REGISTER_ASYNC", "PARALLEL_REGISTER")
+                ],
+            }
+        }
+    )
+    blocks = [ActivityBlock(flow_config_url=url, activity_block_id="block") for _ in range(2)]
+    threads = [threading.Thread(target=block.run) for block in blocks]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for block in blocks:
+        assert sorted(str(e) for e in block._flow_store.other_exceptions) == [
+            "block-activity1",
+            "block-activity2",
+            "block-activity3",
+        ]
+    assert FlowContextStore.current() is None
+
+
+class AfterActivitiesListener(StateListener):
+    def __init__(self):
+        self.after_activities = {}
+
+    def on_after_activity_postprocess(self, state):
+        data = state.dict
+        if data.get(ste.ACTIVITY_GROUP_TYPE) == ActivityGroupType.MAIN_ACTIVITY:
+            activity_data = data.get(ste.INTERNAL_ACTIVITY_DATA)
+            self.after_activities[data.get(ste.ACTIVITY_ID)] = activity_data.after_activities
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_main_activities_see_their_own_after_activities(flow_config, parallel):
+    url = flow_config(
+        {
+            "block": {
+                "parallel": parallel,
+                "activities": [{"type": "PARALLEL_NOOP", "continueOn": ["ALL"]}] * 2,
+                "afterActivity": {
+                    "activities": [{"type": "PARALLEL_NOOP", "continueOn": ["ALL"]}]
+                },
+            }
+        }
+    )
+    block = ActivityBlock(flow_config_url=url, activity_block_id="block")
+    listener = AfterActivitiesListener()
+    block._state_handler.add_state_listener(listener)
+    block.run()
+
+    assert {
+        main_id: [a.id for a in after] for main_id, after in listener.after_activities.items()
+    } == {
+        "block-activity1": ["block-activity1-afterActivity1"],
+        "block-activity2": ["block-activity2-afterActivity1"],
+    }
@@ -0,0 +1,86 @@
+import multiprocessing
+import os
+import time
+
+from autor import Activity
+from autor.framework.activity_process_pool import ActivityProcessPool
+from autor.framework.activity_registry import ActivityRegistry
+from autor.framework.constants import Status
+from autor.framework.context_properties_registry import ContextPropertiesRegistry
+
+output = ContextPropertiesRegistry.output
+# pylint: disable-next=redefined-builtin
+input = ContextPropertiesRegistry.input
+
+
+@ActivityRegistry.activity(type="PROCESS_DOUBLER")
+class ProcessDoubler(Activity):
+    def __init__(self):
+        super().__init__()
+        self.__value = 21
+        self.__pid = None
+
+    @property
+    @input(mandatory=False, type=int)
+    @output(mandatory=True, type=int)
+    def process_value(self) -> int:
+        return self.__value
+
+    @process_value.setter
+    def process_value(self, n) -> None:
+        self.__value = n
+
+    @property
+    @output(mandatory=True, type=int)
+    def process_pid(self) -> int:
+        return self.__pid
+
+    @process_pid.setter
+    def process_pid(self, n) -> None:
+        self.__pid = n
+
+    def run(self):
+        self.process_value = self.process_value * 2
+        self.process_pid = os.getpid()
+
+
+@ActivityRegistry.activity(type="PROCESS_FAILER")
+class ProcessFailer(Activity):
+    def run(self):
+        raise ValueError("failed in the worker")
+
+
+def test_activity_runs_in_a_worker_process(run_block):
+    doubler = {"type": "PROCESS_DOUBLER", "executor": "process"}
+    block = run_block([doubler, doubler], maxProcesses=1)
+
+    first, second = block._main_activities
+    assert [first.status, second.status] == [Status.SUCCESS] * 2
+    assert first.process_value == 42
+    assert second.process_value == 84  # The input was sent to the worker.
+    assert first.process_pid == second.process_pid != os.getpid()
+
+
+def test_exception_in_a_worker_process(run_block):
+    block = run_block([{"type": "PROCESS_FAILER", "executor": "process"}], maxProcesses=1)
+
+    assert block._main_activities[0].status == Status.ERROR
+    exceptions = block._flow_store.other_exceptions
+    assert [e.__class__ for e in exceptions] == [ValueError]
+    assert "failed in the worker" in str(exceptions[0].__cause__)
+
+
+def test_terminate_stops_busy_workers():
+    pool = ActivityProcessPool([], max_workers=1)
+    pool.start()
+    pid = pool._executor.submit(os.getpid).result(timeout=30)
+    pool._executor.submit(time.sleep, 30)
+    time.sleep(0.5)  # Picked up by the worker.
+
+    pool.terminate()
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        if pid not in [p.pid for p in multiprocessing.active_children()]:
+            break
+        time.sleep(0.05)
+    assert pid not in [p.pid for p in multiprocessing.active_children()]
@@ -0,0 +1,59 @@
+import sqlite3
+
+from autor.framework.sqlite_context import SQLiteContext
+
+
+def _activity(block, activity, key, value):
+    return {"_activityBlocks": {block: {"_activities": {activity: {key: value}}}}}
+
+
+def test_concurrent_blocks_do_not_lose_writes(tmp_path):
+    database = str(tmp_path / "context.db")
+    first, second = SQLiteContext(database), SQLiteContext(database)
+    first_context, second_context = {}, {}
+    first.sync("flow-1", first_context)
+    second.sync("flow-1", second_context)
+
+    first_context.update(_activity("B1", "B1-A1", "status", "SUCCESS"))
+    first.sync_changes(
+        "flow-1", first_context, {("_activityBlocks", "B1", "_activities", "B1-A1", "status")}
+    )
+    second_context.update(_activity("B2", "B2-A1", "status", "FAIL"))
+    second.sync_changes(
+        "flow-1", second_context, {("_activityBlocks", "B2", "_activities", "B2-A1", "status")}
+    )
+
+    restored = {}
+    SQLiteContext(database).sync("flow-1", restored)
+    assert restored["_activityBlocks"]["B1"]["_activities"]["B1-A1"]["status"] == "SUCCESS"
+    assert restored["_activityBlocks"]["B2"]["_activities"]["B2-A1"]["status"] == "FAIL"
+
+
+def test_sync_upserts_only_changed_rows(tmp_path):
+    database = str(tmp_path / "context.db")
+    remote = SQLiteContext(database)
+    context = {"a": 1, "b": 2}
+    remote.sync("flow-1", context)
+
+    context["a"] = 3
+    remote.sync_changes("flow-1", context, {("a",)})
+    remote.sync_changes("flow-1", context, set())
+
+    connection = sqlite3.connect(database)
+    rows = connection.execute("SELECT key, value, revision FROM context_values ORDER BY key")
+    assert rows.fetchall() == [("a", "3", 2), ("b", "2", 1)]
+    assert connection.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+
+
+def test_materialized_context_of_an_older_version_is_converted(tmp_path):
+    database = str(tmp_path / "context.db")
+    materialized = _activity("B", "B-A1", "status", "SUCCESS")
+    materialized["_activityBlocks"]["B"]["status"] = "SUCCESS"
+    SQLiteContext(database).sync("flow-1", {"status": "SUCCESS", **materialized})
+
+    context = {}
+    SQLiteContext(database).sync("flow-1", context)
+    assert "status" not in context
+    assert context["_latest"] == {
+        "status": ("_activityBlocks", "B", "_activities", "B-A1", "status")
+    }
@@ -0,0 +1,253 @@
+import threading
+
+import pytest
+
+from autor.framework.constants import QueueFullPolicy
+from autor.framework.state import State
+from autor.framework.state_handler import StateHandler
+from autor.framework.state_listener import StateListener
+from autor.framework.state_producer import StateProducer
+from autor.framework.state_view import ABSENT
+from autor.framework.util import Util
+
+
+class RecordingListener(StateListener):
+    def __init__(self):
+        self.states = []
+
+    def on_state(self, state):
+        self.states.append(state.name)
+
+
+def test_handlers_do_not_share_listeners():
+    first, second = StateHandler(), StateHandler()
+    first_listener, second_listener = RecordingListener(), RecordingListener()
+    first.add_state_listener(first_listener)
+    second.add_state_listener(second_listener)
+
+    first.change_state(State.FRAMEWORK_START)
+    second.change_state(State.FRAMEWORK_END)
+    first.remove_all_listeners()
+    second.change_state(State.FRAMEWORK_END)
+
+    assert first_listener.states == [State.FRAMEWORK_START]
+    assert second_listener.states == [State.FRAMEWORK_END, State.FRAMEWORK_END]
+    assert first.get_current_state_name() == State.FRAMEWORK_START
+    assert second.framework_ended() and not first.framework_ended()
+
+
+def test_handlers_run_on_threads():
+    handlers = [StateHandler() for _ in range(4)]
+    listeners = [RecordingListener() for _ in handlers]
+    for handler, listener in zip(handlers, listeners):
+        handler.add_state_listener(listener)
+
+    def run(handler):
+        for _ in range(200):
+            handler.change_state(State.BEFORE_ACTIVITY_RUN)
+
+    threads = [threading.Thread(target=run, args=(handler,)) for handler in handlers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for listener in listeners:
+        assert listener.states == [State.BEFORE_ACTIVITY_RUN] * 200
+
+
+def test_only_the_overridden_hooks_are_called():
+    class RunListener(StateListener):
+        def __init__(self):
+            self.states = []
+
+        def on_before_activity_run(self, state):
+            self.states.append(state.name)
+
+    handler = StateHandler()
+    listener = RunListener()
+    handler.add_state_listener(listener)
+    handler.add_state_listener(StateListener())
+
+    assert handler._callbacks[State.BEFORE_ACTIVITY_RUN] == [
+        ("RunListener", listener.on_before_activity_run)
+    ]
+    assert handler._callbacks[None] == []
+    assert all(
+        not hooks for name, hooks in handler._callbacks.items() if name != State.BEFORE_ACTIVITY_RUN
+    )
+
+    handler.change_state(State.FRAMEWORK_START)
+    handler.change_state(State.BEFORE_ACTIVITY_RUN)
+    assert listener.states == [State.BEFORE_ACTIVITY_RUN]
+
+    handler.remove_state_listener(listener)
+    assert handler._callbacks[State.BEFORE_ACTIVITY_RUN] == []
+
+
+def test_state_data_is_a_live_view_over_the_producers():
+    class Producer(StateProducer):
+        status = "RUNNING"
+        run_id = "run-1"
+        activity = None
+
+        def state_fields(self):
+            return {
+                "status": (lambda: self.status, lambda value: setattr(self, "status", value)),
+                "runId": (lambda: self.run_id, None),
+                "activity": (lambda: self.activity or ABSENT, None),
+            }
+
+        def on_before_state(self, state_name, state_data):
+            pass
+
+        def on_after_state(self, state_name, state_data):
+            pass
+
+    class Writer(StateListener):
+        def on_after_activity_run(self, state):
+            assert state.dict.runId == "run-1"
+            assert "activity" not in state.dict
+            state.dict["status"] = "ABORTED"
+            state.dict["own"] = 1
+
+    producer = Producer()
+    handler = StateHandler()
+    handler.add_state_producer(producer)
+    handler.add_state_listener(Writer())
+
+    state_data = handler.change_state(State.AFTER_ACTIVITY_RUN)
+    assert producer.status == "ABORTED"
+    assert state_data["own"] == 1
+
+    handler.change_state(State.BEFORE_ACTIVITY_RUN)
+    assert "own" not in state_data
+
+
+def test_asynchronous_listeners_get_snapshots_and_are_drained_at_framework_end():
+    started, release = threading.Event(), threading.Event()
+
+    class SlowObserver(StateListener):
+        asynchronous = True
+        queue_size = 1
+        queue_full = QueueFullPolicy.DROP
+
+        def __init__(self):
+            self.states = []
+
+        def on_state(self, state):
+            started.set()
+            release.wait()
+            with pytest.raises(TypeError):
+                state.dict["value"] = 1
+            self.states.append(state.name)
+
+    observer = SlowObserver()
+    handler = StateHandler()
+    handler.add_state_listener(observer)
+
+    handler.change_state(State.FRAMEWORK_START)
+    started.wait()  # The worker is busy with FRAMEWORK_START.
+    for _ in range(5):
+        handler.change_state(State.BEFORE_ACTIVITY_RUN)  # One is queued, four are dropped.
+    assert observer.states == []
+
+    release.set()
+    handler.change_state(State.FRAMEWORK_END)
+    assert observer.states == [
+        State.FRAMEWORK_START,
+        State.BEFORE_ACTIVITY_RUN,
+        State.FRAMEWORK_END,
+    ]
+    handler.remove_all_listeners()
+
+
+def test_asynchronous_listeners_get_snapshots_of_nested_values():
+    release = threading.Event()
+    config = {"limits": [1, 2], "options": {"retry": True}}
+
+    class Producer(StateProducer):
+        def state_fields(self):
+            return {"config": (lambda: config, None)}
+
+        def on_before_state(self, state_name, state_data):
+            pass
+
+        def on_after_state(self, state_name, state_data):
+            pass
+
+    class Observer(StateListener):
+        asynchronous = True
+
+        def __init__(self):
+            self.configs = []
+            self.read_only = []
+
+        def on_state(self, state):
+            release.wait()
+            try:
+                state.dict["config"]["options"]["retry"] = False
+                self.read_only.append(False)
+            except TypeError:
+                self.read_only.append(True)
+            self.configs.append(state.dict["config"])
+
+    observer = Observer()
+    handler = StateHandler()
+    handler.add_state_producer(Producer())
+    handler.add_state_listener(observer)
+
+    handler.change_state(State.FRAMEWORK_START)
+    config["limits"].append(3)
+    config["options"]["retry"] = False
+    release.set()
+    handler.change_state(State.FRAMEWORK_END)
+
+    assert observer.configs[0] == {"limits": (1, 2), "options": {"retry": True}}
+    assert observer.read_only == [True, True]
+    handler.remove_all_listeners()
+
+
+def test_timings_count_the_calls_of_each_hook_per_state():
+    class RunListener(StateListener):
+        def on_before_activity_run(self, state):
+            pass
+
+    handler = StateHandler()
+    handler.add_state_listener(RecordingListener())
+    handler.add_state_listener(RunListener())
+    handler.change_state(State.FRAMEWORK_START)
+    assert handler.timings() == {}
+
+    handler.enable_timings()
+    for state_name in (State.BEFORE_ACTIVITY_RUN, State.AFTER_ACTIVITY_RUN) * 2:
+        handler.change_state(state_name)
+    handler.change_state(State.AFTER_ACTIVITY_RUN)
+
+    timings = handler.timings()
+    on_state = timings[f"{__name__}.RecordingListener"]["on_state"]
+    assert {name: entry["calls"] for name, entry in on_state.items()} == {
+        State.BEFORE_ACTIVITY_RUN: 2,
+        State.AFTER_ACTIVITY_RUN: 3,
+    }
+    run_listener = timings[f"{__name__}.{RunListener.__qualname__}"]
+    assert run_listener["on_before_activity_run"][State.BEFORE_ACTIVITY_RUN]["calls"] == 2
+    producer = timings["autor.framework.state_handler.StateHandler"]["on_before_state"]
+    assert producer[State.AFTER_ACTIVITY_RUN]["calls"] == 3
+
+
+def test_exceptions_of_timed_hooks_name_the_listener(monkeypatch):
+    class FailingListener(StateListener):
+        def on_state(self, state):
+            raise ValueError("Failed")
+
+    descriptions = []
+    monkeypatch.setattr(
+        Util, "register_exception", lambda **kwargs: descriptions.append(kwargs["description"])
+    )
+    handler = StateHandler()
+    handler.enable_timings()
+    handler.add_state_listener(FailingListener())
+    handler.change_state(State.FRAMEWORK_START)
+
+    assert descriptions == ["Extension exception in: FailingListener"]
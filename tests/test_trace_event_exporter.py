@@ -0,0 +1,72 @@
+import json
+
+from autor.extensions.trace_event_exporter import TraceEventExporter
+from autor.framework.keys import StateKeys as ste
+from autor.framework.state import State
+
+
+def test_spans_are_nested(tmp_path, monkeypatch, state_handler):
+    monkeypatch.chdir(tmp_path)  # The default trace file is written to the working directory.
+    state_handler.add_state_listener(TraceEventExporter())
+
+    for state_name in (
+        State.FRAMEWORK_START,
+        State.BEFORE_ACTIVITY_BLOCK,
+        State.BEFORE_ACTIVITY_PREPROCESS,
+        State.AFTER_ACTIVITY_POSTPROCESS,
+        State.AFTER_ACTIVITY_BLOCK,
+    ):
+        state_handler.change_state(state_name)
+    state_handler.change_state(State.FRAMEWORK_END)
+
+    events = json.loads((tmp_path / "autor-trace-run.json").read_text())["traceEvents"]
+    spans = {e["cat"]: e for e in events if e["ph"] == "X"}
+    begin, end = (next(e["ts"] for e in events if e["ph"] == ph) for ph in "be")
+    spans["group"] = {"ts": begin, "dur": end - begin}
+
+    def inside(child, parent):
+        return (
+            parent["ts"] <= child["ts"]
+            and child["ts"] + child["dur"] <= parent["ts"] + parent["dur"]
+        )
+
+    assert inside(spans["activity"], spans["group"])
+    assert inside(spans["group"], spans["block"])
+    assert inside(spans["block"], spans["flow"])
+    assert spans["listener"]["name"].endswith("TraceEventExporter.on_state")
+    assert sum(e["ph"] == "i" for e in events) == 6
+
+
+def test_parallel_activities_get_their_own_lanes(tmp_path, monkeypatch, block, state_handler):
+    monkeypatch.chdir(tmp_path)
+    state_handler.add_state_listener(TraceEventExporter())
+
+    def change_state(state_name, activity=None, group="MAIN_ACTIVITY"):
+        if activity is not None:
+            block.values[ste.ACTIVITY_ID] = f"block-{activity}"
+            block.values[ste.ACTIVITY_RUN_ID] = f"run-{activity}"
+            block.values[ste.ACTIVITY_GROUP_TYPE] = group
+        state_handler.change_state(state_name)
+
+    change_state(State.FRAMEWORK_START)
+    change_state(State.BEFORE_ACTIVITY_BLOCK)
+    change_state(State.BEFORE_ACTIVITY_PREPROCESS, "A1")
+    change_state(State.BEFORE_ACTIVITY_PREPROCESS, "A2")
+    change_state(State.AFTER_ACTIVITY_POSTPROCESS, "A1")
+    change_state(State.BEFORE_ACTIVITY_PREPROCESS, "AA1", group="AFTER_ACTIVITY")
+    change_state(State.AFTER_ACTIVITY_POSTPROCESS, "AA1", group="AFTER_ACTIVITY")
+    change_state(State.AFTER_ACTIVITY_POSTPROCESS, "A2")
+    change_state(State.AFTER_ACTIVITY_BLOCK)
+    change_state(State.FRAMEWORK_END)
+
+    events = json.loads((tmp_path / "autor-trace-run.json").read_text())["traceEvents"]
+    activities = {e["name"]: e for e in events if e.get("cat") == "activity"}
+    block_tid = activities["activity: block-A1"]["tid"]
+    assert activities["activity: block-AA1"]["tid"] == block_tid
+    assert activities["activity: block-A2"]["tid"] != block_tid
+
+    # The main activity group ends with A2, after the after-activity group has started.
+    groups = {(e["id"], e["ph"]): e["ts"] for e in events if e["ph"] in "be"}
+    a2 = activities["activity: block-A2"]
+    assert groups[(1, "e")] == a2["ts"] + a2["dur"]
+    assert groups[(1, "e")] > groups[(2, "b")]